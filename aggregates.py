@@ -0,0 +1,298 @@
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import bindparam, event, delete, func, insert, inspect, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import (
+    init_database, session_scope, mark_vendors_dirty, Vendor, Transaction,
+    VendorMonthlyAggregate, VendorPaymentModeAggregate
+)
+
+# --- TRANSACTION AGGREGATE MAINTENANCE ---
+# Keeps Vendor.transaction_count / itc_amount / cash_payments plus the
+# monthly and payment-mode rollup tables in step with the transactions
+# table. ORM writes are picked up by the session hooks below (database.py
+# installs them with the engine); bulk Core writes must call
+# apply_transaction_rows() themselves.
+#
+#     python -m aggregates              # report vendors whose rollups drifted
+#     python -m aggregates --rebuild    # recompute rollups from transactions
+
+CASH_MODES = {"cash"}
+
+TRACKED_FIELDS = ("vendor_id", "transaction_date", "transaction_amount", "tax_amount", "payment_mode")
+
+def is_cash(payment_mode) -> bool:
+    return (payment_mode or "").strip().lower() in CASH_MODES
+
+def _contribution(row: dict, sign: int) -> tuple:
+    """(vendor_id, month, payment_mode, count, amount, tax, cash) for one transaction"""
+    amount = row.get("transaction_amount") or 0.0
+    payment_mode = row.get("payment_mode") or "Bank Transfer"
+    return (
+        row["vendor_id"],
+        row["transaction_date"].strftime("%Y-%m"),
+        payment_mode,
+        sign,
+        sign * amount,
+        sign * (row.get("tax_amount") or 0.0),
+        sign * amount if is_cash(payment_mode) else 0.0,
+    )
+
+def _upsert_increments(conn, model, key_columns: list, rows: list):
+    """INSERT ... ON CONFLICT DO UPDATE SET col = col + excluded.col"""
+    if not rows:
+        return
+    table = model.__table__
+    value_columns = [c for c in rows[0] if c not in key_columns]
+    dialect = conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite_insert if dialect == "sqlite" else pg_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={c: table.c[c] + stmt.excluded[c] for c in value_columns}
+        )
+        conn.execute(stmt, rows)
+        return
+    # Portable fallback: update, then insert the keys that didn't exist yet
+    for row in rows:
+        where = [table.c[k] == row[k] for k in key_columns]
+        result = conn.execute(update(table).where(*where).values({c: table.c[c] + row[c] for c in value_columns}))
+        if result.rowcount == 0:
+            conn.execute(insert(table).values(row))
+
+def apply_contributions(conn, contributions):
+    """Fold per-transaction deltas into the vendor, monthly and payment-mode rollups"""
+    vendors = defaultdict(lambda: [0, 0.0, 0.0])
+    months = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    modes = defaultdict(lambda: [0, 0.0])
+    for vendor_id, month, payment_mode, count, amount, tax, cash in contributions:
+        v = vendors[vendor_id]
+        v[0] += count
+        v[1] += tax
+        v[2] += cash
+        m = months[(vendor_id, month)]
+        m[0] += count
+        m[1] += amount
+        m[2] += tax
+        m[3] += cash
+        p = modes[(vendor_id, payment_mode)]
+        p[0] += count
+        p[1] += amount
+
+    if not vendors:
+        return
+
+    vendors_table = Vendor.__table__
+    conn.execute(
+        update(vendors_table)
+        .where(vendors_table.c.vendor_id == bindparam("v_id"))
+        .values(
+            transaction_count=func.coalesce(vendors_table.c.transaction_count, 0) + bindparam("v_count"),
+            itc_amount=func.coalesce(vendors_table.c.itc_amount, 0.0) + bindparam("v_tax"),
+            cash_payments=func.coalesce(vendors_table.c.cash_payments, 0.0) + bindparam("v_cash"),
+        ),
+        [
+            {"v_id": vendor_id, "v_count": count, "v_tax": tax, "v_cash": cash}
+            for vendor_id, (count, tax, cash) in vendors.items()
+        ]
+    )
+    _upsert_increments(conn, VendorMonthlyAggregate, ["vendor_id", "month"], [
+        {"vendor_id": vendor_id, "month": month, "transaction_count": c, "total_amount": a, "tax_amount": t, "cash_amount": cash}
+        for (vendor_id, month), (c, a, t, cash) in months.items()
+    ])
+    _upsert_increments(conn, VendorPaymentModeAggregate, ["vendor_id", "payment_mode"], [
+        {"vendor_id": vendor_id, "payment_mode": mode, "transaction_count": c, "total_amount": a}
+        for (vendor_id, mode), (c, a) in modes.items()
+    ])
+
+def apply_transaction_rows(db, rows, sign: int = 1):
+    """Update rollups for transaction dicts written outside the ORM (e.g. bulk import)"""
+    apply_contributions(db.connection(), [_contribution(row, sign) for row in rows])
+
+# --- ORM hooks ---
+def _row_from_state(obj, previous: bool = False) -> dict:
+    state = inspect(obj)
+    row = {}
+    for name in TRACKED_FIELDS:
+        history = state.attrs[name].history
+        if previous and history.deleted:
+            row[name] = history.deleted[0]
+        else:
+            row[name] = getattr(obj, name)
+    return row
+
+def _collect_transaction_changes(session, flush_context, instances):
+    removed = session.info.setdefault("aggregate_removed", [])
+    added = session.info.setdefault("aggregate_added", [])
+    deleted_vendor_ids = {obj.vendor_id for obj in session.deleted if isinstance(obj, Vendor)}
+
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            added.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Transaction) and obj.vendor_id not in deleted_vendor_ids:
+            removed.append(_contribution(_row_from_state(obj, previous=True), -1))
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and session.is_modified(obj):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in TRACKED_FIELDS):
+                removed.append(_contribution(_row_from_state(obj, previous=True), -1))
+                added.append(obj)
+
+    # Rollup rows reference vendors, so clear them before the vendor delete is flushed
+    if deleted_vendor_ids:
+        conn = session.connection()
+        for model in (VendorMonthlyAggregate, VendorPaymentModeAggregate):
+            conn.execute(delete(model.__table__).where(model.__table__.c.vendor_id.in_(deleted_vendor_ids)))
+
+def _apply_transaction_changes(session, flush_context):
+    contributions = session.info.pop("aggregate_removed", [])
+    contributions += [
+        _contribution({name: getattr(obj, name) for name in TRACKED_FIELDS}, 1)
+        for obj in session.info.pop("aggregate_added", [])
+    ]
+    if contributions:
+        apply_contributions(session.connection(), contributions)
+
+def install_session_hooks(session_factory):
+    """Maintain rollups on every flush of `session_factory` (database.py installs it on SessionLocal)"""
+    event.listen(session_factory, "before_flush", _collect_transaction_changes)
+    event.listen(session_factory, "after_flush", _apply_transaction_changes)
+
+# --- Readers ---
+def get_monthly_breakdown(vendor_id: int) -> list:
+    with session_scope() as db:
+        rows = db.execute(
+            select(VendorMonthlyAggregate)
+            .where(VendorMonthlyAggregate.vendor_id == vendor_id)
+            .order_by(VendorMonthlyAggregate.month)
+        ).scalars()
+        return [
+            {"month": r.month, "transaction_count": r.transaction_count, "total_amount": r.total_amount,
+             "tax_amount": r.tax_amount, "cash_amount": r.cash_amount}
+            for r in rows
+        ]
+
+def get_payment_mode_breakdown(vendor_id: int) -> dict:
+    with session_scope() as db:
+        rows = db.execute(
+            select(VendorPaymentModeAggregate.payment_mode, VendorPaymentModeAggregate.total_amount)
+            .where(VendorPaymentModeAggregate.vendor_id == vendor_id)
+        )
+        return {mode: amount for mode, amount in rows}
+
+# --- Consistency check / rebuild ---
+def _month_expr(dialect: str, column):
+    if dialect == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    if dialect == "sqlite":
+        return func.strftime("%Y-%m", column)
+    return func.date_format(column, "%Y-%m")
+
+def _recompute(db, vendor_ids=None) -> tuple:
+    """Aggregate raw transactions: ({vendor_id: (count, itc, cash)}, monthly rows, mode rows)"""
+    t = Transaction.__table__
+    cash = func.sum(func.coalesce(t.c.transaction_amount, 0.0)).filter(
+        func.lower(func.trim(t.c.payment_mode)).in_(CASH_MODES)  # same test as is_cash
+    )
+    month = _month_expr(db.get_bind().dialect.name, t.c.transaction_date).label("month")
+    payment_mode = func.coalesce(func.nullif(t.c.payment_mode, ""), "Bank Transfer").label("payment_mode")
+
+    def scoped(query):
+        return query.where(t.c.vendor_id.in_(vendor_ids)) if vendor_ids is not None else query
+
+    monthly = db.execute(scoped(
+        select(t.c.vendor_id, month, func.count(), func.sum(t.c.transaction_amount),
+               func.sum(func.coalesce(t.c.tax_amount, 0.0)), func.coalesce(cash, 0.0))
+        .group_by(t.c.vendor_id, month)
+    )).all()
+    modes = db.execute(scoped(
+        select(t.c.vendor_id, payment_mode, func.count(), func.sum(t.c.transaction_amount))
+        .group_by(t.c.vendor_id, payment_mode)
+    )).all()
+
+    totals = defaultdict(lambda: [0, 0.0, 0.0])
+    for vendor_id, _, count, _, tax, cash_amount in monthly:
+        totals[vendor_id][0] += count
+        totals[vendor_id][1] += tax
+        totals[vendor_id][2] += cash_amount
+    return totals, monthly, modes
+
+def _find_mismatches(db, totals: dict, vendor_ids, tolerance: float) -> list:
+    query = select(Vendor.vendor_id, Vendor.transaction_count, Vendor.itc_amount, Vendor.cash_payments)
+    if vendor_ids is not None:
+        query = query.where(Vendor.vendor_id.in_(vendor_ids))
+    mismatches = []
+    for vendor_id, count, itc, cash in db.execute(query):
+        expected = tuple(totals.get(vendor_id, (0, 0.0, 0.0)))
+        actual = (count or 0, itc or 0.0, cash or 0.0)
+        if actual[0] != expected[0] or abs(actual[1] - expected[1]) > tolerance or abs(actual[2] - expected[2]) > tolerance:
+            mismatches.append({"vendor_id": vendor_id, "expected": expected, "actual": actual})
+    return mismatches
+
+def check_vendor_aggregates(vendor_ids=None, tolerance: float = 0.01) -> list:
+    """Compare Vendor rollup columns with the raw transactions. Returns mismatches."""
+    with session_scope() as db:
+        totals, _, _ = _recompute(db, vendor_ids)
+        return _find_mismatches(db, totals, vendor_ids, tolerance)
+
+def rebuild_vendor_aggregates(vendor_ids=None, tolerance: float = 0.01) -> int:
+    """Recompute every rollup from the transactions table (recovery path).
+
+    Returns the number of vendors whose rollup columns were wrong; only those
+    are flagged for rescoring.
+    """
+    with session_scope() as db:
+        totals, monthly, modes = _recompute(db, vendor_ids)
+        conn = db.connection()
+        for model in (VendorMonthlyAggregate, VendorPaymentModeAggregate):
+            stmt = delete(model.__table__)
+            if vendor_ids is not None:
+                stmt = stmt.where(model.__table__.c.vendor_id.in_(vendor_ids))
+            conn.execute(stmt)
+        if monthly:
+            conn.execute(insert(VendorMonthlyAggregate.__table__), [
+                {"vendor_id": v, "month": m, "transaction_count": c, "total_amount": a or 0.0, "tax_amount": t, "cash_amount": cash}
+                for v, m, c, a, t, cash in monthly
+            ])
+        if modes:
+            conn.execute(insert(VendorPaymentModeAggregate.__table__), [
+                {"vendor_id": v, "payment_mode": mode, "transaction_count": c, "total_amount": a or 0.0}
+                for v, mode, c, a in modes
+            ])
+
+        mismatches = _find_mismatches(db, totals, vendor_ids, tolerance)
+        if mismatches:
+            db.execute(update(Vendor), [
+                {"vendor_id": m["vendor_id"], "transaction_count": m["expected"][0], "itc_amount": m["expected"][1],
+                 "cash_payments": m["expected"][2]}
+                for m in mismatches
+            ])
+            mark_vendors_dirty(db, [m["vendor_id"] for m in mismatches])
+        return len(mismatches)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check or rebuild the transaction rollups")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute rollups from the transactions table")
+    parser.add_argument("--vendor", type=int, action="append", dest="vendor_ids", help="Limit to a vendor (repeatable)")
+    args = parser.parse_args()
+
+    init_database()
+    if args.rebuild:
+        fixed = rebuild_vendor_aggregates(args.vendor_ids)
+        print(f"Rebuilt rollups; {fixed} vendors had drifted and are queued for rescoring")
+        return
+
+    mismatches = check_vendor_aggregates(args.vendor_ids)
+    print(f"{len(mismatches)} vendors out of step with their transactions")
+    for m in mismatches[:20]:
+        print(f"  vendor {m['vendor_id']}: expected {m['expected']}, stored {m['actual']}")
+    if mismatches:
+        print("Run with --rebuild to repair them")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+import argparse
+import hashlib
+import math
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, bindparam, delete, event, insert, inspect, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from aggregates import is_cash
+from database import (
+    init_database, session_scope, DIRTY_MARK, Vendor, Transaction,
+    VendorAmountStats, VendorDailyCash, InvoiceFingerprint
+)
+
+# --- TRANSACTION ANOMALY ENGINE ---
+# Streaming per-vendor detectors, updated in O(1) per transaction from the
+# same write paths as aggregates.py (ORM hooks below, installed by
+# database.py; bulk Core writes call apply_anomaly_rows() themselves). Results land in three Vendor counters
+# that the risk scorer reads, so scoring never rescans transaction history.
+#
+#   amount_spikes      - amounts > SPIKE_Z_THRESHOLD std devs above the
+#                        vendor's running mean (Welford mean/variance)
+#   cash_split_days    - days where several cash payments, each within the
+#                        Section 40A(3) limit, add up to more than it
+#   duplicate_invoices - repeat invoice numbers (normalized, hashed)
+
+SECTION_40A3_CASH_LIMIT = 10000.0
+SPIKE_Z_THRESHOLD = 3.0
+SPIKE_MIN_HISTORY = 10  # transactions seen before spikes are judged
+
+TRACKED_FIELDS = ("vendor_id", "transaction_date", "transaction_amount", "payment_mode", "invoice_number")
+
+_INVOICE_NOISE = re.compile(r"[^A-Z0-9]+")
+
+def invoice_hash(invoice_number) -> str:
+    """Stable 64-bit fingerprint of a normalized invoice number (None if blank)"""
+    normalized = _INVOICE_NOISE.sub("", str(invoice_number or "").upper()).lstrip("0")
+    if not normalized:
+        return None
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+def _is_split_day(cash_count: int, cash_total: float, cash_max: float) -> bool:
+    return cash_count >= 2 and cash_total > SECTION_40A3_CASH_LIMIT and cash_max <= SECTION_40A3_CASH_LIMIT
+
+def _welford_add(stats: list, x: float):
+    stats[0] += 1
+    delta = x - stats[1]
+    stats[1] += delta / stats[0]
+    stats[2] += delta * (x - stats[1])
+
+def _welford_remove(stats: list, x: float):
+    if stats[0] <= 1:
+        stats[:] = [0, 0.0, 0.0]
+        return
+    mean = (stats[0] * stats[1] - x) / (stats[0] - 1)
+    stats[2] = max(stats[2] - (x - mean) * (x - stats[1]), 0.0)
+    stats[0] -= 1
+    stats[1] = mean
+
+def is_spike(stats: list, x: float) -> bool:
+    """Would `x` be a spike against the (count, mean, m2) seen so far?"""
+    count, mean, m2 = stats
+    if count < SPIKE_MIN_HISTORY:
+        return False
+    std = math.sqrt(m2 / (count - 1))
+    return std > 0 and (x - mean) / std > SPIKE_Z_THRESHOLD
+
+def _ensure_rows(conn, model, key_columns: list, rows: list):
+    """Insert zeroed state rows for keys that don't exist yet (INSERT ... ON CONFLICT DO NOTHING)"""
+    if not rows:
+        return
+    table = model.__table__
+    dialect = conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite_insert if dialect == "sqlite" else pg_insert
+        conn.execute(dialect_insert(table).on_conflict_do_nothing(index_elements=key_columns), rows)
+        return
+    # Portable fallback: insert the keys not found (a concurrent first insert can still conflict here)
+    for row in rows:
+        where = [table.c[k] == row[k] for k in key_columns]
+        if conn.execute(select(table.c[key_columns[0]]).where(*where)).first() is None:
+            conn.execute(insert(table).values(row))
+
+def _locked(table, key_columns: list, *where):
+    # Fixed lock order so two writers touching the same vendors can't deadlock
+    return select(table).where(*where).order_by(*[table.c[k] for k in key_columns]).with_for_update()
+
+def _load_state(conn, rows: list) -> tuple:
+    """Create missing detector rows, then read and lock every row the batch touches.
+
+    The rows stay locked (Postgres FOR UPDATE; on SQLite the inserts already
+    hold the database write lock) until the transaction ends, so concurrent
+    writers serialize on a vendor instead of overwriting each other.
+    """
+    vendor_ids = sorted({row["vendor_id"] for row in rows})
+    days = {(row["vendor_id"], row["transaction_date"].strftime("%Y-%m-%d")) for row in rows if is_cash(row.get("payment_mode"))}
+    hashes = {(row["vendor_id"], h) for row in rows for h in [invoice_hash(row.get("invoice_number"))] if h}
+
+    _ensure_rows(conn, VendorAmountStats, ["vendor_id"],
+                 [{"vendor_id": v, "sample_count": 0, "mean": 0.0, "m2": 0.0} for v in vendor_ids])
+    _ensure_rows(conn, VendorDailyCash, ["vendor_id", "day"],
+                 [{"vendor_id": v, "day": d, "cash_count": 0, "cash_total": 0.0, "cash_max": 0.0} for v, d in sorted(days)])
+    _ensure_rows(conn, InvoiceFingerprint, ["vendor_id", "invoice_hash"],
+                 [{"vendor_id": v, "invoice_hash": h, "occurrences": 0} for v, h in sorted(hashes)])
+
+    stats_table = VendorAmountStats.__table__
+    stats = {
+        r.vendor_id: [r.sample_count, r.mean, r.m2]
+        for r in conn.execute(_locked(stats_table, ["vendor_id"], stats_table.c.vendor_id.in_(vendor_ids)))
+    }
+    cash = {}
+    if days:
+        cash_table = VendorDailyCash.__table__
+        cash = {
+            (r.vendor_id, r.day): [r.cash_count, r.cash_total, r.cash_max]
+            for r in conn.execute(_locked(
+                cash_table, ["vendor_id", "day"],
+                cash_table.c.vendor_id.in_(vendor_ids), cash_table.c.day.in_({d for _, d in days})
+            ))
+        }
+    invoices = {}
+    if hashes:
+        fp_table = InvoiceFingerprint.__table__
+        invoices = {
+            (r.vendor_id, r.invoice_hash): r.occurrences
+            for r in conn.execute(_locked(
+                fp_table, ["vendor_id", "invoice_hash"],
+                fp_table.c.vendor_id.in_(vendor_ids), fp_table.c.invoice_hash.in_({h for _, h in hashes})
+            ))
+        }
+    return stats, cash, invoices
+
+def _cash_day_maxima(conn, keys: set) -> dict:
+    """Largest cash payment per (vendor_id, day) in the transactions table"""
+    table = Transaction.__table__
+    maxima = defaultdict(float)
+    bounds = []
+    for vendor_id, day in keys:
+        start = datetime.strptime(day, "%Y-%m-%d")
+        bounds.append(and_(table.c.vendor_id == vendor_id, table.c.transaction_date >= start,
+                           table.c.transaction_date < start + timedelta(days=1)))
+    query = select(table.c.vendor_id, table.c.transaction_date, table.c.transaction_amount, table.c.payment_mode).where(
+        or_(*bounds)
+    )
+    for vendor_id, when, amount, payment_mode in conn.execute(query):
+        if is_cash(payment_mode):
+            key = (vendor_id, when.strftime("%Y-%m-%d"))
+            maxima[key] = max(maxima[key], amount or 0.0)
+    return maxima
+
+def _write_state(conn, model, key_columns: list, state: dict, to_row):
+    """Overwrite the (locked) rows in one executemany call"""
+    if not state:
+        return
+    table = model.__table__
+    rows = [to_row(key, value) for key, value in state.items()]
+    conn.execute(
+        update(table)
+        .where(*[table.c[k] == bindparam(f"k_{k}") for k in key_columns])
+        .values({c: bindparam(f"v_{c}") for c in rows[0] if c not in key_columns}),
+        [{(f"k_{c}" if c in key_columns else f"v_{c}"): v for c, v in row.items()} for row in rows]
+    )
+
+def apply_anomaly_rows(conn, rows: list, sign: int = 1):
+    """Fold transactions (dicts with TRACKED_FIELDS) into the detectors. sign=-1 removes them.
+
+    Removals reverse the running statistics, daily cash totals and invoice
+    counts, and recompute each touched day's largest cash payment from the
+    transactions left. A spike already counted stays counted
+    (rebuild_anomaly_stats recomputes from history).
+    """
+    if not rows:
+        return
+    stats, cash, invoices = _load_state(conn, rows)
+    touched_cash, touched_invoices = set(), set()
+    deltas = defaultdict(lambda: [0, 0, 0])  # vendor_id -> [spikes, split days, duplicates]
+
+    for row in rows:
+        vendor_id = row["vendor_id"]
+        amount = row.get("transaction_amount") or 0.0
+        vendor_stats = stats.setdefault(vendor_id, [0, 0.0, 0.0])
+        if sign > 0:
+            if is_spike(vendor_stats, amount):
+                deltas[vendor_id][0] += 1
+            _welford_add(vendor_stats, amount)
+        else:
+            _welford_remove(vendor_stats, amount)
+
+        if is_cash(row.get("payment_mode")):
+            key = (vendor_id, row["transaction_date"].strftime("%Y-%m-%d"))
+            day = cash.setdefault(key, [0, 0.0, 0.0])
+            was_split = _is_split_day(*day)
+            day[0] = max(day[0] + sign, 0)
+            day[1] += sign * amount
+            if sign > 0:
+                day[2] = max(day[2], amount)
+            deltas[vendor_id][1] += _is_split_day(*day) - was_split
+            touched_cash.add(key)
+
+        fingerprint = invoice_hash(row.get("invoice_number"))
+        if fingerprint:
+            key = (vendor_id, fingerprint)
+            seen = invoices.get(key, 0)
+            if sign > 0:
+                deltas[vendor_id][2] += 1 if seen >= 1 else 0
+                invoices[key] = seen + 1
+            else:
+                deltas[vendor_id][2] -= 1 if seen >= 2 else 0
+                invoices[key] = max(seen - 1, 0)
+            touched_invoices.add(key)
+
+    if sign < 0 and touched_cash:
+        # A running max can't be reversed; removals run after the flush, so the table holds what's left
+        maxima = _cash_day_maxima(conn, touched_cash)
+        for key in touched_cash:
+            day = cash[key]
+            was_split = _is_split_day(*day)
+            day[2] = maxima[key] if day[0] else 0.0
+            deltas[key[0]][1] += _is_split_day(*day) - was_split
+
+    _write_state(conn, VendorAmountStats, ["vendor_id"], stats,
+                 lambda vendor_id, s: {"vendor_id": vendor_id, "sample_count": s[0], "mean": s[1], "m2": s[2]})
+    _write_state(conn, VendorDailyCash, ["vendor_id", "day"], {k: cash[k] for k in touched_cash},
+                 lambda k, d: {"vendor_id": k[0], "day": k[1], "cash_count": d[0], "cash_total": d[1], "cash_max": d[2]})
+    _write_state(conn, InvoiceFingerprint, ["vendor_id", "invoice_hash"], {k: invoices[k] for k in touched_invoices},
+                 lambda k, n: {"vendor_id": k[0], "invoice_hash": k[1], "occurrences": n})
+
+    changed = [(vendor_id, d) for vendor_id, d in deltas.items() if any(d)]
+    if changed:
+        vendors_table = Vendor.__table__
+        conn.execute(
+            update(vendors_table)
+            .where(vendors_table.c.vendor_id == bindparam("v_id"))
+            .values(
+                amount_spikes=vendors_table.c.amount_spikes + bindparam("v_spikes"),
+                cash_split_days=vendors_table.c.cash_split_days + bindparam("v_splits"),
+                duplicate_invoices=vendors_table.c.duplicate_invoices + bindparam("v_dups"),
+                **DIRTY_MARK,
+            ),
+            [{"v_id": vendor_id, "v_spikes": d[0], "v_splits": d[1], "v_dups": d[2]} for vendor_id, d in changed]
+        )
+
+def apply_transaction_anomalies(db, rows, sign: int = 1):
+    """Update detectors for transaction dicts written outside the ORM (e.g. bulk import)"""
+    apply_anomaly_rows(db.connection(), list(rows), sign)
+
+# --- ORM hooks ---
+def _row_from_state(obj, previous: bool = False) -> dict:
+    state = inspect(obj)
+    row = {}
+    for name in TRACKED_FIELDS:
+        history = state.attrs[name].history
+        row[name] = history.deleted[0] if previous and history.deleted else getattr(obj, name)
+    return row
+
+def _collect_anomaly_changes(session, flush_context, instances):
+    removed = session.info.setdefault("anomaly_removed", [])
+    added = session.info.setdefault("anomaly_added", [])
+    deleted_vendor_ids = {obj.vendor_id for obj in session.deleted if isinstance(obj, Vendor)}
+
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            added.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Transaction) and obj.vendor_id not in deleted_vendor_ids:
+            removed.append(_row_from_state(obj, previous=True))
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and session.is_modified(obj):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in TRACKED_FIELDS):
+                removed.append(_row_from_state(obj, previous=True))
+                added.append(obj)
+
+    # Detector rows reference vendors, so clear them before the vendor delete is flushed
+    if deleted_vendor_ids:
+        conn = session.connection()
+        for model in (VendorAmountStats, VendorDailyCash, InvoiceFingerprint):
+            conn.execute(delete(model.__table__).where(model.__table__.c.vendor_id.in_(deleted_vendor_ids)))
+
+def _apply_anomaly_changes(session, flush_context):
+    removed = session.info.pop("anomaly_removed", [])
+    added = [{name: getattr(obj, name) for name in TRACKED_FIELDS} for obj in session.info.pop("anomaly_added", [])]
+    if removed:
+        apply_anomaly_rows(session.connection(), removed, -1)
+    if added:
+        apply_anomaly_rows(session.connection(), added, 1)
+
+def install_session_hooks(session_factory):
+    """Run the detectors on every flush of `session_factory` (database.py installs it on SessionLocal)"""
+    event.listen(session_factory, "before_flush", _collect_anomaly_changes)
+    event.listen(session_factory, "after_flush", _apply_anomaly_changes)
+
+# --- Rebuild ---
+def rebuild_anomaly_stats(vendor_ids: list = None, chunk_size: int = 5000) -> int:
+    """Recompute detector state and Vendor counters from transaction history.
+
+    Replays transactions in date order. Returns transactions replayed.
+    """
+    vendors_table = Vendor.__table__
+    transactions_table = Transaction.__table__
+    replayed = 0
+    with session_scope() as db:
+        conn = db.connection()
+        for model in (VendorAmountStats, VendorDailyCash, InvoiceFingerprint):
+            stmt = delete(model.__table__)
+            if vendor_ids is not None:
+                stmt = stmt.where(model.__table__.c.vendor_id.in_(vendor_ids))
+            conn.execute(stmt)
+        reset = update(vendors_table).values(amount_spikes=0, cash_split_days=0, duplicate_invoices=0, **DIRTY_MARK)
+        if vendor_ids is not None:
+            reset = reset.where(vendors_table.c.vendor_id.in_(vendor_ids))
+        conn.execute(reset)
+
+        query = select(*[transactions_table.c[name] for name in TRACKED_FIELDS]).order_by(
+            transactions_table.c.transaction_date, transactions_table.c.transaction_id
+        )
+        if vendor_ids is not None:
+            query = query.where(transactions_table.c.vendor_id.in_(vendor_ids))
+        for partition in conn.execute(query.execution_options(yield_per=chunk_size)).mappings().partitions():
+            apply_anomaly_rows(conn, [dict(row) for row in partition])
+            replayed += len(partition)
+    return replayed
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the transaction anomaly detectors from history")
+    parser.add_argument("--vendor", type=int, action="append", dest="vendor_ids", help="Limit to a vendor (repeatable)")
+    args = parser.parse_args()
+
+    init_database()
+    replayed = rebuild_anomaly_stats(args.vendor_ids)
+    print(f"Replayed {replayed} transactions; affected vendors are queued for rescoring")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import asyncio
+import importlib.util
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+
+from utils.rate_limit import TokenBucket
+
+# --- UPSTREAM HTTP BACKEND ---
+# One pooled httpx.AsyncClient per source (keep-alive, HTTP/2 when the `h2`
+# package is installed), jittered exponential-backoff retries, a circuit
+# breaker and a token bucket per source. BLOODHOUND_API_BACKEND selects the
+# transport: "fake" (default, offline, see fake_upstream.py) or "http".
+# `timeout` bounds one attempt; `deadline` bounds the whole call including
+# retries, backoff and rate-limit waits, and sits under the caller's
+# SOURCE_TIMEOUTS so the breaker sees a hung portal as a failure.
+
+API_BACKEND = os.getenv("BLOODHOUND_API_BACKEND", "fake")
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+SOURCE_CONFIG = {
+    "gstn": {
+        "base_url": os.getenv("GSTN_API_URL", "https://gstn.api.local"),
+        "path": "/taxpayers/{key}",
+        "api_key": os.getenv("GSTN_API_KEY"),
+        "rate": 10.0, "burst": 20, "timeout": 2.0, "deadline": 4.5,
+    },
+    "mca": {
+        "base_url": os.getenv("MCA_API_URL", "https://mca.api.local"),
+        "path": "/directors/{key}",
+        "api_key": os.getenv("MCA_API_KEY"),
+        "rate": 5.0, "burst": 10, "timeout": 2.0, "deadline": 4.5,
+    },
+    "ibbi": {
+        "base_url": os.getenv("IBBI_API_URL", "https://ibbi.api.local"),
+        "path": "/insolvency/{key}",
+        "api_key": os.getenv("IBBI_API_KEY"),
+        "rate": 5.0, "burst": 10, "timeout": 2.0, "deadline": 4.5,
+    },
+    "udyam": {
+        "base_url": os.getenv("UDYAM_API_URL", "https://udyam.api.local"),
+        "path": "/msme/{key}",
+        "api_key": os.getenv("UDYAM_API_KEY"),
+        "rate": 5.0, "burst": 10, "timeout": 2.0, "deadline": 4.5,
+    },
+}
+
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.2
+RETRY_MAX_DELAY = 2.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30.0
+
+POOL_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30.0)
+
+class UpstreamError(Exception):
+    """Upstream call failed after retries"""
+
+class CircuitOpenError(UpstreamError):
+    """Source is failing; calls are short-circuited until the breaker resets"""
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after a cool-down"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probe_in_flight:
+            # Let exactly one trial request through
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """The call ended without a verdict (caller cancelled): let another probe through"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+class UpstreamBackend:
+    """Pooled HTTP access to the GSTN/MCA/IBBI/Udyam portals"""
+
+    def __init__(self, transport_factory=None, config: dict = None, retry_attempts: int = RETRY_ATTEMPTS):
+        self.transport_factory = transport_factory
+        self.config = {source: {**cfg, **(config or {}).get(source, {})} for source, cfg in SOURCE_CONFIG.items()}
+        self.retry_attempts = retry_attempts
+        self.breakers = {source: CircuitBreaker() for source in self.config}
+        self.buckets = {source: TokenBucket(cfg["rate"], cfg["burst"]) for source, cfg in self.config.items()}
+        # Connection pools belong to an event loop, so clients are kept per loop
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self, source: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        clients = self._clients.setdefault(loop, {})
+        client = clients.get(source)
+        if client is None or client.is_closed:
+            cfg = self.config[source]
+            headers = {"x-bloodhound-source": source}
+            if cfg.get("api_key"):
+                headers["Authorization"] = f"Bearer {cfg['api_key']}"
+            client = httpx.AsyncClient(
+                base_url=cfg["base_url"],
+                headers=headers,
+                timeout=cfg["timeout"],
+                limits=POOL_LIMITS,
+                http2=HTTP2_AVAILABLE and self.transport_factory is None,
+                transport=self.transport_factory() if self.transport_factory else None,
+            )
+            clients[source] = client
+        return client
+
+    async def fetch(self, source: str, key: str) -> dict:
+        breaker = self.breakers[source]
+        if not breaker.allow():
+            raise CircuitOpenError(f"{source} circuit open")
+        # Errors, including our own attempt and deadline timeouts, count as failures.
+        # Cancellation is the caller giving up (page left, bulk run stopped), not the
+        # portal failing: it only frees a half-open probe slot
+        try:
+            payload, healthy = await self._fetch_with_retries(source, key)
+        except Exception:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release_probe()
+            raise
+        breaker.record_success()
+        if not healthy:
+            raise payload
+        return payload
+
+    async def _fetch_with_retries(self, source: str, key: str) -> tuple:
+        """(payload, True), or (error, False) for a 4xx the portal answered properly"""
+        cfg = self.config[source]
+        client = self._client(source)
+        path = cfg["path"].format(key=key)
+        deadline = time.monotonic() + cfg["deadline"]
+        last_error = UpstreamError(f"{source} deadline exceeded")
+        for attempt in range(self.retry_attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                # A rate-limit wait counts against the deadline too
+                await asyncio.wait_for(self.buckets[source].acquire(), remaining)
+            except asyncio.TimeoutError:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            attempt_timeout = min(cfg["timeout"], remaining)
+            try:
+                # wait_for as well: not every transport enforces httpx timeouts
+                response = await asyncio.wait_for(client.get(path, timeout=attempt_timeout), attempt_timeout)
+                if response.status_code in RETRY_STATUSES:
+                    last_error = UpstreamError(f"{source} HTTP {response.status_code}")
+                else:
+                    response.raise_for_status()
+                    return response.json(), True
+            except httpx.HTTPStatusError as e:
+                # 4xx other than 429: the portal is up, retrying won't help
+                return UpstreamError(f"{source} HTTP {e.response.status_code}"), False
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                last_error = UpstreamError(f"{source} {type(e).__name__}: {e or 'timed out'}")
+            if attempt + 1 < self.retry_attempts:
+                delay = backoff_delay(attempt)
+                if time.monotonic() + delay >= deadline:
+                    break
+                await asyncio.sleep(delay)
+        raise last_error
+
+    def breaker_states(self) -> dict:
+        return {source: breaker.state for source, breaker in self.breakers.items()}
+
+    async def aclose(self):
+        """Close the clients owned by the current event loop"""
+        clients = self._clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def create_backend(kind: str = None) -> UpstreamBackend:
+    kind = kind or API_BACKEND
+    if kind == "http":
+        return UpstreamBackend()
+    if kind == "fake":
+        from fake_upstream import fake_transport
+        return UpstreamBackend(transport_factory=fake_transport)
+    raise ValueError(f"Unknown API backend '{kind}'")
+
+def get_backend() -> UpstreamBackend:
+    """Process-wide backend selected by BLOODHOUND_API_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+def set_backend(backend: UpstreamBackend):
+    """Swap the process-wide backend (benchmarks, load tests)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import session_scope, ApiCacheEntry
+from metrics import register_collector
+
+logger = logging.getLogger("bloodhound.api_cache")
+
+# --- UPSTREAM RESPONSE CACHE ---
+# Level 1: in-process LRU with per-source TTL.
+# Level 2: persistent `api_cache` table shared by every process.
+# GSTN/Udyam payloads are keyed by GSTIN, MCA/IBBI by PAN, so one PAN behind
+# many GSTINs is only fetched once.
+
+# Freshness per source (seconds)
+CACHE_TTLS = {
+    "gstn": 6 * 3600,
+    "mca": 24 * 3600,
+    "ibbi": 24 * 3600,
+    "udyam": 7 * 24 * 3600,
+}
+
+CACHE_MAX_ENTRIES = 50000
+
+class ResponseCache:
+    """Two-level TTL + LRU cache for upstream API payloads"""
+
+    def __init__(self, ttls: dict = None, max_entries: int = CACHE_MAX_ENTRIES, persistent: bool = True):
+        self.ttls = {**CACHE_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self._entries = OrderedDict()  # (source, key) -> (stored_at, payload)
+        self._lock = threading.Lock()
+        self._inflight = {}  # (loop id, source, key, forced) -> Task
+        self._stats = {}
+
+    # --- stats ---
+    def _count(self, source: str, counter: str):
+        with self._lock:
+            stats = self._stats.setdefault(source, {"hits": 0, "db_hits": 0, "misses": 0, "stale": 0, "deduped": 0})
+            stats[counter] += 1
+
+    def stats(self) -> dict:
+        """Per-source counters plus hit ratio, for tuning TTLs"""
+        with self._lock:
+            report = {}
+            for source, stats in self._stats.items():
+                lookups = stats["hits"] + stats["db_hits"] + stats["misses"]
+                served = stats["hits"] + stats["db_hits"]
+                report[source] = {**stats, "hit_ratio": round(served / lookups, 4) if lookups else 0.0}
+            return report
+
+    # --- level 1 (memory) ---
+    def _memory_get(self, source: str, key: str):
+        with self._lock:
+            entry = self._entries.get((source, key))
+            if entry is None:
+                return None, False
+            stored_at, payload = entry
+            if time.time() - stored_at > self.ttls[source]:
+                del self._entries[(source, key)]
+                return None, True
+            self._entries.move_to_end((source, key))
+            return payload, False
+
+    def _memory_put(self, source: str, key: str, payload: dict, stored_at: float = None):
+        with self._lock:
+            self._entries[(source, key)] = (stored_at or time.time(), payload)
+            self._entries.move_to_end((source, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # --- level 2 (database) ---
+    def _db_get(self, source: str, key: str):
+        with session_scope() as db:
+            entry = db.get(ApiCacheEntry, (source, key))
+            if entry is None:
+                return None, None, False
+            age = (datetime.utcnow() - entry.fetched_at).total_seconds()
+            if age > self.ttls[source]:
+                return None, None, True
+            return entry.payload, time.time() - age, False
+
+    def _db_put(self, source: str, key: str, payload: dict):
+        """Upsert one row; concurrent writers of the same key both succeed, last one wins"""
+        row = {"source": source, "cache_key": key, "payload": payload, "fetched_at": datetime.utcnow()}
+        with session_scope() as db:
+            dialect = db.get_bind().dialect.name
+            if dialect not in ("sqlite", "postgresql"):
+                db.merge(ApiCacheEntry(**row))
+                return
+            dialect_insert = sqlite_insert if dialect == "sqlite" else pg_insert
+            stmt = dialect_insert(ApiCacheEntry.__table__).values(row)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["source", "cache_key"],
+                set_={"payload": stmt.excluded.payload, "fetched_at": stmt.excluded.fetched_at}
+            )
+            db.execute(stmt)
+
+    # --- public API ---
+    def get(self, source: str, key: str):
+        """Return a fresh cached payload or None (sync, checks both levels)"""
+        payload, stale = self._memory_get(source, key)
+        if payload is not None:
+            self._count(source, "hits")
+            return payload
+        if self.persistent:
+            payload, stored_at, db_stale = self._db_get(source, key)
+            stale = stale or db_stale
+            if payload is not None:
+                self._count(source, "db_hits")
+                self._memory_put(source, key, payload, stored_at)
+                return payload
+        if stale:
+            self._count(source, "stale")
+        self._count(source, "misses")
+        return None
+
+    def put(self, source: str, key: str, payload: dict):
+        """Store a payload in both levels. Error payloads are never cached."""
+        if not payload or "error" in payload:
+            return
+        self._memory_put(source, key, payload)
+        if self.persistent:
+            self._db_put(source, key, payload)
+
+    def invalidate(self, source: str, key: str):
+        with self._lock:
+            self._entries.pop((source, key), None)
+        if self.persistent:
+            with session_scope() as db:
+                entry = db.get(ApiCacheEntry, (source, key))
+                if entry is not None:
+                    db.delete(entry)
+
+    async def get_or_fetch(self, source: str, key: str, fetch, force_refresh: bool = False) -> dict:
+        """Return cached payload or await `fetch()` once per (source, key).
+
+        Concurrent lookups for the same key in the same event loop share one
+        upstream call (e.g. MCA/IBBI for a PAN behind several GSTINs). The
+        shared lookup runs in its own task, so a caller that is cancelled
+        doesn't cancel it for the others. A forced refresh only joins another
+        forced refresh, never a lookup that may be answered from the cache.
+        """
+        if not force_refresh:
+            payload, _ = self._memory_get(source, key)
+            if payload is not None:
+                self._count(source, "hits")
+                return payload
+
+        loop = asyncio.get_running_loop()
+        flight_keys = [(id(loop), source, key, True)]
+        if not force_refresh:
+            flight_keys.append((id(loop), source, key, False))
+        for flight_key in flight_keys:
+            inflight = self._inflight.get(flight_key)
+            if inflight is not None:
+                self._count(source, "deduped")
+                return await asyncio.shield(inflight)
+
+        flight_key = flight_keys[-1]
+        task = loop.create_task(self._lookup(source, key, fetch, force_refresh))
+        self._inflight[flight_key] = task
+        task.add_done_callback(lambda done: self._end_flight(flight_key, done))
+        return await asyncio.shield(task)
+
+    async def _lookup(self, source: str, key: str, fetch, force_refresh: bool) -> dict:
+        payload = None
+        if not force_refresh:
+            payload = await asyncio.to_thread(self.get, source, key)
+        if payload is None:
+            payload = await fetch()
+            try:
+                await asyncio.to_thread(self.put, source, key, payload)
+            except Exception:
+                # Best effort: a failed cache write must not fail the lookup or its waiters
+                logger.warning("Could not cache %s payload for %s", source, key, exc_info=True)
+        return payload
+
+    def _end_flight(self, flight_key: tuple, task: asyncio.Task):
+        if self._inflight.get(flight_key) is task:
+            del self._inflight[flight_key]
+        # Mark retrieved so a failure every caller abandoned doesn't log a warning
+        if not task.cancelled():
+            task.exception()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+def cache_stats() -> dict:
+    return get_response_cache().stats()
+
+def _cache_metrics() -> list:
+    """Response-cache counters for the metrics exporter (read from stats(), not double-counted)"""
+    cache = get_response_cache()
+    lookups = [
+        ({"source": source, "result": result}, stats[result])
+        for source, stats in cache.stats().items()
+        for result in ("hits", "db_hits", "misses", "stale", "deduped")
+    ]
+    return [
+        ("bloodhound_response_cache_lookups_total", "counter", "Response cache lookups by result", lookups),
+        ("bloodhound_response_cache_entries", "gauge", "Payloads held in the in-memory cache level",
+         [({}, len(cache._entries))]),
+    ]
+
+register_collector(_cache_metrics)
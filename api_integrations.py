@@ -1,102 +1,337 @@
 import asyncio
-import random
-from datetime import datetime, timedelta
+import atexit
+import concurrent.futures
+import queue
+import threading
+import time
+from datetime import datetime
 
-# --- MOCK API INTEGRATIONS ---
-# No keys required. Safe for Hackathon Demos.
+from api_backends import SOURCE_CONFIG, get_backend
+from api_cache import get_response_cache
+from metrics import UPSTREAM_SECONDS
+from utils.identifiers import describe_gstin_error, normalize_identifier, pan_from_gstin, validate_gstins
+
+# --- API INTEGRATIONS ---
+# Source calls go through the pluggable backend in api_backends.py (offline
+# fake portals by default, real HTTP with BLOODHOUND_API_BACKEND=http).
 
 def extract_pan_from_gstin(gstin: str) -> str:
-    """Extract PAN from GSTIN (positions 2-11)"""
-    if len(gstin) >= 15:
-        return gstin[2:12].upper()
-    return "ABCDE1234F"
+    """PAN embedded in a GSTIN (positions 2-11); None unless the GSTIN validates"""
+    return pan_from_gstin(gstin)
 
 async def fetch_gstn_data(gstin: str) -> dict:
-    """MOCK GSTN DATA GENERATOR"""
-    # 1. Fake a small delay to look like a real network call
-    await asyncio.sleep(0.8)
-    
-    # 2. Generate realistic random data
-    registration_date = datetime.now() - timedelta(days=random.randint(10, 1500))
-    status = random.choice(["Active", "Active", "Active", "Suspended", "Cancelled"])
-    trade_name = f"Demo Trader {gstin[:4]}"
-    
-    return {
-        "gstin": gstin,
-        "legal_name": f"Demo Enterprise {gstin[:4]} Pvt Ltd",
-        "trade_name": trade_name,
-        "registration_date": registration_date.strftime("%Y-%m-%d"),
-        "status": status,
-        "taxpayer_type": "Regular",
-        "gstr1_last_filed": "2024-10",
-        "gstr3b_last_filed": "2024-10" if status == "Active" else "Not Filed",
-        "center_jurisdiction": "Commissioner-5",
-        "state_jurisdiction": "Ward-3",
-        "api_timestamp": datetime.now().isoformat()
-    }
+    """GSTN taxpayer profile and return filing status"""
+    return await get_backend().fetch("gstn", gstin)
 
 async def fetch_mca_data(pan: str) -> dict:
-    """MOCK MCA DATA GENERATOR"""
-    await asyncio.sleep(0.6)
-    company_count = random.randint(1, 25)
-    
-    return {
-        "pan": pan,
-        "director_name": f"Director {pan[:4]}",
-        "total_companies": company_count,
-        "active_companies": company_count - random.randint(0, 2),
-        "dissolved_companies": random.randint(0, 2),
-        "recent_incorporations": random.randint(0, 1),
-        # Flag as risky if director is in too many companies
-        "flagged_entities": 2 if company_count > 20 else 0,
-        "compliance_status": "Compliant",
-        "api_timestamp": datetime.now().isoformat()
-    }
+    """MCA director / company associations for a PAN"""
+    return await get_backend().fetch("mca", pan)
 
 async def fetch_ibbi_data(pan: str) -> dict:
-    """MOCK INSOLVENCY CHECK"""
-    await asyncio.sleep(0.4)
-    is_risky = random.choice([True, False, False, False, False]) # 20% chance of risk
-    
-    return {
-        "pan": pan,
-        "insolvency_status": "Under CIRP" if is_risky else "Clear",
-        "nclt_cases": 1 if is_risky else 0,
-        "ibbi_registered": False,
-        "api_timestamp": datetime.now().isoformat()
-    }
+    """IBBI insolvency check for a PAN"""
+    return await get_backend().fetch("ibbi", pan)
 
 async def fetch_udyam_data(gstin: str) -> dict:
-    """MOCK MSME CHECK"""
-    await asyncio.sleep(0.3)
+    """Udyam MSME registration check"""
+    return await get_backend().fetch("udyam", gstin)
+
+# --- CONCURRENT ORCHESTRATION ---
+
+# Per-source timeouts (seconds). A slow portal only loses its own section.
+# A backstop just above the backend's own deadline (retries included).
+SOURCE_TIMEOUTS = {source: cfg["deadline"] + 0.5 for source, cfg in SOURCE_CONFIG.items()}
+
+# Max in-flight requests per upstream source during bulk checks
+SOURCE_CONCURRENCY = {"gstn": 20, "mca": 10, "ibbi": 10, "udyam": 10}
+
+async def _timed_fetch(source: str, fetch, key: str) -> dict:
+    """One upstream call under its timeout, observed in UPSTREAM_SECONDS by outcome"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        payload = await asyncio.wait_for(fetch(key), SOURCE_TIMEOUTS[source])
+        outcome = "ok"
+        return payload
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, source, outcome)
+
+async def _fetch_with_timeout(source: str, fetch, key: str, limit: asyncio.Semaphore = None) -> dict:
+    """Await one source call, turning a timeout/failure into an error payload"""
+    try:
+        if limit is None:
+            return await _timed_fetch(source, fetch, key)
+        async with limit:
+            return await _timed_fetch(source, fetch, key)
+    except asyncio.TimeoutError:
+        return {"error": "timeout", "source": source, "api_timestamp": datetime.now().isoformat()}
+    except Exception as e:
+        return {"error": str(e), "source": source, "api_timestamp": datetime.now().isoformat()}
+
+async def _fetch_source(source: str, fetch, key: str, limits: dict, use_cache: bool, force_refresh: bool) -> dict:
+    """Serve one source from the response cache, falling back to upstream"""
+    if not use_cache:
+        return await _fetch_with_timeout(source, fetch, key, limits.get(source))
+    return await get_response_cache().get_or_fetch(
+        source, key,
+        lambda: _fetch_with_timeout(source, fetch, key, limits.get(source)),
+        force_refresh=force_refresh
+    )
+
+# Result section -> (source, fetch, key kind); GSTN/Udyam are keyed by GSTIN, MCA/IBBI by PAN
+CHECK_SECTIONS = {
+    "gstin_data": ("gstn", fetch_gstn_data, "gstin"),
+    "mca_data": ("mca", fetch_mca_data, "pan"),
+    "ibbi_data": ("ibbi", fetch_ibbi_data, "pan"),
+    "udyam_data": ("udyam", fetch_udyam_data, "gstin"),
+}
+
+def _invalid_gstin_result(gstin: str) -> dict:
+    now = datetime.now().isoformat()
+    error = describe_gstin_error(gstin)
+    sections = {
+        section: {"error": error, "source": source, "api_timestamp": now}
+        for section, (source, _, _) in CHECK_SECTIONS.items()
+    }
+    return {**sections, "pan_extracted": None, "invalid_gstin": error, "check_timestamp": now}
+
+def _section_fetches(gstin: str, pan: str, limits: dict, use_cache: bool, force_refresh: bool) -> dict:
+    keys = {"gstin": gstin, "pan": pan}
     return {
-        "gstin": gstin,
-        "udyam_registered": True,
-        "msme_category": random.choice(["Micro", "Small", "Medium"]),
-        "registration_date": "2021-05-20",
-        "api_timestamp": datetime.now().isoformat()
+        section: _fetch_source(source, fetch, keys[kind], limits, use_cache, force_refresh)
+        for section, (source, fetch, kind) in CHECK_SECTIONS.items()
     }
 
-async def run_all_checks(gstin: str) -> dict:
-    """Orchestrate all mock checks"""
+async def run_all_checks(gstin: str, limits: dict = None, use_cache: bool = True, force_refresh: bool = False) -> dict:
+    """Orchestrate all mock checks (sources run concurrently).
+
+    Malformed GSTINs (bad layout, state code or check digit) are answered
+    locally with an error payload per source; no upstream call is made.
+    """
+    gstin = normalize_identifier(gstin)
     pan = extract_pan_from_gstin(gstin)
+    if pan is None:
+        return _invalid_gstin_result(gstin)
     
-    # In real code we would use asyncio.gather, but sequential is safer for mock
-    gstn = await fetch_gstn_data(gstin)
-    mca = await fetch_mca_data(pan)
-    ibbi = await fetch_ibbi_data(pan)
-    udyam = await fetch_udyam_data(gstin)
+    fetches = _section_fetches(gstin, pan, limits or {}, use_cache, force_refresh)
+    payloads = await asyncio.gather(*fetches.values())
     
     return {
-        "gstin_data": gstn,
-        "mca_data": mca,
-        "ibbi_data": ibbi,
-        "udyam_data": udyam,
+        **dict(zip(fetches, payloads)),
         "pan_extracted": pan,
         "check_timestamp": datetime.now().isoformat()
     }
 
-def check_vendor_apis(gstin: str) -> dict:
-    """Sync wrapper for Streamlit to call"""
-    return asyncio.run(run_all_checks(gstin))
+async def iter_all_checks(gstin: str, limits: dict = None, use_cache: bool = True, force_refresh: bool = False):
+    """Async generator yielding (section, payload) as each source answers.
+
+    Same checks as run_all_checks, but the fastest source is available as
+    soon as it returns. Closing the generator early (or cancelling the task
+    iterating it) cancels the sources still in flight.
+    """
+    gstin = normalize_identifier(gstin)
+    pan = extract_pan_from_gstin(gstin)
+    if pan is None:
+        invalid = _invalid_gstin_result(gstin)
+        for section in CHECK_SECTIONS:
+            yield section, invalid[section]
+        return
+    
+    fetches = _section_fetches(gstin, pan, limits or {}, use_cache, force_refresh)
+    running = {asyncio.ensure_future(fetch): section for section, fetch in fetches.items()}
+    try:
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield running.pop(task), task.result()
+    finally:
+        for task in running:
+            task.cancel()
+
+BULK_VALIDATION_CHUNK = 10000
+
+def _validated_gstins(gstins):
+    """(normalised GSTIN, is_valid) for each distinct input, validated a chunk at a time"""
+    seen = set()
+    iterator = iter(gstins)
+    while True:
+        chunk = [gstin for _, gstin in zip(range(BULK_VALIDATION_CHUNK), iterator)]
+        if not chunk:
+            return
+        result = validate_gstins(chunk)
+        for gstin, code in zip(result["normalized"].tolist(), result["errors"].tolist()):
+            if gstin in seen:
+                continue
+            seen.add(gstin)
+            yield gstin, code == 0
+
+async def run_bulk_checks(gstins, max_vendors_in_flight: int = 50, source_limits: dict = None, use_cache: bool = True):
+    """Check many vendors with bounded concurrency.
+
+    Async generator yielding (gstin, result) as each vendor finishes, so
+    callers can persist/render results without waiting for the whole batch.
+    In-flight requests are capped per upstream source, and each source call
+    is subject to SOURCE_TIMEOUTS. GSTINs are normalised and validated in
+    vectorized chunks first: duplicates collapse and invalid ones are
+    yielded straight away with an error result, without touching the network.
+    """
+    source_limits = {**SOURCE_CONCURRENCY, **(source_limits or {})}
+    limits = {source: asyncio.Semaphore(n) for source, n in source_limits.items()}
+    
+    async def check_one(gstin):
+        return gstin, await run_all_checks(gstin, limits)
+    
+    # Dedupe while keeping input order; schedule lazily so huge lists don't
+    # create thousands of pending tasks up front.
+    pending_gstins = _validated_gstins(gstins)
+    running = set()
+    rejected = []
     
+    def schedule_next():
+        for gstin, is_valid in pending_gstins:
+            if not is_valid:
+                rejected.append((gstin, _invalid_gstin_result(gstin)))
+                continue
+            running.add(asyncio.ensure_future(check_one(gstin)))
+            return True
+        return False
+    
+    while len(running) < max_vendors_in_flight and schedule_next():
+        pass
+    
+    try:
+        while running or rejected:
+            for gstin, result in rejected:
+                yield gstin, result
+            rejected.clear()
+            if not running:
+                break
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                running.discard(task)
+                schedule_next()
+                yield task.result()
+    finally:
+        for task in running:
+            task.cancel()
+
+# --- BACKGROUND EVENT LOOP ---
+# Sync callers (Streamlit pages, scripts) share one long-lived event loop
+# running on a daemon thread instead of paying asyncio.run per check. Jobs
+# come back as concurrent futures or as a CheckStream of per-source results;
+# pooled upstream connections, token buckets and in-flight dedupe all stay
+# bound to this one loop.
+
+class BackgroundLoop:
+    """An asyncio loop on its own daemon thread"""
+
+    def __init__(self, name: str = "bloodhound-api-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop; cancelling the future cancels the task"""
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("Blocking on the background loop from its own thread would deadlock")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, timeout: float = 5.0):
+        """Close the loop's upstream clients, then stop the thread"""
+        if not self.loop.is_running():
+            return
+        try:
+            self.submit(get_backend().aclose()).result(timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+_background = None
+_background_lock = threading.Lock()
+
+def get_background_loop() -> BackgroundLoop:
+    """Process-wide background loop, started on first use"""
+    global _background
+    if _background is None:
+        with _background_lock:
+            if _background is None:
+                _background = BackgroundLoop()
+                atexit.register(_background.stop)
+    return _background
+
+_STREAM_DONE = object()
+
+class CheckStream:
+    """Sync view of one vendor check running on the background loop.
+
+    Iterate to get (section, payload) pairs in arrival order; `results`
+    fills up as they come in. cancel() stops the sources still in flight
+    (e.g. when the user navigates away mid-check).
+    """
+
+    def __init__(self, gstin: str, force_refresh: bool = False):
+        self.gstin = normalize_identifier(gstin)
+        self.results = {}
+        self._queue = queue.Queue()
+        self._future = get_background_loop().submit(self._pump(iter_all_checks(self.gstin, force_refresh=force_refresh)))
+
+    async def _pump(self, stream):
+        try:
+            async for item in stream:
+                self._queue.put(item)
+        finally:
+            await stream.aclose()
+            self._queue.put(_STREAM_DONE)
+
+    def __iter__(self):
+        while len(self.results) < len(CHECK_SECTIONS):
+            item = self._queue.get()
+            if item is _STREAM_DONE:
+                return
+            section, payload = item
+            self.results[section] = payload
+            yield section, payload
+
+    @property
+    def complete(self) -> bool:
+        return len(self.results) == len(CHECK_SECTIONS)
+
+    def cancel(self):
+        self._future.cancel()
+
+    def as_result(self) -> dict:
+        """The collected sections in run_all_checks' shape"""
+        return {
+            **self.results,
+            "pan_extracted": extract_pan_from_gstin(self.gstin),
+            "check_timestamp": datetime.now().isoformat(),
+        }
+
+def stream_vendor_checks(gstin: str, force_refresh: bool = False) -> CheckStream:
+    """Start a vendor check and return a stream of per-source results"""
+    return CheckStream(gstin, force_refresh)
+
+def submit_vendor_check(gstin: str, force_refresh: bool = False) -> concurrent.futures.Future:
+    """Start a vendor check; the future resolves to run_all_checks' result"""
+    return get_background_loop().submit(run_all_checks(gstin, force_refresh=force_refresh))
+
+def check_vendor_apis(gstin: str, force_refresh: bool = False) -> dict:
+    """Sync wrapper for Streamlit to call"""
+    return submit_vendor_check(gstin, force_refresh).result()
+
+def check_vendors_bulk(gstins) -> dict:
+    """Sync wrapper: run bulk checks and collect {gstin: result}"""
+    async def collect():
+        return {gstin: result async for gstin, result in run_bulk_checks(gstins)}
+    return get_background_loop().submit(collect()).result()
@@ -1,7 +1,10 @@
 import streamlit as st
 from database import init_database
+from metrics import track_page
 from utils.styling import inject_custom_css
 
+track_page("app")
+
 # Initialize DB
 if 'db_initialized' not in st.session_state:
     init_database()
@@ -33,6 +36,8 @@ def main():
             st.switch_page("pages/03_Client_Dashboard.py")
         elif st.session_state.role == "ca":
             st.switch_page("pages/04_CA_Dashboard.py")
+        elif st.session_state.role == "admin":
+            st.switch_page("pages/06_Admin_Metrics.py")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,305 @@
+"""Buffered, month-partitioned audit trail.
+
+    python audit.py --archive-before 2024-01            # gzip old partitions
+    python audit.py --archive-before 2024-01 --drop     # ...and drop them
+
+Events are appended to an in-memory buffer and written by a background
+thread in batched inserts, when the buffer reaches AUDIT_BATCH_SIZE or
+every AUDIT_FLUSH_SECONDS, and once more at interpreter exit. Each month
+gets its own table (audit_logs_YYYY_MM, same columns as AuditLog), so a
+date-range query only touches the months it covers and old months can be
+archived to gzipped JSON Lines and dropped as a unit.
+"""
+import argparse
+import atexit
+import gzip
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+
+from sqlalchemy import JSON, Column, DateTime, Index, Integer, MetaData, String, Table, func, inspect, insert, select
+
+from database import init_database, get_engine
+
+logger = logging.getLogger("bloodhound.audit")
+
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "2.0"))
+AUDIT_MAX_BUFFER = int(os.getenv("AUDIT_MAX_BUFFER", "100000"))
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR", "./audit_archive")
+# Flushes an event may fail before it is moved to the dead-letter file
+AUDIT_MAX_ATTEMPTS = int(os.getenv("AUDIT_MAX_ATTEMPTS", "3"))
+# Consecutive row failures (with no success) that mean the database is down, not the events
+AUDIT_OUTAGE_ROWS = 5
+AUDIT_DEAD_LETTER = os.path.join(AUDIT_ARCHIVE_DIR, "dead_letter.jsonl")
+
+AUDIT_COLUMNS = ("user_id", "action", "details", "ip_address", "created_at")
+
+PARTITION_PATTERN = re.compile(r"^audit_logs_(\d{4})_(\d{2})$")
+
+# --- PARTITIONS ---
+# Kept out of Base.metadata: partitions are created on demand, not by create_all.
+# user_id is deliberately not a foreign key so the trail outlives deleted users.
+
+_partition_metadata = MetaData()
+_created_partitions = set()
+_partition_lock = threading.Lock()
+
+def partition_name(when: datetime) -> str:
+    return f"audit_logs_{when:%Y_%m}"
+
+def partition_table(name: str) -> Table:
+    if name in _partition_metadata.tables:
+        return _partition_metadata.tables[name]
+    return Table(
+        name, _partition_metadata,
+        Column("log_id", Integer, primary_key=True, autoincrement=True),
+        Column("user_id", Integer, nullable=True),
+        Column("action", String, nullable=False),
+        Column("details", JSON),
+        Column("ip_address", String),
+        Column("created_at", DateTime, nullable=False),
+        Index(f"ix_{name}_created", "created_at"),
+        Index(f"ix_{name}_user_created", "user_id", "created_at"),
+    )
+
+def _ensure_partition(conn, name: str) -> Table:
+    table = partition_table(name)
+    if name not in _created_partitions:
+        with _partition_lock:
+            if name not in _created_partitions:
+                table.create(conn, checkfirst=True)
+                _created_partitions.add(name)
+    return table
+
+def list_partitions() -> list:
+    """Existing partition table names, oldest first"""
+    return sorted(name for name in inspect(get_engine()).get_table_names() if PARTITION_PATTERN.match(name))
+
+def _months_between(start: datetime, end: datetime) -> set:
+    months = set()
+    index = start.year * 12 + start.month - 1
+    last = end.year * 12 + end.month - 1
+    while index <= last:
+        months.add(f"audit_logs_{index // 12:04d}_{index % 12 + 1:02d}")
+        index += 1
+    return months
+
+# --- WRITER ---
+
+class AuditWriter:
+    """Thread-safe buffered writer; flushes on size, on a timer and at exit"""
+
+    def __init__(self, batch_size: int = AUDIT_BATCH_SIZE, flush_seconds: float = AUDIT_FLUSH_SECONDS,
+                 max_buffer: int = AUDIT_MAX_BUFFER):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self.written = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def log(self, user_id, action: str, details: dict = None, ip_address: str = None):
+        event = {
+            "user_id": user_id,
+            "action": action,
+            "details": details or {},
+            "ip_address": ip_address,
+            "created_at": datetime.utcnow(),
+        }
+        with self._lock:
+            self._buffer.append(event)
+            if len(self._buffer) > self.max_buffer:
+                # Database unreachable for a long time: shed the oldest events rather than exhaust memory
+                overflow = len(self._buffer) - self.max_buffer
+                del self._buffer[:overflow]
+                self.dropped += overflow
+            full = len(self._buffer) >= self.batch_size
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def _insert(self, events: list):
+        by_partition = {}
+        for event in events:
+            row = {column: event[column] for column in AUDIT_COLUMNS}
+            by_partition.setdefault(partition_name(event["created_at"]), []).append(row)
+        with get_engine().begin() as conn:
+            for name, rows in by_partition.items():
+                conn.execute(insert(_ensure_partition(conn, name)), rows)
+
+    def _insert_each(self, events: list) -> tuple:
+        """Row-by-row retry after a failed batch. Returns (written, retry, dead)."""
+        written = 0
+        retry, dead = [], []
+        for i, event in enumerate(events):
+            try:
+                self._insert([event])
+                written += 1
+                continue
+            except Exception:
+                logger.warning("Audit event %r could not be written", event["action"], exc_info=True)
+            event["attempts"] = event.get("attempts", 0) + 1
+            (dead if event["attempts"] >= AUDIT_MAX_ATTEMPTS else retry).append(event)
+            if not written and len(retry) + len(dead) >= AUDIT_OUTAGE_ROWS:
+                # Nothing gets through: keep the rest as they are for the next flush
+                retry.extend(events[i + 1:])
+                break
+        return written, retry, dead
+
+    def _dead_letter(self, events: list):
+        """Append events that keep failing to AUDIT_DEAD_LETTER instead of retrying them forever"""
+        try:
+            os.makedirs(os.path.dirname(AUDIT_DEAD_LETTER), exist_ok=True)
+            with open(AUDIT_DEAD_LETTER, "a", encoding="utf-8") as out:
+                for event in events:
+                    out.write(json.dumps(event, default=str) + "\n")
+            self.dead_lettered += len(events)
+            logger.error("Moved %d audit events to %s", len(events), AUDIT_DEAD_LETTER)
+        except OSError:
+            logger.exception("Could not dead-letter %d audit events; dropping them", len(events))
+            self.dropped += len(events)
+
+    def flush(self) -> int:
+        """Write everything buffered so far. Returns events written.
+
+        A failed batch is retried row by row, so one bad event (say, a detail
+        the JSON column can't serialise) doesn't hold back the others. Events
+        that fail AUDIT_MAX_ATTEMPTS flushes are dead-lettered.
+        """
+        with self._flush_lock:
+            with self._lock:
+                events, self._buffer = self._buffer, []
+            if not events:
+                return 0
+            try:
+                self._insert(events)
+                written, retry, dead = len(events), [], []
+            except Exception:
+                logger.exception("Audit batch of %d events failed; retrying row by row", len(events))
+                written, retry, dead = self._insert_each(events)
+            if retry:
+                with self._lock:
+                    self._buffer[:0] = retry
+            if dead:
+                self._dead_letter(dead)
+            self.written += written
+            return written
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def close(self):
+        """Stop the background thread and flush what is left"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_audit_writer() -> AuditWriter:
+    """Process-wide writer, flushed on clean interpreter shutdown"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditWriter()
+                atexit.register(_writer.close)
+    return _writer
+
+def audit_event(user_id, action: str, ip_address: str = None, **details):
+    """Record an audit event (non-blocking)"""
+    get_audit_writer().log(user_id, action, details, ip_address)
+
+# --- QUERIES ---
+
+def query_audit_events(start: datetime, end: datetime, user_id: int = None, action: str = None, limit: int = 1000) -> list:
+    """Events with start <= created_at < end, oldest first; only the covering partitions are read"""
+    names = _months_between(start, end) & set(list_partitions())
+    per_partition = []
+    with get_engine().connect() as conn:
+        for name in sorted(names):
+            table = partition_table(name)
+            query = (
+                select(table)
+                .where(table.c.created_at >= start, table.c.created_at < end)
+                .order_by(table.c.created_at, table.c.log_id)
+                .limit(limit)
+            )
+            if user_id is not None:
+                query = query.where(table.c.user_id == user_id)
+            if action is not None:
+                query = query.where(table.c.action == action)
+            per_partition.append([dict(row._mapping) for row in conn.execute(query)])
+    merged = heapq.merge(*per_partition, key=lambda e: e["created_at"])
+    return [event for _, event in zip(range(limit), merged)]
+
+# --- ARCHIVE ---
+
+def archive_partition(name: str, archive_dir: str = AUDIT_ARCHIVE_DIR, drop: bool = False) -> dict:
+    """Stream one partition to <archive_dir>/<name>.jsonl.gz; optionally drop it once verified"""
+    if not PARTITION_PATTERN.match(name):
+        raise ValueError(f"Not an audit partition: {name}")
+    if drop and name == partition_name(datetime.utcnow()):
+        raise ValueError("Refusing to drop the current month's partition")
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.jsonl.gz")
+    table = partition_table(name)
+    engine = get_engine()
+    written = 0
+    with engine.connect() as conn, gzip.open(path + ".tmp", "wt", encoding="utf-8") as out:
+        for row in conn.execute(select(table).order_by(table.c.log_id).execution_options(yield_per=5000)):
+            out.write(json.dumps(dict(row._mapping), default=str) + "\n")
+            written += 1
+    os.replace(path + ".tmp", path)
+
+    if drop:
+        with engine.begin() as conn:
+            count = conn.execute(select(func.count()).select_from(table)).scalar_one()
+            if count != written:
+                raise RuntimeError(f"{name} changed during archiving ({written} archived, {count} now); not dropped")
+            table.drop(conn)
+        _created_partitions.discard(name)
+    return {"partition": name, "path": path, "events": written, "dropped": drop}
+
+def archive_before(month: str, archive_dir: str = AUDIT_ARCHIVE_DIR, drop: bool = False) -> list:
+    """Archive every partition older than `month` ("YYYY-MM")"""
+    cutoff = "audit_logs_" + month.replace("-", "_")
+    return [archive_partition(name, archive_dir, drop) for name in list_partitions() if name < cutoff]
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive month partitions of the audit trail")
+    parser.add_argument("--archive-before", required=True, metavar="YYYY-MM")
+    parser.add_argument("--dir", default=AUDIT_ARCHIVE_DIR)
+    parser.add_argument("--drop", action="store_true", help="Drop partitions after archiving them")
+    args = parser.parse_args()
+
+    init_database()
+    for result in archive_before(args.archive_before, args.dir, args.drop):
+        print(f"{result['partition']}: {result['events']} events -> {result['path']}"
+              f"{' (dropped)' if result['dropped'] else ''}")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,44 @@
 import streamlit as st
 import bcrypt
+import os
 import secrets
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from database import get_session, User, CAProfile, EntityProfile, UserRole
+from database import session_scope, User, CAProfile, EntityProfile, UserRole
+from audit import audit_event
+from metrics import BCRYPT_SECONDS
+from sqlalchemy import case, select, update
 from sqlalchemy.exc import IntegrityError
 
 # Password hashing
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# bcrypt releases the GIL, so a small dedicated pool keeps a month-end login
+# burst from pinning every CPU while other reruns keep being served.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
 
-def verify_password(password: str, hashed: str) -> bool:
+_hash_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+def _hashpw(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _checkpw(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+def hash_password(password: str, rounds: int = None) -> str:
+    with BCRYPT_SECONDS.time("hash"):
+        return _hash_pool.submit(_hashpw, password, rounds or BCRYPT_ROUNDS).result()
+
+def verify_password(password: str, hashed: str) -> bool:
+    with BCRYPT_SECONDS.time("verify"):
+        return _hash_pool.submit(_checkpw, password, hashed).result()
+
+def needs_rehash(hashed: str) -> bool:
+    """True when a stored hash was made with a different cost factor than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
 # Generate unique CA invite code
 def generate_invite_code():
     return f"CA-{secrets.token_hex(4).upper()}"
@@ -22,50 +49,45 @@ def login_user(user_id: int, role: str, entity_id: int = None):
     st.session_state.role = role
     st.session_state.entity_id = entity_id
     st.session_state.authenticated = True
-    
-    # Update last login
-    db = get_session()
-    user = db.query(User).filter(User.user_id == user_id).first()
-    if user:
-        user.last_login = datetime.utcnow()
-        db.commit()
-    db.close()
+    # last_login is written by signin_user once the password checks out
 
 def logout_user():
-    for key in ['user_id', 'role', 'entity_id', 'authenticated', 'setup_complete']:
+    if st.session_state.get('user_id') is not None:
+        audit_event(st.session_state.user_id, "auth.logout")
+    for key in ['user_id', 'role', 'entity_id', 'ca_id', 'authenticated', 'setup_complete']:
         if key in st.session_state:
             del st.session_state[key]
     st.rerun()
 
 # Sign Up Logic
 def signup_user(email: str, password: str, full_name: str, role: str, firm_name: str = None, membership_no: str = None):
-    db = get_session()
     try:
-        # Create User
-        new_user = User(
-            email=email.lower().strip(),
-            password_hash=hash_password(password),
-            full_name=full_name.strip(),
-            role=UserRole(role)
-        )
-        db.add(new_user)
-        db.flush()
-        
-        # If CA, create CA Profile
-        if role == "ca" and firm_name and membership_no:
-            ca_profile = CAProfile(
-                user_id=new_user.user_id,
-                firm_name=firm_name.strip(),
-                membership_no=membership_no.strip(),
-                invite_code=generate_invite_code()
+        with session_scope() as db:
+            # Create User
+            new_user = User(
+                email=email.lower().strip(),
+                password_hash=hash_password(password),
+                full_name=full_name.strip(),
+                role=UserRole(role)
             )
-            db.add(ca_profile)
+            db.add(new_user)
+            db.flush()
+            user_id = new_user.user_id
+            
+            # If CA, create CA Profile
+            if role == "ca" and firm_name and membership_no:
+                ca_profile = CAProfile(
+                    user_id=user_id,
+                    firm_name=firm_name.strip(),
+                    membership_no=membership_no.strip(),
+                    invite_code=generate_invite_code()
+                )
+                db.add(ca_profile)
         
-        db.commit()
-        return True, new_user.user_id, "Account created successfully!"
+        audit_event(user_id, "auth.signup", role=role)
+        return True, user_id, "Account created successfully!"
     
     except IntegrityError as e:
-        db.rollback()
         if "email" in str(e.orig):
             return False, None, "Email already registered. Please login."
         elif "membership_no" in str(e.orig):
@@ -73,49 +95,58 @@ def signup_user(email: str, password: str, full_name: str, role: str, firm_name:
         else:
             return False, None, f"Registration error: {str(e)}"
     except Exception as e:
-        db.rollback()
         return False, None, f"Unexpected error: {str(e)}"
-    finally:
-        db.close()
 
 # Sign In Logic
 def signin_user(email: str, password: str):
-    db = get_session()
     try:
-        user = db.query(User).filter(User.email == email.lower().strip()).first()
-        
-        if not user:
+        # Read what's needed and release the connection before the deliberately slow bcrypt check
+        with session_scope() as db:
+            row = db.execute(
+                select(User.user_id, User.role, User.is_active, User.password_hash,
+                       EntityProfile.entity_id, EntityProfile.is_setup_complete)
+                .outerjoin(EntityProfile, EntityProfile.user_id == User.user_id)
+                .where(User.email == email.lower().strip())
+                .limit(1)
+            ).first()
+
+        if not row:
             return False, None, None, None, "Email not found. Please sign up first."
-        
-        if not user.is_active:
+
+        if not row.is_active:
             return False, None, None, None, "Account is deactivated. Contact support."
-        
-        if not user.password_hash:
+
+        if not row.password_hash:
             return False, None, None, None, "Please use Google Sign In for this account."
-        
-        if not verify_password(password, user.password_hash):
+
+        if not verify_password(password, row.password_hash):
+            audit_event(row.user_id, "auth.signin_failed", reason="password")
             return False, None, None, None, "Incorrect password."
-        
+
+        # Transparently upgrade hashes made with an old cost factor (hashed before the write session opens)
+        values = {"last_login": datetime.utcnow()}
+        if needs_rehash(row.password_hash):
+            rehashed = hash_password(password)
+            # Unless the password changed while we were hashing
+            values["password_hash"] = case(
+                (User.password_hash == row.password_hash, rehashed), else_=User.password_hash
+            )
+        with session_scope() as db:
+            db.execute(update(User).where(User.user_id == row.user_id).values(values))
+
         # Check if entity setup is complete (for clients)
         entity_id = None
-        if user.role == UserRole.CLIENT:
-            entity = db.query(EntityProfile).filter(EntityProfile.user_id == user.user_id).first()
-            if entity:
-                entity_id = entity.entity_id
-                if not entity.is_setup_complete:
-                    st.session_state.setup_complete = False
-                else:
-                    st.session_state.setup_complete = True
-            else:
-                st.session_state.setup_complete = False
-        
+        if row.role == UserRole.CLIENT:
+            entity_id = row.entity_id
+            st.session_state.setup_complete = bool(row.is_setup_complete)
+
+        audit_event(row.user_id, "auth.signin")
+
         # RETURN 5 VALUES: Success, UserID, Role, EntityID, Message
-        return True, user.user_id, user.role.value, entity_id, "Login Successful"
-    
+        return True, row.user_id, row.role.value, entity_id, "Login Successful"
+
     except Exception as e:
         return False, None, None, None, f"Login error: {str(e)}"
-    finally:
-        db.close()
 
 # Google OAuth Placeholder
 def google_signin():
@@ -0,0 +1,102 @@
+"""Reproducible load test for the vendor checking pipeline.
+
+Pushes N synthetic vendors through api_integrations.run_all_checks against
+the seeded fake upstream and reports throughput, per-source failures and a
+latency histogram. Same seed + profile => same workload and outcomes.
+
+    python -m benchmarks.load_test --vendors 1000 --profile realistic --seed 42
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import Counter
+
+import api_backends
+from api_integrations import run_all_checks, SOURCE_CONCURRENCY, SOURCE_TIMEOUTS
+from fake_upstream import FakeUpstream, PROFILE_PRESETS, fake_transport
+from utils.identifiers import PAN_HOLDER_TYPES, gstin_check_char
+
+HISTOGRAM_BUCKETS_MS = [50, 100, 250, 500, 1000, 2000, 5000, 10000]
+
+def synthetic_gstins(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    gstins = []
+    for _ in range(count):
+        pan = "".join(rng.choice(letters) for _ in range(3)) + rng.choice(PAN_HOLDER_TYPES) + rng.choice(letters) + f"{rng.randint(0, 9999):04d}" + rng.choice(letters)
+        body = f"{rng.randint(1, 37):02d}{pan}1Z"
+        gstins.append(body + gstin_check_char(body))
+    return gstins
+
+def histogram(latencies_ms: list) -> list:
+    counts = Counter()
+    for ms in latencies_ms:
+        bucket = next((b for b in HISTOGRAM_BUCKETS_MS if ms <= b), None)
+        counts[bucket] += 1
+    rows = []
+    for bucket in HISTOGRAM_BUCKETS_MS + [None]:
+        label = f"<= {bucket:>6} ms" if bucket is not None else f" > {HISTOGRAM_BUCKETS_MS[-1]:>6} ms"
+        rows.append((label, counts[bucket]))
+    return rows
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * pct), len(sorted_values) - 1)]
+
+async def drive(gstins: list, concurrency: int) -> tuple:
+    limits = {source: asyncio.Semaphore(n) for source, n in SOURCE_CONCURRENCY.items()}
+    vendor_slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = Counter()
+
+    async def one(gstin):
+        async with vendor_slots:
+            started = time.perf_counter()
+            result = await run_all_checks(gstin, limits, use_cache=False)
+            latencies.append((time.perf_counter() - started) * 1000)
+            for source, section in (("gstn", "gstin_data"), ("mca", "mca_data"), ("ibbi", "ibbi_data"), ("udyam", "udyam_data")):
+                if "error" in result[section]:
+                    failures[source] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(g) for g in gstins))
+    return time.perf_counter() - started, latencies, failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test run_all_checks against the simulated upstream")
+    parser.add_argument("--vendors", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--profile", choices=sorted(PROFILE_PRESETS), default="realistic")
+    parser.add_argument("--concurrency", type=int, default=50, help="Vendors checked at once")
+    parser.add_argument("--rate", type=float, default=1e6, help="Per-source request budget (req/s)")
+    args = parser.parse_args()
+
+    upstream = FakeUpstream(seed=args.seed, profiles=PROFILE_PRESETS[args.profile])
+    api_backends.set_backend(api_backends.UpstreamBackend(
+        transport_factory=lambda: fake_transport(upstream),
+        config={source: {"rate": args.rate, "burst": args.rate} for source in api_backends.SOURCE_CONFIG},
+    ))
+    # Make backoff jitter replayable too
+    random.seed(args.seed)
+
+    gstins = synthetic_gstins(args.vendors, args.seed)
+    elapsed, latencies, failures = asyncio.run(drive(gstins, args.concurrency))
+
+    latencies.sort()
+    print(f"profile={args.profile} seed={args.seed} vendors={args.vendors} concurrency={args.concurrency}")
+    print(f"timeouts per source (s): {SOURCE_TIMEOUTS}")
+    print(f"elapsed {elapsed:.2f}s -> {args.vendors / elapsed:.1f} vendors/sec")
+    print(f"latency p50={statistics.median(latencies):.0f}ms p95={percentile(latencies, 0.95):.0f}ms "
+          f"p99={percentile(latencies, 0.99):.0f}ms max={latencies[-1]:.0f}ms")
+    print("failed sections: " + ", ".join(f"{s}={failures[s]}" for s in ("gstn", "mca", "ibbi", "udyam")))
+    print("upstream requests: " + ", ".join(f"{s}={v['requests']}" for s, v in sorted(upstream.stats.items())))
+    print("latency histogram:")
+    peak = max(count for _, count in histogram(latencies)) or 1
+    for label, count in histogram(latencies):
+        print(f"  {label} {count:>7} {'#' * int(40 * count / peak)}")
+
+if __name__ == "__main__":
+    main()
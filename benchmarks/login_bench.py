@@ -0,0 +1,61 @@
+"""Login throughput benchmark.
+
+Creates users in a scratch SQLite database and fires concurrent sign-ins
+through auth.signin_user, reporting logins/sec. Run from the repo root:
+
+    python -m benchmarks.login_bench --users 50 --logins 400 --threads 16
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DB = os.path.join(tempfile.gettempdir(), "bloodhound_login_bench.db")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent logins")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent Streamlit sessions to simulate")
+    parser.add_argument("--rounds", type=int, help="Override BCRYPT_ROUNDS for this run")
+    args = parser.parse_args()
+
+    # Must be configured before database/auth are imported
+    if os.path.exists(BENCH_DB):
+        os.remove(BENCH_DB)
+    os.environ["DATABASE_URL"] = f"sqlite:///{BENCH_DB}"
+    if args.rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+
+    from audit import get_audit_writer
+    from database import init_database
+    import auth
+
+    init_database()
+    for i in range(args.users):
+        auth.signup_user(f"bench{i}@bench.local", "correct horse", f"Bench {i}", "ca", f"Firm {i}", f"M{i:06d}")
+
+    def one_login(i):
+        started = time.perf_counter()
+        ok = auth.signin_user(f"bench{i % args.users}@bench.local", "correct horse")[0]
+        return ok, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(one_login, range(args.logins)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(ms for _, ms in results)
+    failures = sum(1 for ok, _ in results if not ok)
+    print(f"bcrypt rounds={auth.BCRYPT_ROUNDS} workers={auth.BCRYPT_WORKERS} threads={args.threads}")
+    print(f"{args.logins} logins in {elapsed:.2f}s -> {args.logins / elapsed:.1f} logins/sec ({failures} failed)")
+    print(f"latency p50={statistics.median(latencies):.1f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1]:.1f}ms max={latencies[-1]:.1f}ms")
+    # Flush and stop the audit writer while its database still exists
+    get_audit_writer().close()
+    os.remove(BENCH_DB)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Dashboard query benchmark.
+
+Seeds a scratch database with synthetic clients, vendors, transactions and
+billing logs, then records EXPLAIN plans and latencies for the dashboard
+access paths. Run from the repo root:
+
+    python -m benchmarks.query_bench --rows 10000 100000 1000000 --out bench_output.txt
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select, text
+
+from database import (
+    Base, migrate_schema, User, CAProfile, EntityProfile, Vendor, Transaction,
+    BillingLog, RiskLevel, EntityType, UserRole
+)
+
+SEED_CHUNK = 20000
+DEFAULT_URL = "sqlite:///" + os.path.join(tempfile.gettempdir(), "bloodhound_query_bench.db")
+START_DATE = datetime(2024, 4, 1)
+
+def seed(engine, transactions: int, vendors_per_entity: int = 1000, txns_per_vendor: int = 10, seed_value: int = 7):
+    """Populate an empty schema with roughly `transactions` transaction rows"""
+    rng = random.Random(seed_value)
+    vendor_count = max(transactions // txns_per_vendor, 1)
+    entity_count = max(vendor_count // vendors_per_entity, 1)
+    ca_count = max(entity_count // 10, 1)
+    levels = list(RiskLevel)
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"user_id": i + 1, "email": f"user{i}@bench.local", "full_name": f"User {i}",
+             "role": UserRole.CA if i < ca_count else UserRole.CLIENT}
+            for i in range(ca_count + entity_count)
+        ])
+        conn.execute(insert(CAProfile), [
+            {"ca_id": i + 1, "user_id": i + 1, "firm_name": f"Firm {i}", "membership_no": f"M{i:06d}"}
+            for i in range(ca_count)
+        ])
+        conn.execute(insert(EntityProfile), [
+            {"entity_id": i + 1, "user_id": ca_count + i + 1, "ca_id": i % ca_count + 1,
+             "entity_name": f"Client {i}", "entity_type": EntityType.PRIVATE_LIMITED,
+             "gstin": f"27BENCH{i:07d}Z", "pan": f"BENCH{i:05d}"}
+            for i in range(entity_count)
+        ])
+        for start in range(0, vendor_count, SEED_CHUNK):
+            rows = []
+            for vendor_id in range(start + 1, min(start + SEED_CHUNK, vendor_count) + 1):
+                score = rng.randint(0, 100)
+                rows.append({
+                    "vendor_id": vendor_id, "entity_id": (vendor_id - 1) % entity_count + 1,
+                    "name": f"Vendor {vendor_id}", "gstin": f"27VEND{vendor_id:08d}Z",
+                    "risk_score": score, "risk_level": levels[min(score // 30, 3)],
+                    "itc_amount": rng.uniform(0, 1_000_000), "needs_rescore": False,
+                })
+            conn.execute(insert(Vendor), rows)
+        for start in range(0, transactions, SEED_CHUNK):
+            rows = []
+            for i in range(start, min(start + SEED_CHUNK, transactions)):
+                vendor_id = i % vendor_count + 1
+                rows.append({
+                    "entity_id": (vendor_id - 1) % entity_count + 1, "vendor_id": vendor_id,
+                    "transaction_date": START_DATE + timedelta(days=rng.randint(0, 364)),
+                    "invoice_number": f"INV-{i}", "transaction_amount": rng.uniform(100, 200_000),
+                    "tax_amount": rng.uniform(0, 36_000),
+                    "payment_mode": "Cash" if rng.random() < 0.05 else "Bank Transfer",
+                })
+            conn.execute(insert(Transaction), rows)
+        conn.execute(insert(BillingLog), [
+            {"ca_id": i % ca_count + 1, "entity_id": i % entity_count + 1, "activity_type": "analysis",
+             "hours_logged": 0.5, "created_at": START_DATE + timedelta(hours=i)}
+            for i in range(max(transactions // 100, 10))
+        ])
+    return {"cas": ca_count, "entities": entity_count, "vendors": vendor_count, "transactions": transactions}
+
+def dashboard_queries(entity_id: int, vendor_id: int, ca_id: int) -> dict:
+    """The access paths the dashboards rely on"""
+    start, end = START_DATE + timedelta(days=90), START_DATE + timedelta(days=120)
+    return {
+        "vendors_by_entity_risk": (
+            select(Vendor.vendor_id, Vendor.name, Vendor.risk_score)
+            .where(Vendor.entity_id == entity_id)
+            .order_by(Vendor.risk_score.desc(), Vendor.vendor_id.desc())
+            .limit(50)
+        ),
+        "entity_metrics": (
+            select(func.count(), func.sum(Vendor.itc_amount))
+            .where(Vendor.entity_id == entity_id)
+        ),
+        "transactions_by_entity_range": (
+            select(Transaction.transaction_id, Transaction.transaction_amount)
+            .where(Transaction.entity_id == entity_id, Transaction.transaction_date.between(start, end))
+        ),
+        "transactions_by_vendor_range": (
+            select(Transaction.transaction_id, Transaction.transaction_amount)
+            .where(Transaction.vendor_id == vendor_id, Transaction.transaction_date.between(start, end))
+        ),
+        "billing_by_ca_range": (
+            select(func.sum(BillingLog.hours_logged))
+            .where(BillingLog.ca_id == ca_id, BillingLog.created_at.between(start, end))
+        ),
+    }
+
+def explain(conn, statement) -> list:
+    sql = str(statement.compile(conn, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    return [" | ".join(str(col) for col in row) for row in conn.execute(text(prefix + sql))]
+
+def time_query(conn, statement, repeats: int) -> dict:
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        conn.execute(statement).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(int(len(samples) * 0.95), len(samples) - 1)], 3),
+        "max_ms": round(samples[-1], 3),
+    }
+
+def run(url: str, rows: int, repeats: int = 20) -> dict:
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    migrate_schema(engine)
+
+    started = time.perf_counter()
+    sizes = seed(engine, rows)
+    seed_seconds = time.perf_counter() - started
+
+    results = {"rows": rows, "sizes": sizes, "seed_seconds": round(seed_seconds, 2), "queries": {}}
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        queries = dashboard_queries(entity_id=1, vendor_id=1, ca_id=1)
+        for name, statement in queries.items():
+            results["queries"][name] = {"plan": explain(conn, statement), **time_query(conn, statement, repeats)}
+    engine.dispose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dashboard queries on synthetic data")
+    parser.add_argument("--url", default=DEFAULT_URL, help="Scratch database URL (will be wiped)")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--out", help="Append JSON results to this file")
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        result = run(args.url, rows, args.repeats)
+        print(f"\n== {rows:,} transactions (seeded in {result['seed_seconds']}s) ==")
+        for name, stats in result["queries"].items():
+            print(f"{name:32s} p50={stats['p50_ms']:>8}ms  p95={stats['p95_ms']:>8}ms")
+            for line in stats["plan"]:
+                print(f"    {line}")
+        if args.out:
+            with open(args.out, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Query budget check for the dashboard and service access paths.
+
+Seeds a scratch SQLite database (same generator as query_bench), runs each
+access path under query_tracer.assert_query_budget and exits non-zero if
+any path issues more statements than budgeted or repeats one statement
+(an N+1 pattern). Budgets are per call and independent of data size. Run
+from the repo root:
+
+    python -m benchmarks.query_budget --rows 20000 --verbose
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DB = os.path.join(tempfile.gettempdir(), "bloodhound_query_budget.db")
+
+# path -> (max statements, max executions of any one fingerprint)
+BUDGETS = {
+    "entity_metrics": (1, 1),
+    "vendor_page": (1, 1),
+    "vendor_page_2": (1, 1),
+    "vendor_search": (1, 1),
+    "vendor_header": (1, 1),
+    "vendor_transactions": (1, 1),
+    "vendor_payloads": (1, 1),
+    "portfolio": (1, 1),
+    "client_summaries": (5, 1),
+    "refresh_portfolio": (7, 1),
+}
+
+def access_paths(entity_id: int, vendor_id: int, ca_id: int, entity_ids: list) -> dict:
+    from dashboard_service import query_entity_metrics, query_vendor_page
+    from database import session_scope
+    from portfolio import get_portfolio, refresh_client_summaries, refresh_portfolio
+    from vendor_detail import query_vendor_header, query_vendor_payloads, query_vendor_search, query_vendor_transactions
+
+    def in_session(query, *args):
+        def run():
+            with session_scope() as db:
+                return query(db, *args)
+        return run
+
+    # The second page's cursor is fetched up front so only that page is budgeted
+    with session_scope() as db:
+        cursor = query_vendor_page(db, entity_id)["next"]
+
+    return {
+        "entity_metrics": in_session(query_entity_metrics, entity_id),
+        "vendor_page": in_session(query_vendor_page, entity_id),
+        "vendor_page_2": in_session(query_vendor_page, entity_id, cursor),
+        "vendor_search": in_session(query_vendor_search, entity_id, "Vendor 1"),
+        "vendor_header": in_session(query_vendor_header, entity_id, vendor_id),
+        "vendor_transactions": in_session(query_vendor_transactions, vendor_id),
+        "vendor_payloads": in_session(query_vendor_payloads, vendor_id),
+        "portfolio": lambda: get_portfolio(ca_id),
+        "client_summaries": lambda: refresh_client_summaries(entity_ids),
+        "refresh_portfolio": lambda: refresh_portfolio(ca_id),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when an access path exceeds its query budget")
+    parser.add_argument("--rows", type=int, default=20000, help="Transactions to seed")
+    parser.add_argument("--verbose", action="store_true", help="Print every path's fingerprints")
+    args = parser.parse_args()
+
+    # Must be configured before database is imported
+    if os.path.exists(BENCH_DB):
+        os.remove(BENCH_DB)
+    os.environ["DATABASE_URL"] = f"sqlite:///{BENCH_DB}"
+
+    from benchmarks.query_bench import seed
+    from database import init_database
+    from query_tracer import QueryBudgetExceeded, assert_query_budget
+
+    engine = init_database()
+    sizes = seed(engine, args.rows)
+    print(f"Seeded {sizes}")
+
+    paths = access_paths(entity_id=1, vendor_id=1, ca_id=1, entity_ids=list(range(1, sizes["entities"] + 1)))
+    failures = 0
+    for name, run in paths.items():
+        max_queries, max_repeats = BUDGETS[name]
+        started = time.perf_counter()
+        try:
+            with assert_query_budget(max_queries=max_queries, max_repeats=max_repeats, name=name) as trace:
+                run()
+        except QueryBudgetExceeded as e:
+            failures += 1
+            print(f"FAIL {name}: {e}")
+            continue
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"ok   {name:22s} {trace.query_count:>3} / {max_queries} queries  {elapsed:>8.1f} ms")
+        if args.verbose:
+            print("\n".join("     " + line for line in trace.report().splitlines()[1:]))
+
+    print(f"\n{len(paths) - failures} of {len(paths)} paths within budget")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""GSTR-2B reconciliation benchmark.
+
+Builds a synthetic month of purchase-register invoices and the matching
+GSTR-2B with a known mix of perturbations (rounding, date shifts,
+invoice-number formatting and typos, wrong amounts, missing rows), then
+times reconciliation.reconcile_frames and checks the outcome counts. Run
+from the repo root:
+
+    python -m benchmarks.reconcile_bench --invoices 1000000 --suppliers 20000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from reconciliation import reconcile_frames
+from utils.identifiers import CHARSET, gstin_check_char
+
+MONTH_START = np.datetime64("2024-05-01")
+
+def synthetic_gstins(count: int, rng: np.random.Generator) -> np.ndarray:
+    letters = np.array(list(CHARSET[10:]))
+    gstins = []
+    for i in range(count):
+        pan = "".join(rng.choice(letters, 3)) + "C" + rng.choice(letters) + f"{i % 10000:04d}" + rng.choice(letters)
+        body = f"27{pan}1Z"
+        gstins.append(body + gstin_check_char(body))
+    return np.array(gstins)
+
+def synthetic_month(invoices: int, suppliers: int, seed: int) -> tuple:
+    """(books, gstr2b, expected counts) for one month"""
+    rng = np.random.default_rng(seed)
+    gstins = synthetic_gstins(suppliers, rng)
+    supplier = rng.integers(0, suppliers, invoices)
+    amount = np.round(rng.uniform(500, 500_000, invoices), 2)
+    books = pd.DataFrame({
+        "transaction_id": np.arange(1, invoices + 1),
+        "vendor_id": supplier + 1,
+        "supplier_name": pd.Series(supplier).map(lambda s: f"Supplier {s}"),
+        "gstin": gstins[supplier],
+        "invoice_number": pd.Series(np.arange(invoices)).map(lambda i: f"INV/{i:07d}"),
+        "invoice_date": MONTH_START + rng.integers(0, 31, invoices).astype("timedelta64[D]"),
+        "amount": amount,
+        "tax": np.round(amount * 0.18 / 1.18, 2),
+    })
+
+    kind = rng.choice(["exact", "rounding", "date", "format", "typo", "wrong_amount", "missing_2b"],
+                      invoices, p=[0.80, 0.04, 0.04, 0.04, 0.03, 0.02, 0.03])
+    gstr2b = books.drop(columns=["transaction_id", "vendor_id"]).copy()
+    gstr2b.loc[kind == "rounding", "amount"] += 0.5
+    gstr2b.loc[kind == "date", "invoice_date"] += np.timedelta64(2, "D")
+    gstr2b.loc[kind == "format", "invoice_number"] = gstr2b.loc[kind == "format", "invoice_number"].str.replace("/", "-").str.lower()
+    gstr2b.loc[kind == "typo", "invoice_number"] = gstr2b.loc[kind == "typo", "invoice_number"] + "X"
+    gstr2b.loc[kind == "wrong_amount", "amount"] *= 1.25
+    gstr2b.loc[kind == "wrong_amount", "tax"] *= 0.5
+    gstr2b = gstr2b[kind != "missing_2b"]
+
+    # Invoices only the supplier reported
+    extra = max(invoices // 50, 1)
+    extra_supplier = rng.integers(0, suppliers, extra)
+    extra_amount = np.round(rng.uniform(500, 500_000, extra), 2)
+    gstr2b = pd.concat([gstr2b, pd.DataFrame({
+        "supplier_name": [f"Supplier {s}" for s in extra_supplier],
+        "gstin": gstins[extra_supplier],
+        "invoice_number": [f"EXT-{i}" for i in range(extra)],
+        "invoice_date": MONTH_START + rng.integers(0, 31, extra).astype("timedelta64[D]"),
+        "amount": extra_amount,
+        "tax": np.round(extra_amount * 0.18 / 1.18, 2),
+    })], ignore_index=True)
+
+    counts = pd.Series(kind).value_counts()
+    expected = {
+        "matched": int(invoices - counts.get("wrong_amount", 0) - counts.get("missing_2b", 0)),
+        "mismatched": int(counts.get("wrong_amount", 0)),
+        "missing_in_2b": int(counts.get("missing_2b", 0)),
+        "missing_in_books": extra,
+    }
+    return books, gstr2b.sample(frac=1, random_state=seed).reset_index(drop=True), expected
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GSTR-2B reconciliation")
+    parser.add_argument("--invoices", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--suppliers", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for invoices in args.invoices:
+        books, gstr2b, expected = synthetic_month(invoices, args.suppliers, args.seed)
+        started = time.perf_counter()
+        result = reconcile_frames(books, gstr2b)
+        elapsed = time.perf_counter() - started
+        summary = result["summary"]
+        print(f"\n== {invoices:,} invoices vs {len(gstr2b):,} GSTR-2B rows: {elapsed:.2f}s "
+              f"({invoices / elapsed:,.0f} invoices/sec) ==")
+        for key in expected:
+            flag = "ok" if summary[key] == expected[key] else f"expected {expected[key]:,}"
+            print(f"{key:18s} {summary[key]:>10,}  {flag}")
+        print(f"{'matched by type':18s} {summary['matched_by_type']}")
+        print(f"{'ITC at risk':18s} {summary['itc_at_risk']:>14,.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import streamlit as st
+from sqlalchemy import and_, case, func, or_, select
+
+from database import session_scope, EntityProfile, Vendor, RiskLevel
+
+# --- CLIENT DASHBOARD DATA SERVICE ---
+# Metric cards come from one aggregate query and the vendor table is
+# keyset-paginated on the (entity_id, risk_score, vendor_id) index. Results
+# are cached per entity and keyed on EntityProfile.data_version, which
+# rescoring, imports and vendor edits bump in the database, so every
+# process sees fresh numbers on its next rerun without waiting for the TTL.
+
+DASHBOARD_CACHE_TTL = 300  # seconds
+VENDOR_PAGE_SIZE = 25
+
+def entity_cache_version(entity_id: int) -> int:
+    """The entity's data_version (one primary-key read per rerun)"""
+    with session_scope() as db:
+        return db.execute(
+            select(EntityProfile.data_version).where(EntityProfile.entity_id == entity_id)
+        ).scalar() or 0
+
+def query_entity_metrics(db, entity_id: int) -> dict:
+    """Vendor counts and ITC at risk in a single aggregate query"""
+    at_risk = Vendor.risk_level.in_([RiskLevel.HIGH, RiskLevel.CRITICAL])
+    total, critical, high, itc_at_risk = db.execute(
+        select(
+            func.count(Vendor.vendor_id),
+            func.sum(case((Vendor.risk_level == RiskLevel.CRITICAL, 1), else_=0)),
+            func.sum(case((Vendor.risk_level == RiskLevel.HIGH, 1), else_=0)),
+            func.sum(case((at_risk, Vendor.itc_amount), else_=0.0)),
+        ).where(Vendor.entity_id == entity_id)
+    ).one()
+    return {
+        "total_vendors": total or 0,
+        "critical_vendors": critical or 0,
+        "high_risk_vendors": high or 0,
+        "itc_at_risk": float(itc_at_risk or 0.0),
+    }
+
+def query_vendor_page(db, entity_id: int, after: tuple = None, limit: int = VENDOR_PAGE_SIZE) -> dict:
+    """One page of vendors, riskiest first.
+
+    `after` is the (risk_score, vendor_id) cursor of the previous page's last
+    row; returns {"rows": [...], "next": cursor or None}.
+    """
+    query = (
+        select(Vendor.vendor_id, Vendor.name, Vendor.gstin, Vendor.risk_score, Vendor.risk_level,
+               Vendor.itc_amount, Vendor.last_analyzed_at, Vendor.is_watchlisted)
+        .where(Vendor.entity_id == entity_id)
+        .order_by(Vendor.risk_score.desc(), Vendor.vendor_id.desc())
+        .limit(limit + 1)
+    )
+    if after is not None:
+        score, vendor_id = after
+        query = query.where(or_(
+            Vendor.risk_score < score,
+            and_(Vendor.risk_score == score, Vendor.vendor_id < vendor_id)
+        ))
+    rows = [
+        {
+            "vendor_id": r.vendor_id, "name": r.name, "gstin": r.gstin, "risk_score": r.risk_score,
+            "risk_level": r.risk_level.value if r.risk_level else None, "itc_amount": r.itc_amount,
+            "last_analyzed_at": r.last_analyzed_at, "is_watchlisted": r.is_watchlisted,
+        }
+        for r in db.execute(query)
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1]["risk_score"], rows[-1]["vendor_id"])
+    return {"rows": rows, "next": next_cursor}
+
+@st.cache_data(ttl=DASHBOARD_CACHE_TTL, show_spinner=False)
+def _cached_entity_metrics(entity_id: int, version: int) -> dict:
+    with session_scope() as db:
+        return query_entity_metrics(db, entity_id)
+
+@st.cache_data(ttl=DASHBOARD_CACHE_TTL, show_spinner=False)
+def _cached_vendor_page(entity_id: int, version: int, after: tuple, limit: int) -> dict:
+    with session_scope() as db:
+        return query_vendor_page(db, entity_id, after, limit)
+
+def get_entity_metrics(entity_id: int) -> dict:
+    return _cached_entity_metrics(entity_id, entity_cache_version(entity_id))
+
+def get_vendor_page(entity_id: int, after: tuple = None, limit: int = VENDOR_PAGE_SIZE) -> dict:
+    return _cached_vendor_page(entity_id, entity_cache_version(entity_id), after, limit)
@@ -1,8 +1,15 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, DateTime, Enum, Text, Float, JSON
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy import create_engine, event, inspect, insert, text, true, update, Index, Column, Integer, String, Boolean, ForeignKey, DateTime, Enum, Text, Float, JSON
+from sqlalchemy.orm import declarative_base, deferred, relationship, sessionmaker
+from contextlib import contextmanager
 from datetime import datetime
 import enum
 import os
+import re
+import threading
+import time
+
+from metrics import DB_QUERY_ERRORS, DB_QUERY_SECONDS
+from query_tracer import install_tracer
 
 # Enums
 class UserRole(enum.Enum):
@@ -64,7 +71,7 @@ class EntityProfile(Base):
 
     entity_id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.user_id'), unique=True, nullable=False)
-    ca_id = Column(Integer, ForeignKey('ca_profiles.ca_id'), nullable=True)
+    ca_id = Column(Integer, ForeignKey('ca_profiles.ca_id'), nullable=True, index=True)
 
     entity_name = Column(String, nullable=False)
     entity_type = Column(Enum(EntityType), nullable=False)
@@ -76,6 +83,8 @@ class EntityProfile(Base):
     industry_sector = Column(String)
     is_setup_complete = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped whenever the entity's vendors change; cached dashboard data is keyed on it
+    data_version = Column(Integer, default=0, server_default="0", nullable=False)
 
     user = relationship("User", back_populates="entity_profile")
     linked_ca = relationship("CAProfile", back_populates="clients")
@@ -93,7 +102,7 @@ class Vendor(Base):
     gstin = Column(String(15), nullable=False, index=True)
     pan = Column(String(10), nullable=True)
     
-    registration_days = Column(Integer, default=0)
+    registration_days = Column(Integer, nullable=True)  # NULL until the GSTN registration date is known
     address_type = Column(String, default="Unknown")
     director_companies = Column(Integer, default=0)
     
@@ -105,20 +114,37 @@ class Vendor(Base):
     itc_amount = Column(Float, default=0.0)
     cash_payments = Column(Float, default=0.0)
     
+    # Transaction anomaly counters (maintained by anomalies.py)
+    amount_spikes = Column(Integer, default=0, server_default="0")
+    cash_split_days = Column(Integer, default=0, server_default="0")
+    duplicate_invoices = Column(Integer, default=0, server_default="0")
+    
     risk_score = Column(Integer, default=0)
     risk_level = Column(Enum(RiskLevel), default=RiskLevel.LOW)
     risk_factors = Column(JSON, default=list)
+    rules_version = Column(String, nullable=True)  # utils/risk_rules.json version that produced the score
     
     last_analyzed_at = Column(DateTime, default=datetime.utcnow)
-    gstn_api_data = Column(JSON, default=dict)
-    mca_api_data = Column(JSON, default=dict)
+    # Raw API payloads are large; load them only when accessed (see vendor_detail.py)
+    gstn_api_data = deferred(Column(JSON, default=dict))
+    mca_api_data = deferred(Column(JSON, default=dict))
     
     is_watchlisted = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Set whenever a scoring input changes; cleared by rescoring.rescore_dirty_vendors
+    needs_rescore = Column(Boolean, default=True, server_default=true(), nullable=False, index=True)
+    # Bumped with every dirty mark; the rescorer only clears needs_rescore if it is unchanged
+    dirty_version = Column(Integer, default=0, server_default="0", nullable=False)
 
     entity = relationship("EntityProfile", back_populates="vendors")
     transactions = relationship("Transaction", back_populates="vendor", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Client dashboard: vendors of an entity ordered by risk
+        Index('ix_vendors_entity_risk', 'entity_id', 'risk_score', 'vendor_id'),
+    )
+
 # 5. Transaction Table
 class Transaction(Base):
     __tablename__ = 'transactions'
@@ -138,6 +164,12 @@ class Transaction(Base):
     entity = relationship("EntityProfile", back_populates="transactions")
     vendor = relationship("Vendor", back_populates="transactions")
 
+    __table_args__ = (
+        # Ledger views: an entity's or a vendor's transactions in a date range
+        Index('ix_transactions_entity_date', 'entity_id', 'transaction_date'),
+        Index('ix_transactions_vendor_date', 'vendor_id', 'transaction_date'),
+    )
+
 # 6. Billing Log (For CA billing tracking)
 class BillingLog(Base):
     __tablename__ = 'billing_logs'
@@ -154,6 +186,12 @@ class BillingLog(Base):
 
     ca = relationship("CAProfile", back_populates="billing_logs")
 
+    __table_args__ = (
+        # CA console: billing activity per CA over time, and per client
+        Index('ix_billing_logs_ca_created', 'ca_id', 'created_at'),
+        Index('ix_billing_logs_entity_created', 'entity_id', 'created_at'),
+    )
+
 # 7. System Audit Log (For compliance trail)
 class AuditLog(Base):
     __tablename__ = 'audit_logs'
@@ -165,23 +203,337 @@ class AuditLog(Base):
     ip_address = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+# 8. Upstream API response cache (shared across clients/vendors)
+class ApiCacheEntry(Base):
+    __tablename__ = 'api_cache'
+
+    source = Column(String, primary_key=True)  # "gstn", "mca", "ibbi", "udyam"
+    cache_key = Column(String, primary_key=True)  # GSTIN or PAN
+    payload = Column(JSON, nullable=False)
+    fetched_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+# 9. Per-vendor monthly transaction rollup (maintained by aggregates.py)
+class VendorMonthlyAggregate(Base):
+    __tablename__ = 'vendor_monthly_aggregates'
+
+    vendor_id = Column(Integer, ForeignKey('vendors.vendor_id'), primary_key=True)
+    month = Column(String(7), primary_key=True)  # "YYYY-MM"
+    transaction_count = Column(Integer, default=0, nullable=False)
+    total_amount = Column(Float, default=0.0, nullable=False)
+    tax_amount = Column(Float, default=0.0, nullable=False)
+    cash_amount = Column(Float, default=0.0, nullable=False)
+
+# 10. Per-vendor amount by payment mode (maintained by aggregates.py)
+class VendorPaymentModeAggregate(Base):
+    __tablename__ = 'vendor_payment_mode_aggregates'
+
+    vendor_id = Column(Integer, ForeignKey('vendors.vendor_id'), primary_key=True)
+    payment_mode = Column(String, primary_key=True)
+    transaction_count = Column(Integer, default=0, nullable=False)
+    total_amount = Column(Float, default=0.0, nullable=False)
+
+# 11. CA portfolio rollup: one row per client, maintained by portfolio.py
+class CAPortfolioSummary(Base):
+    __tablename__ = 'ca_portfolio_summaries'
+
+    entity_id = Column(Integer, ForeignKey('entity_profiles.entity_id'), primary_key=True)
+    ca_id = Column(Integer, ForeignKey('ca_profiles.ca_id'), nullable=False)
+    entity_name = Column(String, nullable=False)
+
+    total_vendors = Column(Integer, default=0, nullable=False)
+    low_risk_vendors = Column(Integer, default=0, nullable=False)
+    medium_risk_vendors = Column(Integer, default=0, nullable=False)
+    high_risk_vendors = Column(Integer, default=0, nullable=False)
+    critical_vendors = Column(Integer, default=0, nullable=False)
+    itc_at_risk = Column(Float, default=0.0, nullable=False)
+
+    last_audit_at = Column(DateTime, nullable=True)
+    billable_hours = Column(Float, default=0.0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # CA console: a CA's clients, riskiest first
+        Index('ix_ca_portfolio_ca_itc', 'ca_id', 'itc_at_risk'),
+    )
+
+# 12. Streaming per-vendor amount statistics (Welford; maintained by anomalies.py)
+class VendorAmountStats(Base):
+    __tablename__ = 'vendor_amount_stats'
+
+    vendor_id = Column(Integer, ForeignKey('vendors.vendor_id'), primary_key=True)
+    sample_count = Column(Integer, default=0, nullable=False)
+    mean = Column(Float, default=0.0, nullable=False)
+    m2 = Column(Float, default=0.0, nullable=False)  # sum of squared deviations
+
+# 13. Per-vendor daily cash totals for the Section 40A(3) split check (anomalies.py)
+class VendorDailyCash(Base):
+    __tablename__ = 'vendor_daily_cash'
+
+    vendor_id = Column(Integer, ForeignKey('vendors.vendor_id'), primary_key=True)
+    day = Column(String(10), primary_key=True)  # "YYYY-MM-DD"
+    cash_count = Column(Integer, default=0, nullable=False)
+    cash_total = Column(Float, default=0.0, nullable=False)
+    cash_max = Column(Float, default=0.0, nullable=False)
+
+# 14. Invoice number fingerprints for duplicate detection (anomalies.py)
+class InvoiceFingerprint(Base):
+    __tablename__ = 'invoice_fingerprints'
+
+    vendor_id = Column(Integer, ForeignKey('vendors.vendor_id'), primary_key=True)
+    invoice_hash = Column(String(16), primary_key=True)
+    occurrences = Column(Integer, default=0, nullable=False)
+
+# 15. Risk rule sets that have been activated (see utils/rules.py, rescoring.apply_rule_change)
+class RuleSetVersion(Base):
+    __tablename__ = 'rule_set_versions'
+
+    version = Column(String, primary_key=True)
+    digest = Column(String(12), nullable=False)
+    definition = Column(JSON, nullable=False)
+    activated_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+# 16. Shared version of the in-memory entity graph (see entity_graph.py); a single row
+class EntityGraphVersion(Base):
+    __tablename__ = 'entity_graph_version'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+
+# 17. Transaction partitions (entity, month) changed since the last Parquet export (see exporter.py)
+class TransactionChange(Base):
+    __tablename__ = 'transaction_changes'
+    # Replaces the (created_at, transaction_id) export watermark, which missed updates, deletes and late commits
+
+    change_id = Column(Integer, primary_key=True, autoincrement=True)
+    entity_id = Column(Integer, nullable=False)
+    month = Column(String(7), nullable=False)  # YYYY-MM of transaction_date
+    changed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    # Never reuse ids of pruned rows: the exporter's watermark relies on them only growing
+    __table_args__ = {"sqlite_autoincrement": True}
+
 # Database Setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./bloodhound_prod.db")
 
+# Connection pool tuning (ignored for SQLite, which manages its own pool)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+_engine = None
+_engine_lock = threading.Lock()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
 def get_engine():
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-        echo=False
-    )
-    return engine
+    """Return the process-wide engine, creating it on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if "sqlite" in DATABASE_URL:
+                    engine = create_engine(
+                        DATABASE_URL,
+                        connect_args={"check_same_thread": False},
+                        echo=False
+                    )
+                else:
+                    engine = create_engine(
+                        DATABASE_URL,
+                        pool_size=DB_POOL_SIZE,
+                        max_overflow=DB_MAX_OVERFLOW,
+                        pool_recycle=DB_POOL_RECYCLE,
+                        pool_pre_ping=True,
+                        echo=False
+                    )
+                _instrument_engine(engine)
+                install_tracer(engine)
+                SessionLocal.configure(bind=engine)
+                _install_session_hooks()
+                _engine = engine
+    return _engine
+
+def _install_session_hooks():
+    """Rollup and anomaly maintenance for every ORM write, whichever entry point opened the engine"""
+    import aggregates
+    import anomalies
+    aggregates.install_session_hooks(SessionLocal)
+    anomalies.install_session_hooks(SessionLocal)
+
+# --- QUERY METRICS ---
+# Every statement is timed per (operation, table). The label comes from the
+# SQL text, memoised per distinct statement string (the compiled-SQL cache
+# keeps that set small).
+
+_STATEMENT_TARGET = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+[\"`]?(\w+)", re.IGNORECASE)
+_statement_labels = {}
+
+def statement_labels(statement: str) -> tuple:
+    """(operation, table) for a SQL string, e.g. ("SELECT", "vendors")"""
+    labels = _statement_labels.get(statement)
+    if labels is None:
+        words = statement.split(None, 1)
+        operation = words[0].upper() if words else "?"
+        match = _STATEMENT_TARGET.search(statement)
+        labels = (operation, match.group(1).lower() if match else "")
+        if len(_statement_labels) < 10000:
+            _statement_labels[statement] = labels
+    return labels
+
+def _instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _observe_query(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, *statement_labels(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _observe_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+        DB_QUERY_ERRORS.inc(*statement_labels(exception_context.statement or ""))
+
+def migrate_schema(engine):
+    """Add columns and indexes introduced after a table was first created (create_all skips existing tables)"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    if not isinstance(default, str):
+                        default = default.compile(dialect=engine.dialect)
+                    ddl += f" DEFAULT {default}"
+                conn.execute(text(ddl))
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
 
 def init_database():
     engine = get_engine()
     Base.metadata.create_all(bind=engine)
+    migrate_schema(engine)
     return engine
 
 def get_session():
-    engine = get_engine()
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    """Return a new session bound to the shared engine. Caller must close it."""
+    get_engine()
     return SessionLocal()
+
+# --- CHANGE TRACKING ---
+# Vendor fields read by the risk scorer. Changing any of them, or adding /
+# removing a vendor's transactions, marks the vendor dirty for rescoring.
+VENDOR_SCORING_INPUTS = (
+    "registration_days", "address_type", "director_companies",
+    "gstr1_status", "gstr3b_status", "months_not_filed",
+    "transaction_count", "itc_amount", "cash_payments",
+    "amount_spikes", "cash_split_days", "duplicate_invoices",
+)
+
+# Column values for an UPDATE of the vendors table that marks rows dirty
+DIRTY_MARK = {"needs_rescore": True, "dirty_version": Vendor.__table__.c.dirty_version + 1}
+
+def mark_vendors_dirty(db, vendor_ids):
+    """Flag vendors for rescoring (for bulk writes that bypass ORM events)"""
+    vendor_ids = {vendor_id for vendor_id in vendor_ids if vendor_id is not None}
+    if vendor_ids:
+        db.connection().execute(
+            update(Vendor.__table__)
+            .where(Vendor.__table__.c.vendor_id.in_(vendor_ids))
+            .values(**DIRTY_MARK)
+        )
+
+def bump_entity_versions(db, entity_ids):
+    """Invalidate cached dashboard data of these entities in every process"""
+    entity_ids = {entity_id for entity_id in entity_ids if entity_id is not None}
+    if entity_ids:
+        table = EntityProfile.__table__
+        db.connection().execute(
+            update(table)
+            .where(table.c.entity_id.in_(sorted(entity_ids)))
+            .values(data_version=table.c.data_version + 1)
+        )
+
+def log_transaction_changes(db, rows):
+    """Record the export partitions of inserted/updated/deleted transaction dicts
+    (for bulk writes that bypass ORM events)"""
+    partitions = {
+        (row["entity_id"], row["transaction_date"].strftime("%Y-%m"))
+        for row in rows if row.get("entity_id") is not None and row.get("transaction_date") is not None
+    }
+    if partitions:
+        db.connection().execute(
+            insert(TransactionChange.__table__),
+            [{"entity_id": entity_id, "month": month} for entity_id, month in sorted(partitions)]
+        )
+
+def _partition_row(obj, previous: bool = False) -> dict:
+    state = inspect(obj)
+    row = {}
+    for name in ("entity_id", "transaction_date"):
+        history = state.attrs[name].history
+        row[name] = history.deleted[0] if previous and history.deleted else getattr(obj, name)
+    return row
+
+@event.listens_for(SessionLocal, "before_flush")
+def _track_scoring_inputs(session, flush_context, instances):
+    entity_ids = session.info.setdefault("changed_entity_ids", set())
+    for obj in session.dirty:
+        if isinstance(obj, Vendor) and session.is_modified(obj):
+            entity_ids.add(obj.entity_id)
+            # Bump even if already dirty: a rescore may be reading the old inputs right now
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in VENDOR_SCORING_INPUTS):
+                obj.needs_rescore = True
+                obj.dirty_version = Vendor.dirty_version + 1
+    entity_ids.update(obj.entity_id for obj in session.new | session.deleted if isinstance(obj, Vendor))
+    # Transaction vendor_ids may only be known after the flush assigns keys
+    touched = session.info.setdefault("rescore_transactions", [])
+    touched.extend(obj for obj in session.new if isinstance(obj, Transaction))
+    vendor_ids = session.info.setdefault("rescore_vendor_ids", set())
+    changed = session.info.setdefault("export_partitions", [])
+    for obj in session.deleted:
+        if isinstance(obj, Transaction):
+            vendor_ids.add(obj.vendor_id)
+            changed.append(_partition_row(obj, previous=True))
+    for obj in session.dirty:
+        if isinstance(obj, Transaction) and session.is_modified(obj):
+            history = inspect(obj).attrs.vendor_id.history
+            vendor_ids.update(history.deleted or ())
+            vendor_ids.add(obj.vendor_id)
+            # A changed date or entity moves the row between partitions: both are re-exported
+            changed.extend((_partition_row(obj, previous=True), _partition_row(obj)))
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_transaction_vendors(session, flush_context):
+    new = session.info.pop("rescore_transactions", [])
+    vendor_ids = session.info.pop("rescore_vendor_ids", set())
+    vendor_ids.update(obj.vendor_id for obj in new)
+    mark_vendors_dirty(session, vendor_ids)
+    bump_entity_versions(session, session.info.pop("changed_entity_ids", set()))
+    log_transaction_changes(session, session.info.pop("export_partitions", []) + [
+        {"entity_id": obj.entity_id, "transaction_date": obj.transaction_date} for obj in new
+    ])
+
+@contextmanager
+def session_scope():
+    """Transactional scope: commits on success, rolls back on error, always closes"""
+    db = get_session()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
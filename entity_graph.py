@@ -0,0 +1,327 @@
+"""Shell-network entity graph.
+
+    python entity_graph.py                  # cluster statistics
+    python entity_graph.py --invalidate     # make every running process reload its graph
+"""
+import argparse
+import os
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+
+import numpy as np
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import init_database, session_scope, mark_vendors_dirty, EntityGraphVersion, Vendor, RiskLevel
+
+# --- SHELL-NETWORK GRAPH INDEX ---
+# Vendors (across all clients) are linked when they share a PAN, a director
+# (by DIN or director PAN, never by name alone) or a registered address.
+# Connected components are kept with union-find over flat integer arrays,
+# together with each component's size and number of flagged (High/Critical)
+# members, so the scorer can ask "how big is this vendor's cluster and how
+# many of its neighbours are flagged" in O(1).
+#
+# Each process holds its own graph. Writers that change links or flagged
+# levels bump the shared entity_graph_version row; a process whose graph is
+# older reloads it (checked at most every GRAPH_VERSION_CHECK_SECONDS).
+
+FLAGGED_LEVELS = {RiskLevel.HIGH, RiskLevel.CRITICAL}
+
+GRAPH_VERSION_CHECK_SECONDS = float(os.getenv("BLOODHOUND_GRAPH_CHECK_SECONDS", "30"))
+
+_ADDRESS_NOISE = re.compile(r"[^a-z0-9]+")
+
+def _normalize_name(name) -> str:
+    return " ".join(str(name or "").lower().split())
+
+def _normalize_address(address) -> str:
+    return _ADDRESS_NOISE.sub(" ", str(address or "").lower()).strip()
+
+def _director_key(name, din=None, pan=None):
+    """Director identity: name plus DIN (or the director's own PAN). A name alone links nothing."""
+    name = _normalize_name(name)
+    if not name:
+        return None
+    if din and str(din).strip():
+        return f"dir:{name}|din:{str(din).strip()}"
+    if pan and str(pan).strip():
+        return f"dir:{name}|pan:{str(pan).strip().upper()}"
+    return None
+
+def vendor_link_keys(gstin: str, pan: str = None, mca_api_data: dict = None, gstn_api_data: dict = None) -> set:
+    """Keys that connect vendors: PAN, identified directors and registered address"""
+    keys = set()
+    pan = (pan or (gstin[2:12] if gstin and len(gstin) >= 12 else "")).upper()
+    if pan:
+        keys.add(f"pan:{pan}")
+
+    mca = mca_api_data or {}
+    directors = [
+        _director_key(d.get("name"), d.get("din"), d.get("pan")) if isinstance(d, dict) else None
+        for d in mca.get("directors") or []
+    ]
+    directors.append(_director_key(mca.get("director_name"), mca.get("director_din")))
+    keys.update(key for key in directors if key)
+
+    gstn = gstn_api_data or {}
+    address = gstn.get("principal_place_of_business") or gstn.get("registered_address") or gstn.get("address")
+    if _normalize_address(address):
+        keys.add(f"addr:{_normalize_address(address)}")
+    return keys
+
+class EntityGraph:
+    """Incremental union-find over vendors with per-component counters"""
+
+    def __init__(self):
+        self._index = {}             # vendor_id -> node
+        self._vendor_ids = array("q")
+        self._parent = array("i")
+        self._size = array("i")      # valid at roots
+        self._flagged = array("i")   # flagged members, valid at roots
+        self._is_flagged = array("b")
+        self._next = array("i")      # circular member list per component
+        self._key_nodes = {}         # link key -> array of member nodes (adjacency)
+        self._lock = threading.RLock()
+        self.version = 0             # entity_graph_version the graph was loaded at
+        self.checked_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._vendor_ids)
+
+    def _find(self, node: int) -> int:
+        parent = self._parent
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    def _union(self, a: int, b: int) -> bool:
+        ra, rb = self._find(a), self._find(b)
+        if ra == rb:
+            return False
+        if self._size[ra] < self._size[rb]:
+            ra, rb = rb, ra
+        self._parent[rb] = ra
+        self._size[ra] += self._size[rb]
+        self._flagged[ra] += self._flagged[rb]
+        # Splice the two circular member lists
+        self._next[ra], self._next[rb] = self._next[rb], self._next[ra]
+        return True
+
+    def _node(self, vendor_id: int) -> int:
+        node = self._index.get(vendor_id)
+        if node is None:
+            node = len(self._vendor_ids)
+            self._index[vendor_id] = node
+            self._vendor_ids.append(vendor_id)
+            self._parent.append(node)
+            self._size.append(1)
+            self._flagged.append(0)
+            self._is_flagged.append(0)
+            self._next.append(node)
+        return node
+
+    def members(self, vendor_id: int) -> list:
+        """All vendor_ids in the vendor's component"""
+        with self._lock:
+            start = self._index.get(vendor_id)
+            if start is None:
+                return []
+            result = [vendor_id]
+            node = self._next[start]
+            while node != start:
+                result.append(self._vendor_ids[node])
+                node = self._next[node]
+            return result
+
+    def add_vendor(self, vendor_id: int, keys, flagged: bool = False) -> list:
+        """Insert/extend a vendor's links. Returns vendor_ids whose cluster changed.
+
+        Links are additive; call rebuild() to drop links that no longer hold.
+        """
+        with self._lock:
+            node = self._node(vendor_id)
+            self.set_flagged(vendor_id, flagged)
+            merged = False
+            for key in keys:
+                nodes = self._key_nodes.get(key)
+                if nodes is None:
+                    self._key_nodes[key] = array("i", [node])
+                    continue
+                if node not in nodes:
+                    nodes.append(node)
+                merged |= self._union(node, nodes[0])
+            return self.members(vendor_id) if merged else []
+
+    def set_flagged(self, vendor_id: int, flagged: bool) -> bool:
+        """Update the vendor's flagged state. Returns True if it changed."""
+        with self._lock:
+            node = self._node(vendor_id)
+            flagged = 1 if flagged else 0
+            if self._is_flagged[node] == flagged:
+                return False
+            self._flagged[self._find(node)] += 1 if flagged else -1
+            self._is_flagged[node] = flagged
+            return True
+
+    def cluster_size(self, vendor_id: int) -> int:
+        with self._lock:
+            node = self._index.get(vendor_id)
+            return self._size[self._find(node)] if node is not None else 1
+
+    def flagged_neighbours(self, vendor_id: int) -> int:
+        """Flagged vendors in the same cluster, excluding the vendor itself"""
+        with self._lock:
+            node = self._index.get(vendor_id)
+            if node is None:
+                return 0
+            return self._flagged[self._find(node)] - self._is_flagged[node]
+
+    def lookup_many(self, vendor_ids) -> tuple:
+        """(cluster_size, flagged_neighbours) arrays aligned with vendor_ids"""
+        with self._lock:
+            sizes = np.ones(len(vendor_ids), dtype=np.int64)
+            flagged = np.zeros(len(vendor_ids), dtype=np.int64)
+            for i, vendor_id in enumerate(vendor_ids):
+                node = self._index.get(int(vendor_id))
+                if node is not None:
+                    root = self._find(node)
+                    sizes[i] = self._size[root]
+                    flagged[i] = self._flagged[root] - self._is_flagged[node]
+            return sizes, flagged
+
+    def vendor_ids(self) -> list:
+        with self._lock:
+            return list(self._vendor_ids)
+
+    def stats(self, top: int = 10) -> dict:
+        """Cluster size distribution and the largest clusters"""
+        with self._lock:
+            roots = Counter(self._find(node) for node in range(len(self._vendor_ids)))
+            largest = sorted(roots, key=roots.get, reverse=True)[:top]
+            return {
+                "vendors": len(self._vendor_ids),
+                "clusters": len(roots),
+                "linked_vendors": sum(size for size in roots.values() if size > 1),
+                "largest": [
+                    {"size": roots[root], "flagged": self._flagged[root],
+                     "sample": self.members(self._vendor_ids[root])[:5]}
+                    for root in largest
+                ],
+            }
+
+    def load(self, chunk_size: int = 5000) -> int:
+        """Populate from the vendors table (streamed)"""
+        query = select(Vendor.vendor_id, Vendor.gstin, Vendor.pan, Vendor.risk_level,
+                       Vendor.mca_api_data, Vendor.gstn_api_data)
+        count = 0
+        with session_scope() as db:
+            # Read first: a write that lands mid-load bumps past it and triggers another reload
+            self.version = read_graph_version(db)
+            for vendor_id, gstin, pan, level, mca, gstn in db.execute(query.execution_options(yield_per=chunk_size)):
+                self.add_vendor(vendor_id, vendor_link_keys(gstin, pan, mca, gstn), level in FLAGGED_LEVELS)
+                count += 1
+        return count
+
+# --- SHARED VERSION ---
+
+def read_graph_version(db) -> int:
+    return db.execute(select(EntityGraphVersion.version).where(EntityGraphVersion.id == 1)).scalar_one_or_none() or 0
+
+def bump_graph_version(db, graph: EntityGraph = None) -> int:
+    """Mark every process's graph stale.
+
+    `graph` is this process's graph, already updated with the change; it
+    keeps up without a reload if no other process bumped since it loaded.
+    """
+    table = EntityGraphVersion.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite_insert if dialect == "sqlite" else pg_insert
+        stmt = dialect_insert(table).values(id=1, version=1)
+        db.execute(stmt.on_conflict_do_update(index_elements=["id"], set_={"version": table.c.version + 1}))
+    elif db.execute(update(table).where(table.c.id == 1).values(version=table.c.version + 1)).rowcount == 0:
+        db.execute(insert(table).values(id=1, version=1))
+    version = read_graph_version(db)
+    if graph is not None and graph.version == version - 1:
+        graph.version = version
+    return version
+
+# --- PROCESS-WIDE GRAPH ---
+
+_graph = None
+_graph_lock = threading.Lock()
+
+def _loaded_graph() -> EntityGraph:
+    graph = EntityGraph()
+    graph.load()
+    return graph
+
+def _replace_graph(graph: EntityGraph) -> int:
+    """Swap in a freshly loaded graph; vendors whose cluster stats changed are marked dirty"""
+    global _graph
+    previous, _graph = _graph, graph
+    if previous is None:
+        return 0
+    vendor_ids = sorted(set(previous.vendor_ids()) | set(graph.vendor_ids()))
+    old_sizes, old_flagged = previous.lookup_many(vendor_ids)
+    new_sizes, new_flagged = graph.lookup_many(vendor_ids)
+    changed = np.flatnonzero((old_sizes != new_sizes) | (old_flagged != new_flagged))
+    with session_scope() as db:
+        mark_vendors_dirty(db, [vendor_ids[i] for i in changed])
+    return len(changed)
+
+def get_entity_graph() -> EntityGraph:
+    """Process-wide graph, loaded on first use and reloaded once another process bumps its version"""
+    graph = _graph
+    if graph is not None and time.monotonic() - graph.checked_at < GRAPH_VERSION_CHECK_SECONDS:
+        return graph
+    with _graph_lock:
+        if _graph is None:
+            _replace_graph(_loaded_graph())
+        elif time.monotonic() - _graph.checked_at >= GRAPH_VERSION_CHECK_SECONDS:
+            with session_scope() as db:
+                version = read_graph_version(db)
+            _graph.checked_at = time.monotonic()
+            if version != _graph.version:
+                _replace_graph(_loaded_graph())
+        return _graph
+
+def rebuild_entity_graph() -> int:
+    """Reload the process-wide graph, dropping links that no longer hold.
+
+    Links are only ever added incrementally, so long-lived processes (the
+    verification worker) rebuild periodically. Returns the number of vendors
+    whose cluster stats changed; they are marked dirty for rescoring.
+    """
+    graph = _loaded_graph()
+    with _graph_lock:
+        return _replace_graph(graph)
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the entity graph or force processes to reload it")
+    parser.add_argument("--invalidate", action="store_true",
+                        help="Bump the shared version so every running process reloads its graph")
+    args = parser.parse_args()
+
+    init_database()
+    if args.invalidate:
+        with session_scope() as db:
+            version = bump_graph_version(db)
+        print(f"Entity graph version is now {version}; processes reload within {GRAPH_VERSION_CHECK_SECONDS:.0f}s")
+        return
+
+    stats = get_entity_graph().stats()
+    print(f"{stats['vendors']} vendors in {stats['clusters']} clusters ({stats['linked_vendors']} linked to another vendor)")
+    for cluster in stats["largest"]:
+        print(f"  {cluster['size']:>6} vendors, {cluster['flagged']} flagged  e.g. {cluster['sample']}")
+
+if __name__ == "__main__":
+    main()
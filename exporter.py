@@ -0,0 +1,444 @@
+"""Columnar Parquet export of vendors and transactions for offline analytics.
+
+    python exporter.py                # incremental (resumes from the watermark)
+    python exporter.py --full         # rebuild both snapshots from scratch
+
+Tables are streamed out of the database and written as hive-partitioned
+Parquet (entity_id=<id>/month=<YYYY-MM>/...) with a fixed schema; the JSON
+payload columns are flattened into typed columns.
+
+Transactions are one file per (entity, month) partition. database.py logs
+the partitions touched by every insert, update and delete into
+transaction_changes; an incremental run re-exports only those partitions
+from the current table, each file replaced by a single rename, so edits and
+deletes reach the snapshot too. The watermark is the last change_id applied
+and never moves past a gap that may still be an uncommitted write.
+
+Each full snapshot is written to a new <table>@<stamp> directory and made
+live by renaming a <table> symlink over the old one, so readers see either
+the previous snapshot or the new one, never a mix.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import delete, func, select
+
+from audit import audit_event
+from database import init_database, session_scope, Vendor, Transaction, TransactionChange
+
+logger = logging.getLogger("bloodhound.exporter")
+
+EXPORT_DIR = os.getenv("BLOODHOUND_EXPORT_DIR", "./exports")
+EXPORT_CHUNK_SIZE = 50000
+WATERMARK_FILE = "_watermarks.json"
+PARTITION_FILE = "data.parquet"
+# Snapshot directories kept per table: the live one plus its predecessor for readers still on it
+SNAPSHOT_KEEP = 2
+# A missing change_id younger than this may be a write that has not committed yet
+CHANGE_GRACE = timedelta(minutes=10)
+
+# --- SCHEMAS ---
+# Partition columns (entity_id, month) live in the directory names, not the files
+
+VENDOR_SCHEMA = pa.schema([
+    ("vendor_id", pa.int64()),
+    ("name", pa.string()),
+    ("gstin", pa.string()),
+    ("pan", pa.string()),
+    ("registration_days", pa.int32()),
+    ("address_type", pa.string()),
+    ("director_companies", pa.int32()),
+    ("gstr1_status", pa.string()),
+    ("gstr3b_status", pa.string()),
+    ("months_not_filed", pa.int32()),
+    ("transaction_count", pa.int32()),
+    ("itc_amount", pa.float64()),
+    ("cash_payments", pa.float64()),
+    ("amount_spikes", pa.int32()),
+    ("cash_split_days", pa.int32()),
+    ("duplicate_invoices", pa.int32()),
+    ("risk_score", pa.int32()),
+    ("risk_level", pa.string()),
+    ("risk_factors", pa.list_(pa.string())),
+    ("rules_version", pa.string()),
+    ("is_watchlisted", pa.bool_()),
+    ("last_analyzed_at", pa.timestamp("us")),
+    ("created_at", pa.timestamp("us")),
+    # Flattened gstn_api_data
+    ("gstn_legal_name", pa.string()),
+    ("gstn_trade_name", pa.string()),
+    ("gstn_status", pa.string()),
+    ("gstn_taxpayer_type", pa.string()),
+    ("gstn_registration_date", pa.string()),
+    ("gstn_gstr1_last_filed", pa.string()),
+    ("gstn_gstr3b_last_filed", pa.string()),
+    ("udyam_msme_category", pa.string()),
+    # Flattened mca_api_data
+    ("mca_director_name", pa.string()),
+    ("mca_total_companies", pa.int32()),
+    ("mca_active_companies", pa.int32()),
+    ("mca_flagged_entities", pa.int32()),
+    ("ibbi_insolvency_status", pa.string()),
+])
+
+TRANSACTION_SCHEMA = pa.schema([
+    ("transaction_id", pa.int64()),
+    ("vendor_id", pa.int64()),
+    ("transaction_date", pa.timestamp("us")),
+    ("invoice_number", pa.string()),
+    ("transaction_amount", pa.float64()),
+    ("tax_amount", pa.float64()),
+    ("payment_mode", pa.string()),
+    ("created_at", pa.timestamp("us")),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([("entity_id", pa.int64()), ("month", pa.string())]), flavor="hive")
+
+# Flattened column -> (JSON column, path inside the payload)
+JSON_FIELDS = {
+    "gstn_legal_name": ("gstn_api_data", ("legal_name",)),
+    "gstn_trade_name": ("gstn_api_data", ("trade_name",)),
+    "gstn_status": ("gstn_api_data", ("status",)),
+    "gstn_taxpayer_type": ("gstn_api_data", ("taxpayer_type",)),
+    "gstn_registration_date": ("gstn_api_data", ("registration_date",)),
+    "gstn_gstr1_last_filed": ("gstn_api_data", ("gstr1_last_filed",)),
+    "gstn_gstr3b_last_filed": ("gstn_api_data", ("gstr3b_last_filed",)),
+    "udyam_msme_category": ("gstn_api_data", ("udyam", "msme_category")),
+    "mca_director_name": ("mca_api_data", ("director_name",)),
+    "mca_total_companies": ("mca_api_data", ("total_companies",)),
+    "mca_active_companies": ("mca_api_data", ("active_companies",)),
+    "mca_flagged_entities": ("mca_api_data", ("flagged_entities",)),
+    "ibbi_insolvency_status": ("mca_api_data", ("ibbi", "insolvency_status")),
+}
+
+def _json_value(payload, path):
+    for key in path:
+        if not isinstance(payload, dict):
+            return None
+        payload = payload.get(key)
+    return payload
+
+def _month(value: datetime) -> str:
+    return value.strftime("%Y-%m") if value else "unknown"
+
+def _typed(value, field: pa.Field):
+    """Coerce loosely typed JSON values so one bad payload can't break the schema"""
+    if value is None:
+        return None
+    try:
+        if pa.types.is_integer(field.type):
+            return int(value)
+        if pa.types.is_string(field.type):
+            return str(value)
+    except (TypeError, ValueError):
+        return None
+    return value
+
+# --- ROW CONVERSION ---
+
+def vendor_columns(rows) -> dict:
+    """Vendor rows (with entity_id) -> column lists for VENDOR_SCHEMA plus partition keys"""
+    columns = {name: [] for name in VENDOR_SCHEMA.names + ["entity_id", "month"]}
+    for row in rows:
+        row = row._mapping
+        for field in VENDOR_SCHEMA:
+            if field.name in JSON_FIELDS:
+                source, path = JSON_FIELDS[field.name]
+                value = _typed(_json_value(row[source], path), field)
+            elif field.name == "risk_level":
+                value = row["risk_level"].value if row["risk_level"] else None
+            elif field.name == "risk_factors":
+                value = [str(f) for f in (row["risk_factors"] or [])]
+            else:
+                value = row[field.name]
+            columns[field.name].append(value)
+        columns["entity_id"].append(row["entity_id"])
+        columns["month"].append(_month(row["created_at"]))
+    return columns
+
+def transaction_columns(rows) -> dict:
+    columns = {name: [] for name in TRANSACTION_SCHEMA.names + ["entity_id", "month"]}
+    for row in rows:
+        row = row._mapping
+        for name in TRANSACTION_SCHEMA.names:
+            columns[name].append(row[name])
+        columns["entity_id"].append(row["entity_id"])
+        columns["month"].append(_month(row["transaction_date"]))
+    return columns
+
+def _to_table(columns: dict, schema: pa.Schema) -> pa.Table:
+    full_schema = schema.append(pa.field("entity_id", pa.int64())).append(pa.field("month", pa.string()))
+    return pa.Table.from_pydict(columns, schema=full_schema)
+
+def _write_partitions(table: pa.Table, base_dir: str, basename: str):
+    ds.write_dataset(
+        table,
+        base_dir,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template=basename + "-{i}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+# --- WATERMARKS ---
+
+def load_watermarks(export_dir: str = EXPORT_DIR) -> dict:
+    path = os.path.join(export_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_watermarks(watermarks: dict, export_dir: str = EXPORT_DIR):
+    """Atomic replace, so a crash mid-write never loses the previous watermark"""
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, WATERMARK_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+# --- SNAPSHOT DIRECTORIES ---
+
+def _new_snapshot_dir(export_dir: str, table: str) -> str:
+    return os.path.join(export_dir, f"{table}@{datetime.utcnow():%Y%m%dT%H%M%S%f}")
+
+def _swap_in(export_dir: str, table: str, snapshot_dir: str):
+    """Make snapshot_dir the live <table> with one atomic rename of a symlink"""
+    link = os.path.join(export_dir, table)
+    swap = link + ".swap"
+    if os.path.lexists(swap):
+        os.remove(swap)
+    os.symlink(os.path.basename(snapshot_dir), swap)
+    if os.path.isdir(link) and not os.path.islink(link):
+        # Plain directory from before versioned snapshots: move it aside once
+        os.replace(link, f"{link}@legacy")
+    os.replace(swap, link)
+    _prune_snapshots(export_dir, table)
+
+def _drop_snapshot(export_dir: str, table: str):
+    link = os.path.join(export_dir, table)
+    if os.path.islink(link):
+        os.remove(link)
+    _prune_snapshots(export_dir, table)
+
+def _prune_snapshots(export_dir: str, table: str):
+    link = os.path.join(export_dir, table)
+    live = os.path.realpath(link) if os.path.islink(link) else None
+    versions = sorted(
+        (os.path.join(export_dir, name) for name in os.listdir(export_dir) if name.startswith(table + "@")),
+        key=os.path.getmtime, reverse=True,
+    )
+    keep = {live} | {os.path.realpath(path) for path in versions[:SNAPSHOT_KEEP]}
+    for path in versions:
+        if os.path.realpath(path) not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+# --- TRANSACTIONS ---
+
+def _month_bounds(month: str) -> tuple:
+    start = datetime.strptime(month, "%Y-%m")
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+def _write_partition(base_dir: str, entity_id: int, month: str, rows: list):
+    """Replace one partition's file in a single rename, or remove it once the partition is empty"""
+    directory = os.path.join(base_dir, f"entity_id={entity_id}", f"month={month}")
+    path = os.path.join(directory, PARTITION_FILE)
+    if not rows:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(directory, exist_ok=True)
+    columns = transaction_columns(rows)
+    table = pa.Table.from_pydict({name: columns[name] for name in TRANSACTION_SCHEMA.names}, schema=TRANSACTION_SCHEMA)
+    # Dot-prefixed files are skipped by dataset readers
+    tmp = os.path.join(directory, f".{PARTITION_FILE}.tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+
+def _partition_rows(db, entity_id: int, month: str) -> list:
+    start, end = _month_bounds(month)
+    return db.execute(
+        select(Transaction.__table__)
+        .where(Transaction.entity_id == entity_id, Transaction.transaction_date >= start,
+               Transaction.transaction_date < end)
+        .order_by(Transaction.transaction_id)
+    ).all()
+
+def _pending_changes(db, after: int) -> tuple:
+    """(partitions changed after `after`, new watermark).
+
+    The watermark only advances over consecutive change_ids. A missing id
+    younger than CHANGE_GRACE may belong to a transaction that commits
+    later, so the watermark stops before it (those partitions are simply
+    re-exported next run); older gaps are rolled-back writes and skipped.
+    """
+    cutoff = datetime.utcnow() - CHANGE_GRACE
+    partitions = set()
+    mark = after
+    blocked = False
+    rows = db.execute(
+        select(TransactionChange.change_id, TransactionChange.entity_id, TransactionChange.month,
+               TransactionChange.changed_at)
+        .where(TransactionChange.change_id > after)
+        .order_by(TransactionChange.change_id)
+    )
+    for change_id, entity_id, month, changed_at in rows:
+        partitions.add((entity_id, month))
+        if blocked:
+            continue
+        if change_id != mark + 1 and changed_at > cutoff:
+            blocked = True
+            continue
+        mark = change_id
+    return partitions, mark
+
+def _save_transaction_mark(export_dir: str, watermarks: dict, change_id: int):
+    watermarks["transactions"] = {"change_id": change_id, "exported_at": datetime.utcnow().isoformat()}
+    save_watermarks(watermarks, export_dir)
+    # Applied changes are no longer needed
+    with session_scope() as db:
+        db.execute(delete(TransactionChange).where(TransactionChange.change_id <= change_id))
+
+def _export_all_transactions(export_dir: str, watermarks: dict, chunk_size: int) -> int:
+    """Every transaction into a new snapshot directory, then swapped in"""
+    with session_scope() as db:
+        # Changes from the last CHANGE_GRACE may not be visible to the read below; apply them again next run
+        recent = db.execute(
+            select(func.min(TransactionChange.change_id))
+            .where(TransactionChange.changed_at > datetime.utcnow() - CHANGE_GRACE)
+        ).scalar()
+        latest = db.execute(select(func.max(TransactionChange.change_id))).scalar() or 0
+    mark = recent - 1 if recent is not None else latest
+
+    snapshot_dir = _new_snapshot_dir(export_dir, "transactions")
+    query = select(Transaction.__table__).order_by(
+        Transaction.entity_id, Transaction.transaction_date, Transaction.transaction_id
+    )
+    exported = 0
+    partition, rows = None, []
+    with session_scope() as db:
+        for row in db.execute(query.execution_options(yield_per=chunk_size)):
+            key = (row.entity_id, _month(row.transaction_date))
+            if key != partition:
+                if rows:
+                    _write_partition(snapshot_dir, *partition, rows)
+                partition, rows = key, []
+            rows.append(row)
+            exported += 1
+            if exported % chunk_size == 0:
+                logger.info("Exported %d transactions", exported)
+    if rows:
+        _write_partition(snapshot_dir, *partition, rows)
+
+    if exported:
+        _swap_in(export_dir, "transactions", snapshot_dir)
+    else:
+        _drop_snapshot(export_dir, "transactions")
+    _save_transaction_mark(export_dir, watermarks, mark)
+    return exported
+
+def export_transactions(export_dir: str = EXPORT_DIR, chunk_size: int = EXPORT_CHUNK_SIZE, full: bool = False) -> int:
+    """Bring the transaction snapshot up to date. Returns rows written.
+
+    The first run (or full=True) exports everything; later runs rewrite only
+    the partitions logged in transaction_changes since the watermark.
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    watermarks = load_watermarks(export_dir)
+    mark = watermarks.get("transactions") or {}
+    base_dir = os.path.join(export_dir, "transactions")
+    if full or "change_id" not in mark or not os.path.islink(base_dir):
+        return _export_all_transactions(export_dir, watermarks, chunk_size)
+
+    with session_scope() as db:
+        partitions, change_id = _pending_changes(db, mark["change_id"])
+    exported = 0
+    for entity_id, month in sorted(partitions):
+        with session_scope() as db:
+            rows = _partition_rows(db, entity_id, month)
+        _write_partition(base_dir, entity_id, month, rows)
+        exported += len(rows)
+    if change_id != mark["change_id"]:
+        _save_transaction_mark(export_dir, watermarks, change_id)
+    logger.info("Re-exported %d partitions (%d transactions)", len(partitions), exported)
+    return exported
+
+# --- VENDORS ---
+
+def export_vendors(export_dir: str = EXPORT_DIR, chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+    """Full vendor snapshot in a new directory, swapped in once complete. Returns rows exported."""
+    os.makedirs(export_dir, exist_ok=True)
+    snapshot_dir = _new_snapshot_dir(export_dir, "vendors")
+
+    query = select(Vendor.__table__).order_by(Vendor.vendor_id).limit(chunk_size)
+    exported = 0
+    last_id = None
+    while True:
+        with session_scope() as db:
+            chunk_query = query if last_id is None else query.where(Vendor.vendor_id > last_id)
+            rows = db.execute(chunk_query).all()
+        if not rows:
+            break
+        _write_partitions(_to_table(vendor_columns(rows), VENDOR_SCHEMA), snapshot_dir, f"part-{exported // chunk_size:05d}")
+        last_id = rows[-1].vendor_id
+        exported += len(rows)
+
+    if exported:
+        _swap_in(export_dir, "vendors", snapshot_dir)
+    else:
+        _drop_snapshot(export_dir, "vendors")
+    watermarks = load_watermarks(export_dir)
+    watermarks["vendors"] = {"snapshot_at": datetime.utcnow().isoformat(), "rows": exported}
+    save_watermarks(watermarks, export_dir)
+    return exported
+
+def export_all(export_dir: str = EXPORT_DIR, full: bool = False, chunk_size: int = EXPORT_CHUNK_SIZE) -> dict:
+    started = time.perf_counter()
+    transactions = export_transactions(export_dir, chunk_size, full=full)
+    vendors = export_vendors(export_dir, chunk_size)
+    return {"vendors": vendors, "transactions": transactions, "seconds": round(time.perf_counter() - started, 2)}
+
+# --- READERS ---
+
+def snapshot_exists(table: str, export_dir: str = EXPORT_DIR) -> bool:
+    return os.path.isdir(os.path.join(export_dir, table))
+
+def read_snapshot(table: str, entity_id: int = None, columns: list = None, export_dir: str = EXPORT_DIR):
+    """Load a snapshot (optionally one entity's partitions / a column subset) as a DataFrame.
+
+    Files are memory-mapped and only the matching partitions are opened.
+    """
+    filters = [("entity_id", "=", entity_id)] if entity_id is not None else None
+    table = pq.read_table(
+        os.path.join(export_dir, table),
+        columns=columns,
+        filters=filters,
+        partitioning=PARTITIONING,
+        memory_map=True,
+    )
+    return table.to_pandas()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export vendors and transactions to partitioned Parquet")
+    parser.add_argument("--dir", default=EXPORT_DIR, help="Output directory")
+    parser.add_argument("--full", action="store_true", help="Re-export every transaction instead of the changed partitions")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    init_database()
+    result = export_all(args.dir, full=args.full, chunk_size=args.chunk_size)
+    audit_event(None, "export.parquet", directory=args.dir, full=args.full, **result)
+    print(f"Exported {result['vendors']} vendors and {result['transactions']} transactions in {result['seconds']}s -> {args.dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import math
+import os
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import httpx
+
+# --- LOCAL FAKE GOVERNMENT PORTALS ---
+# Served through httpx.MockTransport so the real HTTP client path (pooling,
+# retries, circuit breakers, rate limits) runs offline. No keys required.
+# Safe for Hackathon Demos.
+#
+# Everything is deterministic: payloads are derived from (seed, source,
+# GSTIN/PAN) and latency/failures from (seed, source, key, attempt), so a
+# run with the same seed and profiles replays exactly.
+
+FAKE_SEED = int(os.getenv("BLOODHOUND_FAKE_SEED", "0"))
+
+class LatencyProfile:
+    """Per-source latency distribution and failure rates.
+
+    Latency is log-normal, fitted so its median is `p50` and its 99th
+    percentile is `p99` (seconds). `timeout_rate` requests hang for
+    `timeout_seconds` and then fail; `error_rate` requests return HTTP 503.
+    """
+
+    def __init__(self, p50: float, p99: float = None, timeout_rate: float = 0.0, error_rate: float = 0.0,
+                 timeout_seconds: float = 10.0):
+        self.p50 = p50
+        self.p99 = p99 if p99 is not None else p50
+        self.timeout_rate = timeout_rate
+        self.error_rate = error_rate
+        self.timeout_seconds = timeout_seconds
+        self._mu = math.log(p50) if p50 > 0 else None
+        # z(0.99) = 2.3263
+        self._sigma = (math.log(self.p99) - math.log(p50)) / 2.3263 if p50 > 0 and self.p99 > p50 else 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self._mu is None:
+            return 0.0
+        if self._sigma == 0.0:
+            return self.p50
+        return rng.lognormvariate(self._mu, self._sigma)
+
+# Fixed delays matching the original demo mocks
+DEFAULT_PROFILES = {
+    "gstn": LatencyProfile(0.8),
+    "mca": LatencyProfile(0.6),
+    "ibbi": LatencyProfile(0.4),
+    "udyam": LatencyProfile(0.3),
+}
+
+# Named scenarios for load tests
+PROFILE_PRESETS = {
+    "default": DEFAULT_PROFILES,
+    "fast": {source: LatencyProfile(0.005, 0.02) for source in DEFAULT_PROFILES},
+    "realistic": {
+        "gstn": LatencyProfile(0.35, 2.5, timeout_rate=0.005, error_rate=0.01),
+        "mca": LatencyProfile(0.5, 4.0, timeout_rate=0.01, error_rate=0.02),
+        "ibbi": LatencyProfile(0.25, 1.5, error_rate=0.01),
+        "udyam": LatencyProfile(0.2, 1.0, error_rate=0.005),
+    },
+    "degraded_mca": {
+        **DEFAULT_PROFILES,
+        "mca": LatencyProfile(1.5, 12.0, timeout_rate=0.05, error_rate=0.10),
+    },
+}
+
+def _rng(*parts) -> random.Random:
+    digest = hashlib.blake2b(":".join(str(p) for p in parts).encode(), digest_size=8).digest()
+    return random.Random(int.from_bytes(digest, "big"))
+
+def _period(as_of: date, months_back: int) -> str:
+    """'YYYY-MM' of the month `months_back` before the month preceding as_of"""
+    index = as_of.year * 12 + as_of.month - 2 - months_back
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+def fake_gstn_payload(gstin: str, rng: random.Random, as_of: date) -> dict:
+    """MOCK GSTN DATA GENERATOR"""
+    registration_date = as_of - timedelta(days=rng.randint(10, 1500))
+    status = rng.choice(["Active", "Active", "Active", "Suspended", "Cancelled"])
+    trade_name = f"Demo Trader {gstin[:4]}"
+    # Active taxpayers are mostly current; a few run a month or two behind
+    lag = rng.choice([0, 0, 0, 0, 1, 2])
+
+    return {
+        "gstin": gstin,
+        "legal_name": f"Demo Enterprise {gstin[:4]} Pvt Ltd",
+        "trade_name": trade_name,
+        "registration_date": registration_date.strftime("%Y-%m-%d"),
+        "status": status,
+        "taxpayer_type": "Regular",
+        "gstr1_last_filed": _period(as_of, lag),
+        "gstr3b_last_filed": _period(as_of, lag) if status == "Active" else "Not Filed",
+        "center_jurisdiction": "Commissioner-5",
+        "state_jurisdiction": "Ward-3",
+        "api_timestamp": datetime.now().isoformat()
+    }
+
+def fake_mca_payload(pan: str, rng: random.Random, as_of: date) -> dict:
+    """MOCK MCA DATA GENERATOR"""
+    company_count = rng.randint(1, 25)
+
+    return {
+        "pan": pan,
+        "director_name": f"Director {pan[:4]}",
+        "total_companies": company_count,
+        "active_companies": company_count - rng.randint(0, 2),
+        "dissolved_companies": rng.randint(0, 2),
+        "recent_incorporations": rng.randint(0, 1),
+        # Flag as risky if director is in too many companies
+        "flagged_entities": 2 if company_count > 20 else 0,
+        "compliance_status": "Compliant",
+        "api_timestamp": datetime.now().isoformat()
+    }
+
+def fake_ibbi_payload(pan: str, rng: random.Random, as_of: date) -> dict:
+    """MOCK INSOLVENCY CHECK"""
+    is_risky = rng.choice([True, False, False, False, False]) # 20% chance of risk
+
+    return {
+        "pan": pan,
+        "insolvency_status": "Under CIRP" if is_risky else "Clear",
+        "nclt_cases": 1 if is_risky else 0,
+        "ibbi_registered": False,
+        "api_timestamp": datetime.now().isoformat()
+    }
+
+def fake_udyam_payload(gstin: str, rng: random.Random, as_of: date) -> dict:
+    """MOCK MSME CHECK"""
+    return {
+        "gstin": gstin,
+        "udyam_registered": True,
+        "msme_category": rng.choice(["Micro", "Small", "Medium"]),
+        "registration_date": "2021-05-20",
+        "api_timestamp": datetime.now().isoformat()
+    }
+
+FAKE_PAYLOADS = {
+    "gstn": fake_gstn_payload,
+    "mca": fake_mca_payload,
+    "ibbi": fake_ibbi_payload,
+    "udyam": fake_udyam_payload,
+}
+
+class FakeUpstream:
+    """Seeded async request handler answering for every configured source host"""
+
+    def __init__(self, seed: int = FAKE_SEED, profiles: dict = None, as_of: date = None):
+        self.seed = seed
+        self.profiles = {**DEFAULT_PROFILES, **(profiles or {})}
+        self.as_of = as_of or date.today()
+        self._attempts = defaultdict(int)
+        self.stats = defaultdict(lambda: {"requests": 0, "errors": 0, "timeouts": 0})
+
+    def payload(self, source: str, key: str) -> dict:
+        """The deterministic response body for (source, key)"""
+        return FAKE_PAYLOADS[source](key, _rng(self.seed, source, key), self.as_of)
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        source = request.headers.get("x-bloodhound-source") or request.url.host.split(".")[0]
+        key = request.url.path.rstrip("/").rsplit("/", 1)[-1]
+        if source not in FAKE_PAYLOADS:
+            return httpx.Response(404, json={"error": f"unknown source {source}"})
+
+        # Retries of the same key draw fresh (but replayable) outcomes
+        attempt = self._attempts[(source, key)]
+        self._attempts[(source, key)] += 1
+        rng = _rng(self.seed, source, key, attempt)
+        profile = self.profiles[source]
+        stats = self.stats[source]
+        stats["requests"] += 1
+
+        roll = rng.random()
+        if roll < profile.timeout_rate:
+            stats["timeouts"] += 1
+            await asyncio.sleep(profile.timeout_seconds)
+            raise httpx.ReadTimeout("simulated upstream timeout", request=request)
+        await asyncio.sleep(profile.sample(rng))
+        if roll < profile.timeout_rate + profile.error_rate:
+            stats["errors"] += 1
+            return httpx.Response(503, json={"error": "simulated upstream error"})
+        return httpx.Response(200, json=self.payload(source, key))
+
+def fake_transport(handler=None) -> httpx.MockTransport:
+    return httpx.MockTransport(handler or FakeUpstream())
@@ -0,0 +1,374 @@
+"""In-process counters and histograms, exported in Prometheus text format.
+
+    BLOODHOUND_METRICS_PORT=9108 streamlit run app.py     # serve /metrics
+    BLOODHOUND_METRICS_FILE=./metrics.prom ...            # or rewrite a file
+
+Metrics live for the life of the process; observing one is a dict lookup,
+a bisect and two additions under a per-metric lock. Pages call track_page()
+at the top, which times the whole rerun (until Streamlit reports the script
+finished) without any further changes to the page. The admin metrics page
+reads snapshot().
+"""
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("bloodhound.metrics")
+
+METRICS_PORT = int(os.getenv("BLOODHOUND_METRICS_PORT", "0"))
+METRICS_FILE = os.getenv("BLOODHOUND_METRICS_FILE")
+METRICS_FILE_SECONDS = float(os.getenv("BLOODHOUND_METRICS_FILE_SECONDS", "15"))
+
+# Latency buckets (seconds): sub-millisecond queries up to slow upstream calls and reruns
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# --- METRIC TYPES ---
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self) -> list:
+        """[(suffix, labels dict, value)]"""
+        with self._lock:
+            values = dict(self._values)
+        return [("", dict(zip(self.labels, key)), value) for key, value in sorted(values.items())]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+class Histogram:
+    """Bucketed distribution (count, sum, cumulative buckets) per label combination"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        """Observe the wall time of a block, including when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def series(self) -> dict:
+        """{label values: (per-bucket counts, count, sum)} copy"""
+        with self._lock:
+            return {key: (list(counts), count, total) for key, (counts, count, total) in self._series.items()}
+
+    def samples(self) -> list:
+        samples = []
+        for key, (counts, count, total) in sorted(self.series().items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                samples.append(("_bucket", {**labels, "le": _format_bound(bound)}, cumulative))
+            samples.append(("_count", labels, count))
+            samples.append(("_sum", labels, total))
+        return samples
+
+    def quantile(self, q: float, counts: list, count: int) -> float:
+        """Estimate a quantile from bucket counts (linear within the bucket)"""
+        if not count:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        lower = 0.0
+        for bound, bucket_count in zip(self.buckets, counts):
+            if cumulative + bucket_count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = bound
+        return self.buckets[-1]
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+# --- REGISTRY ---
+
+_registry = {}
+_registry_lock = threading.Lock()
+_collectors = []
+
+def _register(cls, name: str, help: str, labels: tuple, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help, labels, **kwargs)
+        elif not isinstance(metric, cls) or metric.labels != tuple(labels):
+            raise ValueError(f"Metric {name} already registered with a different type or labels")
+        return metric
+
+def counter(name: str, help: str, labels: tuple = ()) -> Counter:
+    """Get or create a counter (idempotent, safe at import time)"""
+    return _register(Counter, name, help, labels)
+
+def histogram(name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+    """Get or create a histogram (idempotent, safe at import time)"""
+    return _register(Histogram, name, help, labels, buckets=buckets)
+
+def register_collector(collect):
+    """Add a callable evaluated at export time.
+
+    It returns [(name, kind, help, [(labels dict, value)])] for values that
+    are already tracked elsewhere (e.g. response cache stats), so the hot
+    path isn't counted twice.
+    """
+    if collect not in _collectors:
+        _collectors.append(collect)
+
+def reset_metrics():
+    """Zero every metric (benchmarks)"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    for metric in metrics:
+        metric.reset()
+
+# --- STANDARD METRICS ---
+
+PAGE_RUN_SECONDS = histogram("bloodhound_page_run_seconds", "Streamlit script run duration per page", ("page", "outcome"))
+DB_QUERY_SECONDS = histogram("bloodhound_db_query_seconds", "Database statement execution time", ("operation", "table"))
+DB_QUERY_ERRORS = counter("bloodhound_db_query_errors_total", "Database statements that raised", ("operation", "table"))
+UPSTREAM_SECONDS = histogram("bloodhound_upstream_seconds", "Upstream portal call duration", ("source", "outcome"))
+BCRYPT_SECONDS = histogram("bloodhound_bcrypt_seconds", "bcrypt hash/verify time, including pool wait", ("operation",))
+
+# --- PAGE RERUNS ---
+# Streamlit has no public "script finished" hook, but the ScriptRunner that
+# owns the current thread emits SCRIPT_STOPPED_* on its on_event signal for
+# every way a run can end (including st.stop() and st.rerun()/switch_page).
+
+_page_runs = weakref.WeakKeyDictionary()  # ScriptRunner -> (page, started, finish callbacks)
+_STOP_OUTCOMES = {
+    "SCRIPT_STOPPED_WITH_SUCCESS": "ok",
+    "SCRIPT_STOPPED_FOR_RERUN": "rerun",
+    "SCRIPT_STOPPED_WITH_COMPILE_ERROR": "error",
+    "FRAGMENT_STOPPED_WITH_SUCCESS": "fragment",
+}
+
+_page_hooks = []
+
+def register_page_hook(hook):
+    """Add hook(page), called when a tracked run starts.
+
+    It may return a callable(outcome, seconds) that is called in the script
+    thread when that run ends (e.g. the query tracer's per-rerun trace).
+    """
+    if hook not in _page_hooks:
+        _page_hooks.append(hook)
+
+def _on_script_event(runner, event=None, **kwargs):
+    outcome = _STOP_OUTCOMES.get(getattr(event, "name", None))
+    if outcome is None:
+        return
+    run = _page_runs.pop(runner, None)
+    if run is not None:
+        page, started, finishers = run
+        seconds = time.perf_counter() - started
+        PAGE_RUN_SECONDS.observe(seconds, page, outcome)
+        for finish in finishers:
+            try:
+                finish(outcome, seconds)
+            except Exception:
+                logger.exception("Page hook %r failed for %s", finish, page)
+
+def _current_script_runner():
+    from streamlit.runtime.scriptrunner.script_runner import ScriptRunner
+    target = getattr(threading.current_thread(), "_target", None)
+    runner = getattr(target, "__self__", None)
+    return runner if isinstance(runner, ScriptRunner) else None
+
+def track_page(page: str):
+    """Time the current Streamlit run as `page`; call once near the top of a page.
+
+    Also starts the configured exporters. A no-op outside a script thread.
+    """
+    start_exporters()
+    try:
+        runner = _current_script_runner()
+    except ImportError:
+        runner = None
+    if runner is None:
+        return
+    if runner not in _page_runs:
+        # weak=False: the receiver is a module function; blinker dedupes repeat connects
+        runner.on_event.connect(_on_script_event, weak=False)
+    finishers = [finish for finish in (hook(page) for hook in _page_hooks) if finish is not None]
+    _page_runs[runner] = (page, time.perf_counter(), finishers)
+
+# --- EXPORT ---
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else ("+Inf" if value > 0 else "-Inf" if value < 0 else "NaN")
+    return str(value)
+
+def _collected() -> list:
+    families = []
+    for collect in list(_collectors):
+        try:
+            families.extend(collect())
+        except Exception:
+            logger.exception("Metrics collector %r failed", collect)
+    return families
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)"""
+    lines = []
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for suffix, labels, value in metric.samples():
+            lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    for name, kind, help, samples in _collected():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+def write_metrics_file(path: str = None) -> str:
+    """Atomically rewrite a textfile-collector file with the current metrics"""
+    path = path or METRICS_FILE
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        handle.write(render_prometheus())
+    os.replace(tmp_path, path)
+    return path
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics scrape: " + format, *args)
+
+def start_metrics_server(port: int = None, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread (local only by default)"""
+    server = ThreadingHTTPServer((host, port or METRICS_PORT), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="bloodhound-metrics-http", daemon=True).start()
+    return server
+
+def _file_writer(path: str, interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            write_metrics_file(path)
+        except OSError:
+            logger.exception("Could not write metrics file %s", path)
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+def start_exporters():
+    """Start the env-configured endpoint / file writer once per process"""
+    global _exporters_started
+    if _exporters_started:
+        return
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+        if METRICS_PORT:
+            try:
+                start_metrics_server(METRICS_PORT)
+            except OSError:
+                # Another process (e.g. a second Streamlit server) already serves the port
+                logger.warning("Metrics port %s unavailable; endpoint not started", METRICS_PORT)
+        if METRICS_FILE:
+            threading.Thread(
+                target=_file_writer, args=(METRICS_FILE, METRICS_FILE_SECONDS),
+                name="bloodhound-metrics-file", daemon=True
+            ).start()
+
+# --- SNAPSHOT ---
+
+def snapshot() -> dict:
+    """Summaries for the admin page.
+
+    {"histograms": [{metric, labels..., count, mean, p50, p95, p99, total}],
+     "counters": [{metric, labels..., value}]} - times in seconds.
+    """
+    histograms, counters = [], []
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda metric: metric.name)
+    for metric in metrics:
+        if isinstance(metric, Histogram):
+            for key, (counts, count, total) in sorted(metric.series().items()):
+                histograms.append({
+                    "metric": metric.name,
+                    **dict(zip(metric.labels, key)),
+                    "count": count,
+                    "mean": total / count if count else 0.0,
+                    "p50": metric.quantile(0.50, counts, count),
+                    "p95": metric.quantile(0.95, counts, count),
+                    "p99": metric.quantile(0.99, counts, count),
+                    "total": total,
+                })
+        else:
+            for _, labels, value in metric.samples():
+                counters.append({"metric": metric.name, **labels, "value": value})
+    for name, kind, _, samples in _collected():
+        for labels, value in samples:
+            counters.append({"metric": name, **labels, "value": value})
+    return {"histograms": histograms, "counters": counters}
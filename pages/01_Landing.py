@@ -1,4 +1,7 @@
 import streamlit as st
+from metrics import track_page
+
+track_page("landing")
 from utils.styling import inject_custom_css
 
 st.set_page_config(page_title="Welcome", page_icon="🏠", layout="wide", initial_sidebar_state="collapsed")
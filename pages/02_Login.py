@@ -1,4 +1,7 @@
 import streamlit as st
+from metrics import track_page
+
+track_page("login")
 from auth import signin_user, signup_user, login_user
 from utils.styling import inject_custom_css
 
@@ -16,6 +19,8 @@ st.markdown("""
 if st.session_state.get('authenticated', False):
     if st.session_state.role == 'client':
         st.switch_page("pages/03_Client_Dashboard.py")
+    elif st.session_state.role == 'admin':
+        st.switch_page("pages/06_Admin_Metrics.py")
     else:
         st.switch_page("pages/04_CA_Dashboard.py")
 
@@ -43,6 +48,8 @@ with tab1:
                 # Redirect based on role
                 if role == 'client':
                     st.switch_page("pages/03_Client_Dashboard.py")
+                elif role == 'admin':
+                    st.switch_page("pages/06_Admin_Metrics.py")
                 else:
                     st.switch_page("pages/04_CA_Dashboard.py")
             else:
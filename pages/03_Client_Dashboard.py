@@ -1,4 +1,7 @@
 import streamlit as st
+from metrics import track_page
+
+track_page("client_dashboard")
 # ... imports ...
 
 # 1. Check Auth
@@ -18,15 +21,24 @@ st.markdown("""
     /* Hide Landing and Login (1st and 2nd) */
     [data-testid="stSidebarNav"] ul li:nth-child(1) {display: none;}
     [data-testid="stSidebarNav"] ul li:nth-child(2) {display: none;}
+    /* Hide Admin Metrics (6th) */
+    [data-testid="stSidebarNav"] ul li:nth-child(6) {display: none;}
 </style>
 """, unsafe_allow_html=True)
 
 # ... Rest of your dashboard code ...
 
+from datetime import datetime
+
 import streamlit as st
 from utils.styling import inject_custom_css, metric_card, risk_badge
 from auth import logout_user
-from database import get_session, Vendor, RiskLevel
+from audit import audit_event
+from dashboard_service import get_entity_metrics, get_vendor_page
+from portfolio import refresh_client_summaries
+from reconciliation import reconcile_entity
+from transaction_import import import_transactions
+from utils.helpers import format_currency
 
 st.set_page_config(page_title="Client Dashboard", page_icon="📊", layout="wide")
 inject_custom_css()
@@ -44,27 +56,112 @@ with st.sidebar:
 
 st.title("📊 Client Compliance Dashboard")
 
-# Fetch Data (Mock logic for now - connect to DB in production)
-db = get_session()
-# In real app: vendors = db.query(Vendor).filter(Vendor.entity_id == st.session_state.entity_id).all()
-# For demo, we'll just show UI
-total_vendors = 12
-critical_vendors = 2
-high_risk = 3
-total_itc = 1500000
+entity_id = st.session_state.get('entity_id')
+if entity_id is None:
+    st.info("Complete your entity profile setup to start monitoring vendors.")
+    st.stop()
+
+# Fetch Data (cached per entity, refreshed after rescoring)
+metrics = get_entity_metrics(entity_id)
 
 col1, col2, col3, col4 = st.columns(4)
 with col1:
-    metric_card("Total Vendors", total_vendors, icon="👥")
+    metric_card("Total Vendors", metrics["total_vendors"], icon="👥")
 with col2:
-    metric_card("Critical Risks", critical_vendors, delta="-1", icon="🚨")
+    metric_card("Critical Risks", metrics["critical_vendors"], icon="🚨")
 with col3:
-    metric_card("High Risks", high_risk, delta="+2", icon="⚠️")
+    metric_card("High Risks", metrics["high_risk_vendors"], icon="⚠️")
 with col4:
-    metric_card("ITC at Risk", "₹15.0 L", icon="💰")
+    metric_card("ITC at Risk", format_currency(metrics["itc_at_risk"]), icon="💰")
 
 st.divider()
 
 st.subheader("📡 Real-Time Risk Monitor")
-# Placeholder for table
-st.info("Connect Tally or Upload CSV to see live vendor data.")
+
+# Keyset pagination: keep a stack of page cursors in session state
+if st.session_state.get("vendor_cursor_entity") != entity_id:
+    st.session_state.vendor_cursor_entity = entity_id
+    st.session_state.vendor_cursors = [None]
+cursors = st.session_state.vendor_cursors
+page = get_vendor_page(entity_id, after=cursors[-1])
+
+if not page["rows"] and len(cursors) == 1:
+    st.info("Connect Tally or Upload CSV to see live vendor data.")
+else:
+    st.dataframe(
+        [
+            {"Vendor": r["name"], "GSTIN": r["gstin"], "Risk Score": r["risk_score"], "Risk": r["risk_level"],
+             "ITC": format_currency(r["itc_amount"] or 0), "Watchlist": "👁️" if r["is_watchlisted"] else ""}
+            for r in page["rows"]
+        ],
+        use_container_width=True,
+        hide_index=True
+    )
+    prev_col, page_col, next_col = st.columns([1, 4, 1])
+    with prev_col:
+        if st.button("← Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with page_col:
+        st.caption(f"Page {len(cursors)}")
+    with next_col:
+        if st.button("Next →", disabled=page["next"] is None):
+            cursors.append(page["next"])
+            st.rerun()
+
+with st.expander("📥 Import Transactions (CSV / Excel)"):
+    ledger = st.file_uploader("Purchase ledger", type=["csv", "xlsx"])
+    if ledger is not None and st.button("Import Ledger"):
+        progress_bar = st.progress(0.0, text="Importing...")
+        total_hint = max(ledger.size // 120, 1)  # rough rows estimate for the progress bar
+
+        def show_progress(rows, rows_per_sec):
+            progress_bar.progress(min(rows / total_hint, 1.0), text=f"{rows:,} rows ({rows_per_sec:,.0f} rows/sec)")
+
+        try:
+            summary = import_transactions(entity_id, ledger, ledger.name, progress=show_progress)
+            progress_bar.progress(1.0, text="Import complete")
+            refresh_client_summaries([entity_id])
+            audit_event(st.session_state.user_id, "transactions.import", entity_id=entity_id, file=ledger.name,
+                        imported=summary["imported"], skipped=summary["skipped"])
+            st.success(f"Imported {summary['imported']:,} transactions in {summary['seconds']}s "
+                       f"({summary['rows_per_sec']:,.0f} rows/sec). New vendors: {summary['vendors_created']}.")
+            if summary["skipped"]:
+                st.warning(f"Skipped {summary['skipped']:,} rows")
+                st.code("\n".join(summary["errors"]))
+        except ValueError as e:
+            st.error(str(e))
+
+with st.expander("🧾 GSTR-2B Reconciliation"):
+    today = datetime.now()
+    months = [f"{(today.year * 12 + today.month - 2 - i) // 12}-{(today.year * 12 + today.month - 2 - i) % 12 + 1:02d}" for i in range(12)]
+    period = st.selectbox("Return period", months)
+    gstr2b_file = st.file_uploader("GSTR-2B (portal JSON, CSV or Excel)", type=["json", "csv", "xlsx"])
+    if gstr2b_file is not None and st.button("Reconcile"):
+        try:
+            with st.spinner("Matching invoices..."):
+                recon = reconcile_entity(entity_id, period, gstr2b_file, gstr2b_file.name)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            summary = recon["summary"]
+            audit_event(st.session_state.user_id, "reconciliation.run", entity_id=entity_id, period=period,
+                        file=gstr2b_file.name, matched=summary["matched"], itc_at_risk=summary["itc_at_risk"])
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                metric_card("Matched", f"{summary['matched']:,}", icon="✅")
+            with col2:
+                metric_card("Mismatched", f"{summary['mismatched']:,}", icon="⚠️")
+            with col3:
+                metric_card("Not in 2B", f"{summary['missing_in_2b']:,}", icon="❓")
+            with col4:
+                metric_card("ITC at Risk", format_currency(summary["itc_at_risk"]), icon="💰")
+            st.caption(f"{summary['books_invoices']:,} booked vs {summary['gstr2b_invoices']:,} reported invoices, "
+                       f"{summary['missing_in_books']:,} reported but not booked "
+                       f"({format_currency(summary['itc_unclaimed'])} ITC unclaimed) · {summary['seconds']}s")
+            st.dataframe(recon["vendors"].head(100), use_container_width=True, hide_index=True)
+            for name, label in (("mismatched", "Mismatched invoices"), ("missing_in_2b", "Invoices missing from GSTR-2B"),
+                                ("missing_in_books", "Invoices missing from books")):
+                if len(recon[name]):
+                    st.download_button(f"⬇️ {label} ({len(recon[name]):,})", recon[name].to_csv(index=False),
+                                       file_name=f"{name}_{period}.csv", mime="text/csv")
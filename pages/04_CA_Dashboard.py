@@ -1,4 +1,7 @@
 import streamlit as st
+from metrics import track_page
+
+track_page("ca_dashboard")
 # ... imports ...
 
 if not st.session_state.get('authenticated'):
@@ -16,6 +19,8 @@ st.markdown("""
     /* Hide Landing and Login */
     [data-testid="stSidebarNav"] ul li:nth-child(1) {display: none;}
     [data-testid="stSidebarNav"] ul li:nth-child(2) {display: none;}
+    /* Hide Admin Metrics (6th) */
+    [data-testid="stSidebarNav"] ul li:nth-child(6) {display: none;}
 </style>
 """, unsafe_allow_html=True)
 
@@ -23,7 +28,9 @@ st.markdown("""
 
 import streamlit as st
 from utils.styling import inject_custom_css, metric_card
+from utils.helpers import format_currency
 from auth import logout_user
+from portfolio import get_ca_id_for_user, get_portfolio
 
 st.set_page_config(page_title="CA Console", page_icon="⚖️", layout="wide")
 inject_custom_css()
@@ -40,22 +47,49 @@ with st.sidebar:
 
 st.title("⚖️ CA Practice 'God View'")
 
+if 'ca_id' not in st.session_state:
+    st.session_state.ca_id = get_ca_id_for_user(st.session_state.user_id)
+if st.session_state.ca_id is None:
+    st.info("Complete your CA profile to see your client portfolio.")
+    st.stop()
+
+# Pre-aggregated per-client rows (see portfolio.py)
+portfolio = get_portfolio(st.session_state.ca_id)
+
 col1, col2, col3 = st.columns(3)
 with col1:
-    metric_card("Total Clients", "15", icon="🏢")
+    metric_card("Total Clients", len(portfolio), icon="🏢")
 with col2:
-    metric_card("Pending Alerts", "8", icon="🔔")
+    metric_card("Pending Alerts", sum(c["high_risk_vendors"] + c["critical_vendors"] for c in portfolio), icon="🔔")
 with col3:
-    metric_card("Total Billable Hours", "42.5", icon="⏱️")
+    metric_card("Total Billable Hours", f"{sum(c['billable_hours'] for c in portfolio):.1f}", icon="⏱️")
 
 st.divider()
 
 st.subheader("📋 Client Portfolio Status")
 
-# Mock Table
-client_data = [
-    {"Client": "ABC Pvt Ltd", "Risk": "Critical", "ITC Risk": "₹12L", "Last Audit": "2 Days ago"},
-    {"Client": "XYZ Traders", "Risk": "Low", "ITC Risk": "₹0", "Last Audit": "Today"},
-]
+def _portfolio_risk(client):
+    if client["critical_vendors"]:
+        return "Critical"
+    if client["high_risk_vendors"]:
+        return "High"
+    if client["medium_risk_vendors"]:
+        return "Medium"
+    return "Low"
 
-st.table(client_data)
+if not portfolio:
+    st.info("No linked clients yet. Share your invite code with clients to get started.")
+else:
+    client_data = [
+        {
+            "Client": c["entity_name"],
+            "Risk": _portfolio_risk(c),
+            "Critical / High": f"{c['critical_vendors']} / {c['high_risk_vendors']}",
+            "Vendors": c["total_vendors"],
+            "ITC Risk": format_currency(c["itc_at_risk"]),
+            "Last Audit": c["last_audit_at"].strftime("%d %b %Y") if c["last_audit_at"] else "Never",
+            "Billable Hours": round(c["billable_hours"], 1),
+        }
+        for c in portfolio
+    ]
+    st.table(client_data)
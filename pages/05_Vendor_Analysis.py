@@ -1,5 +1,19 @@
+from datetime import datetime
+
 import streamlit as st
-from utils.styling import inject_custom_css
+from metrics import track_page
+from utils.styling import inject_custom_css, metric_card, risk_badge
+from utils.helpers import format_currency
+from api_integrations import stream_vendor_checks
+from audit import audit_event
+from exporter import read_snapshot, snapshot_exists
+from portfolio import get_ca_id_for_user, get_portfolio
+from verification_worker import save_check_results, vendor_fields_from_checks
+from vendor_detail import (
+    search_vendors, get_vendor_header, get_vendor_transactions, get_vendor_monthly, get_vendor_payloads
+)
+
+track_page("vendor_analysis")
 
 st.set_page_config(page_title="Vendor Analysis", page_icon="🔎", layout="wide")
 inject_custom_css()
@@ -12,10 +26,176 @@ st.markdown("""
 <style>
     [data-testid="stSidebarNav"] ul li:nth-child(1) {display: none;}
     [data-testid="stSidebarNav"] ul li:nth-child(2) {display: none;}
+    /* Hide Admin Metrics (6th) */
+    [data-testid="stSidebarNav"] ul li:nth-child(6) {display: none;}
 </style>
 """, unsafe_allow_html=True)
 
 st.title("🔎 Deep Vendor Analysis")
-st.write("This page is visible to both CAs and Clients.")
 
-# ... Add your Analysis code here ...
+# A live check left running by the previous run (rerun / navigation) is abandoned
+if st.session_state.get("live_check") is not None:
+    st.session_state.live_check.cancel()
+    st.session_state.live_check = None
+
+# --- ENTITY SELECTION ---
+# Clients see their own vendors; CAs pick one of their linked clients
+if st.session_state.role == 'ca':
+    if 'ca_id' not in st.session_state:
+        st.session_state.ca_id = get_ca_id_for_user(st.session_state.user_id)
+    clients = get_portfolio(st.session_state.ca_id) if st.session_state.ca_id is not None else []
+    if not clients:
+        st.info("No linked clients yet.")
+        st.stop()
+    client = st.selectbox("Client", clients, format_func=lambda c: c["entity_name"])
+    entity_id = client["entity_id"]
+else:
+    entity_id = st.session_state.get('entity_id')
+    if entity_id is None:
+        st.info("Complete your entity profile setup to analyse vendors.")
+        st.stop()
+
+# --- VENDOR SELECTION ---
+search = st.text_input("Search vendor by name or GSTIN", placeholder="e.g. Sharma Traders or 27ABCDE")
+matches = search_vendors(entity_id, search)
+if not matches:
+    st.info("No matching vendors.")
+    st.stop()
+selected = st.selectbox(
+    "Vendor", matches,
+    format_func=lambda v: f"{v['name']} ({v['gstin']}) - score {v['risk_score']}"
+)
+vendor = get_vendor_header(entity_id, selected["vendor_id"])
+if vendor is None:
+    st.error("Vendor not found.")
+    st.stop()
+if st.session_state.get("audited_vendor_view") != vendor["vendor_id"]:
+    # One event per vendor opened, not per rerun
+    st.session_state.audited_vendor_view = vendor["vendor_id"]
+    audit_event(st.session_state.user_id, "vendor.view", entity_id=entity_id, vendor_id=vendor["vendor_id"])
+
+# --- HEADLINE ---
+st.markdown(f"### {vendor['name']} &nbsp; {risk_badge(vendor['risk_level'])}", unsafe_allow_html=True)
+st.caption(f"GSTIN {vendor['gstin']} · PAN {vendor['pan'] or '-'} · Last analysed "
+           f"{vendor['last_analyzed_at'].strftime('%d %b %Y') if vendor['last_analyzed_at'] else 'never'}"
+           f" · Rules {vendor['rules_version'] or '-'}")
+
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    metric_card("Risk Score", vendor["risk_score"], icon="🎯")
+with col2:
+    metric_card("Transactions", vendor["transaction_count"], icon="🧾")
+with col3:
+    metric_card("ITC Claimed", format_currency(vendor["itc_amount"]), icon="💰")
+with col4:
+    metric_card("Cash Payments", format_currency(vendor["cash_payments"]), icon="💵")
+
+left, right = st.columns(2)
+with left:
+    st.subheader("⚠️ Risk Factors")
+    for factor in vendor["risk_factors"] or ["No risk factors detected"]:
+        st.write(factor)
+    for breach in vendor["compliance_breaches"]:
+        st.error(breach)
+with right:
+    st.subheader("✅ Recommended Actions")
+    for action in vendor["recommended_actions"]:
+        st.write(action)
+
+st.divider()
+
+# --- DETAIL SECTIONS ---
+# Only the selected section is rendered, so its query runs on demand
+section = st.radio("Details", ["Transactions", "Monthly Trend", "API Payloads"], horizontal=True)
+
+if section == "Transactions":
+    cursor_key = f"txn_cursors_{vendor['vendor_id']}"
+    cursors = st.session_state.setdefault(cursor_key, [None])
+    page = get_vendor_transactions(entity_id, vendor["vendor_id"], after=cursors[-1])
+    if not page["rows"] and len(cursors) == 1:
+        st.info("No transactions recorded for this vendor.")
+    else:
+        st.dataframe(
+            [
+                {"Date": r["transaction_date"].strftime("%d %b %Y"), "Invoice": r["invoice_number"],
+                 "Amount": format_currency(r["transaction_amount"]), "Tax": format_currency(r["tax_amount"] or 0),
+                 "Mode": r["payment_mode"]}
+                for r in page["rows"]
+            ],
+            use_container_width=True,
+            hide_index=True
+        )
+        prev_col, page_col, next_col = st.columns([1, 4, 1])
+        with prev_col:
+            if st.button("← Newer", disabled=len(cursors) == 1):
+                cursors.pop()
+                st.rerun()
+        with page_col:
+            st.caption(f"Page {len(cursors)}")
+        with next_col:
+            if st.button("Older →", disabled=page["next"] is None):
+                cursors.append(page["next"])
+                st.rerun()
+
+elif section == "Monthly Trend":
+    breakdown = get_vendor_monthly(entity_id, vendor["vendor_id"])
+    if not breakdown["monthly"]:
+        st.info("No monthly data yet.")
+    else:
+        st.bar_chart(
+            {r["month"]: r["total_amount"] for r in breakdown["monthly"]},
+            x_label="Month", y_label="Purchases (₹)"
+        )
+        st.dataframe(
+            [{"Mode": mode, "Amount": format_currency(amount)} for mode, amount in breakdown["payment_modes"].items()],
+            use_container_width=True,
+            hide_index=True
+        )
+
+else:
+    if st.button("🔄 Re-check live"):
+        # Each portal's answer is shown as soon as it arrives; once all four are
+        # in they are saved and the worker relinks and rescores the vendor
+        stream = st.session_state.live_check = stream_vendor_checks(vendor["gstin"], force_refresh=True)
+        labels = {"gstin_data": "GSTN", "mca_data": "MCA", "ibbi_data": "IBBI", "udyam_data": "Udyam"}
+        placeholders = dict(zip(labels, st.columns(4)))
+        for section, column in placeholders.items():
+            placeholders[section] = column.empty()
+            placeholders[section].info(f"{labels[section]}: waiting…")
+        try:
+            for section, payload in stream:
+                with placeholders[section].container():
+                    if "error" in payload:
+                        st.error(f"{labels[section]}: {payload['error']}")
+                    else:
+                        st.success(labels[section])
+                        st.json(payload, expanded=False)
+        finally:
+            stream.cancel()
+            st.session_state.live_check = None
+        if stream.complete:
+            save_check_results([{"vendor_id": vendor["vendor_id"], **vendor_fields_from_checks(stream.as_result(), datetime.utcnow())}])
+            audit_event(st.session_state.user_id, "vendor.recheck", entity_id=entity_id, vendor_id=vendor["vendor_id"])
+            st.success("Checks saved. The risk score is updated on the verification worker's next pass.")
+            st.button("Show updated analysis")  # any click reruns with the fresh data
+    else:
+        payloads = get_vendor_payloads(entity_id, vendor["vendor_id"])
+        gstn_col, mca_col = st.columns(2)
+        with gstn_col:
+            st.caption("GSTN / Udyam")
+            st.json(payloads["gstn_api_data"], expanded=False)
+        with mca_col:
+            st.caption("MCA / IBBI")
+            st.json(payloads["mca_api_data"], expanded=False)
+
+# --- PERIOD ANALYTICS (from the Parquet snapshot, see exporter.py) ---
+if snapshot_exists("transactions"):
+    with st.expander("📅 Client-wide Monthly Purchases (analytics export)"):
+        ledger = read_snapshot("transactions", entity_id, ["transaction_amount", "tax_amount", "payment_mode", "month"])
+        if ledger.empty:
+            st.info("No transactions in the latest export.")
+        else:
+            monthly = ledger.groupby("month")[["transaction_amount", "tax_amount"]].sum().sort_index()
+            st.bar_chart(monthly)
+            st.dataframe(ledger.groupby("payment_mode")["transaction_amount"].agg(["count", "sum"]), use_container_width=True)
+        st.caption("Figures come from the last analytics export and may lag live data.")
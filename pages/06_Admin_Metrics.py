@@ -0,0 +1,148 @@
+import streamlit as st
+from metrics import track_page
+
+track_page("admin_metrics")
+
+import pandas as pd
+from api_cache import cache_stats
+from auth import logout_user
+from database import UserRole
+from metrics import METRICS_FILE, METRICS_PORT, render_prometheus, snapshot
+from query_tracer import QUERY_TRACE_ENABLED, recent_traces
+from utils.styling import inject_custom_css, metric_card
+
+st.set_page_config(page_title="Service Metrics", page_icon="📈", layout="wide")
+inject_custom_css()
+
+# Protect Page
+if not st.session_state.get('authenticated', False) or st.session_state.role != UserRole.ADMIN.value:
+    st.warning("Please login as an administrator to view this page.")
+    st.stop()
+
+# Admins only see this page in the sidebar
+st.markdown("""
+<style>
+    [data-testid="stSidebarNav"] ul li:nth-child(-n+5) {display: none;}
+</style>
+""", unsafe_allow_html=True)
+
+with st.sidebar:
+    st.header("Admin")
+    if st.button("Logout"):
+        logout_user()
+
+st.title("📈 Service Metrics")
+st.caption("Counters for this server process since it started. Latency quantiles are estimated from histogram buckets.")
+
+exporters = []
+if METRICS_PORT:
+    exporters.append(f"http://127.0.0.1:{METRICS_PORT}/metrics")
+if METRICS_FILE:
+    exporters.append(METRICS_FILE)
+st.caption("Prometheus export: " + (", ".join(exporters) if exporters else
+           "off (set BLOODHOUND_METRICS_PORT or BLOODHOUND_METRICS_FILE)"))
+if st.button("🔄 Refresh"):
+    st.rerun()
+
+data = snapshot()
+histograms = pd.DataFrame(data["histograms"])
+
+def latency_table(metric: str, labels: list, sort_by: str = "p95") -> pd.DataFrame:
+    """One metric's series as a table, latencies in milliseconds"""
+    if histograms.empty:
+        return pd.DataFrame()
+    frame = histograms[histograms["metric"] == metric]
+    if frame.empty:
+        return frame
+    frame = frame[labels + ["count", "mean", "p50", "p95", "p99", "total"]].copy()
+    for column in ("mean", "p50", "p95", "p99"):
+        frame[column] = (frame[column] * 1000).round(1)
+    frame["total"] = frame["total"].round(2)
+    frame = frame.rename(columns={
+        "mean": "mean ms", "p50": "p50 ms", "p95": "p95 ms", "p99": "p99 ms", "total": "total s"
+    })
+    return frame.sort_values(f"{sort_by} ms", ascending=False).reset_index(drop=True)
+
+def show_table(frame: pd.DataFrame, empty_message: str):
+    if frame.empty:
+        st.info(empty_message)
+    else:
+        st.dataframe(frame, use_container_width=True, hide_index=True)
+
+# --- HEADLINE ---
+pages = latency_table("bloodhound_page_run_seconds", ["page", "outcome"])
+queries = latency_table("bloodhound_db_query_seconds", ["operation", "table"], sort_by="p99")
+upstream = latency_table("bloodhound_upstream_seconds", ["source", "outcome"])
+
+c1, c2, c3, c4 = st.columns(4)
+with c1:
+    metric_card("Page Runs", f"{int(pages['count'].sum()) if not pages.empty else 0:,}", icon="🖥️")
+with c2:
+    metric_card("DB Statements", f"{int(queries['count'].sum()) if not queries.empty else 0:,}", icon="🗄️")
+with c3:
+    metric_card("Upstream Calls", f"{int(upstream['count'].sum()) if not upstream.empty else 0:,}", icon="🌐")
+with c4:
+    worst = f"{pages['p95 ms'].max():,.0f} ms" if not pages.empty else "-"
+    metric_card("Worst Page p95", worst, icon="⏱️")
+
+st.divider()
+
+# --- DETAIL ---
+tab_pages, tab_db, tab_traces, tab_upstream, tab_auth, tab_cache = st.tabs(
+    ["Page reruns", "Database", "Query traces", "Upstream APIs", "Password hashing", "Caches"]
+)
+
+with tab_pages:
+    show_table(pages, "No page runs recorded yet.")
+
+with tab_db:
+    show_table(queries, "No database statements recorded yet.")
+    errors = [c for c in data["counters"] if c["metric"] == "bloodhound_db_query_errors_total"]
+    if errors:
+        st.markdown("**Failed statements**")
+        show_table(pd.DataFrame(errors).drop(columns="metric"), "")
+
+with tab_traces:
+    if not QUERY_TRACE_ENABLED:
+        st.info("Per-rerun query tracing is off. Set BLOODHOUND_QUERY_TRACE=1 to record statement "
+                "fingerprints per page run and service call and flag N+1 suspects.")
+    traces = recent_traces(limit=50)
+    if traces:
+        show_table(pd.DataFrame([
+            {
+                "trace": trace["name"],
+                "queries": trace["queries"],
+                "distinct": trace["distinct"],
+                "sql ms": round(trace["query_seconds"] * 1000, 1),
+                "elapsed ms": round((trace["elapsed"] or 0.0) * 1000, 1),
+                "N+1 suspects": len(trace["suspects"]),
+            }
+            for trace in traces
+        ]), "")
+        for trace in traces:
+            for suspect in trace["suspects"]:
+                st.warning(f"**{trace['name']}**: {suspect['count']}x `{suspect['fingerprint'][:200]}`"
+                           + (f" from `{suspect['call_site']}`" if suspect["call_site"] else ""))
+    elif QUERY_TRACE_ENABLED:
+        st.info("No traces recorded yet.")
+
+with tab_upstream:
+    show_table(upstream, "No upstream calls recorded yet (cache hits are not upstream calls).")
+
+with tab_auth:
+    show_table(latency_table("bloodhound_bcrypt_seconds", ["operation"]), "No logins or sign-ups yet.")
+
+with tab_cache:
+    stats = cache_stats()
+    if stats:
+        show_table(pd.DataFrame.from_dict(stats, orient="index").rename_axis("source").reset_index(),
+                   "No response cache lookups yet.")
+    else:
+        st.info("No response cache lookups yet.")
+
+st.divider()
+exposition = render_prometheus()
+st.download_button("⬇️ Download Prometheus snapshot", exposition, file_name="bloodhound_metrics.prom",
+                   mime="text/plain")
+with st.expander("Raw exposition"):
+    st.code(exposition, language="text")
@@ -0,0 +1,135 @@
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, insert, select
+
+from database import session_scope, CAProfile, EntityProfile, Vendor, BillingLog, CAPortfolioSummary, RiskLevel
+from query_tracer import traced
+
+# --- CA PORTFOLIO ROLLUP ---
+# ca_portfolio_summaries holds one pre-aggregated row per client so the CA
+# console is a single indexed read. Rows are refreshed per client whenever
+# that client's vendors are rescored or billable activity is logged. Any
+# number of clients is refreshed with a fixed number of grouped statements
+# per chunk, not a set of queries per client.
+
+SUMMARY_CHUNK_SIZE = 500
+
+def _level_count(level: RiskLevel):
+    return func.sum(case((Vendor.risk_level == level, 1), else_=0))
+
+def _refresh_summaries(db, entity_ids) -> int:
+    """Recompute the summary rows of `entity_ids` (only those clients' rows are scanned)"""
+    entity_ids = sorted(set(entity_ids))
+    at_risk = Vendor.risk_level.in_([RiskLevel.HIGH, RiskLevel.CRITICAL])
+    refreshed = 0
+    for start in range(0, len(entity_ids), SUMMARY_CHUNK_SIZE):
+        chunk = entity_ids[start:start + SUMMARY_CHUNK_SIZE]
+        db.execute(delete(CAPortfolioSummary).where(CAPortfolioSummary.entity_id.in_(chunk)))
+        entities = db.execute(
+            select(EntityProfile.entity_id, EntityProfile.ca_id, EntityProfile.entity_name)
+            .where(EntityProfile.entity_id.in_(chunk), EntityProfile.ca_id.is_not(None))
+        ).all()
+        if not entities:
+            continue
+        linked = [entity.entity_id for entity in entities]
+
+        vendors = {
+            row.entity_id: row
+            for row in db.execute(
+                select(
+                    Vendor.entity_id,
+                    func.count(Vendor.vendor_id).label("total"),
+                    _level_count(RiskLevel.LOW).label("low"),
+                    _level_count(RiskLevel.MEDIUM).label("medium"),
+                    _level_count(RiskLevel.HIGH).label("high"),
+                    _level_count(RiskLevel.CRITICAL).label("critical"),
+                    func.sum(case((at_risk, Vendor.itc_amount), else_=0.0)).label("itc_at_risk"),
+                    func.max(Vendor.last_analyzed_at).label("last_audit_at"),
+                ).where(Vendor.entity_id.in_(linked)).group_by(Vendor.entity_id)
+            )
+        }
+        hours = {
+            (row.entity_id, row.ca_id): row.hours
+            for row in db.execute(
+                select(BillingLog.entity_id, BillingLog.ca_id, func.sum(BillingLog.hours_logged).label("hours"))
+                .where(BillingLog.entity_id.in_(linked))
+                .group_by(BillingLog.entity_id, BillingLog.ca_id)
+            )
+        }
+
+        now = datetime.utcnow()
+        rows = []
+        for entity in entities:
+            stats = vendors.get(entity.entity_id)
+            rows.append({
+                "entity_id": entity.entity_id,
+                "ca_id": entity.ca_id,
+                "entity_name": entity.entity_name,
+                "total_vendors": stats.total if stats else 0,
+                "low_risk_vendors": (stats.low or 0) if stats else 0,
+                "medium_risk_vendors": (stats.medium or 0) if stats else 0,
+                "high_risk_vendors": (stats.high or 0) if stats else 0,
+                "critical_vendors": (stats.critical or 0) if stats else 0,
+                "itc_at_risk": float(stats.itc_at_risk or 0.0) if stats else 0.0,
+                "last_audit_at": stats.last_audit_at if stats else None,
+                "billable_hours": float(hours.get((entity.entity_id, entity.ca_id)) or 0.0),
+                "updated_at": now,
+            })
+        db.execute(insert(CAPortfolioSummary), rows)
+        refreshed += len(rows)
+    return refreshed
+
+def refresh_client_summary(db, entity_id: int):
+    """Recompute one client's summary row"""
+    _refresh_summaries(db, [entity_id])
+
+@traced()
+def refresh_client_summaries(entity_ids):
+    """Refresh the summary rows for a set of changed clients"""
+    with session_scope() as db:
+        _refresh_summaries(db, entity_ids)
+
+@traced()
+def refresh_portfolio(ca_id: int) -> int:
+    """Full rebuild of one CA's portfolio (e.g. after linking clients or for recovery)"""
+    with session_scope() as db:
+        entity_ids = db.execute(select(EntityProfile.entity_id).where(EntityProfile.ca_id == ca_id)).scalars().all()
+        db.execute(delete(CAPortfolioSummary).where(CAPortfolioSummary.ca_id == ca_id))
+        _refresh_summaries(db, entity_ids)
+        return len(entity_ids)
+
+def log_billable_activity(ca_id: int, entity_id: int, activity_type: str, hours: float = 0.0, description: str = None):
+    """Record CA work on a client and roll the hours into the portfolio row"""
+    with session_scope() as db:
+        db.add(BillingLog(ca_id=ca_id, entity_id=entity_id, activity_type=activity_type,
+                          hours_logged=hours, description=description))
+        db.flush()
+        refresh_client_summary(db, entity_id)
+
+def get_ca_id_for_user(user_id: int):
+    with session_scope() as db:
+        return db.execute(select(CAProfile.ca_id).where(CAProfile.user_id == user_id)).scalar()
+
+def get_portfolio(ca_id: int) -> list:
+    """All client summaries for a CA, riskiest first, in one indexed query"""
+    with session_scope() as db:
+        rows = db.execute(
+            select(CAPortfolioSummary)
+            .where(CAPortfolioSummary.ca_id == ca_id)
+            .order_by(CAPortfolioSummary.itc_at_risk.desc())
+        ).scalars()
+        return [
+            {
+                "entity_id": r.entity_id,
+                "entity_name": r.entity_name,
+                "total_vendors": r.total_vendors,
+                "low_risk_vendors": r.low_risk_vendors,
+                "medium_risk_vendors": r.medium_risk_vendors,
+                "high_risk_vendors": r.high_risk_vendors,
+                "critical_vendors": r.critical_vendors,
+                "itc_at_risk": r.itc_at_risk,
+                "last_audit_at": r.last_audit_at,
+                "billable_hours": r.billable_hours,
+            }
+            for r in rows
+        ]
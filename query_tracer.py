@@ -0,0 +1,281 @@
+"""SQL query tracing with N+1 detection.
+
+    with trace_queries("portfolio refresh") as trace:
+        refresh_portfolio(ca_id)
+    print(trace.report())
+
+    with assert_query_budget(max_queries=5, max_repeats=2):
+        get_portfolio(ca_id)                    # QueryBudgetExceeded if exceeded
+
+Statements executed while a trace is active are reduced to a fingerprint
+(literals, bound parameters and IN-lists collapsed) and counted per
+fingerprint with their total time. A read fingerprint that repeats
+N_PLUS_ONE_THRESHOLD or more times in one trace is an N+1 suspect - usually
+a lazy relationship (Vendor.transactions, EntityProfile.vendors, ...) loaded
+in a loop - and its first application call site is recorded.
+
+Service functions decorated with @traced, and every Streamlit rerun of a
+page that calls metrics.track_page(), are traced when BLOODHOUND_QUERY_TRACE=1.
+Explicit trace_queries / assert_query_budget blocks always trace. Outside a
+trace the engine hooks cost one context-variable lookup per statement.
+"""
+import functools
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import sqlalchemy
+from sqlalchemy import event
+
+from metrics import counter, register_page_hook
+
+logger = logging.getLogger("bloodhound.queries")
+
+QUERY_TRACE_ENABLED = os.getenv("BLOODHOUND_QUERY_TRACE", "0").lower() in ("1", "true", "yes")
+N_PLUS_ONE_THRESHOLD = int(os.getenv("BLOODHOUND_N_PLUS_ONE_THRESHOLD", "5"))
+RECENT_TRACES = 100
+
+N_PLUS_ONE_SUSPECTS = counter(
+    "bloodhound_n_plus_one_suspects_total", "Traces that repeated a read fingerprint past the N+1 threshold", ("trace",)
+)
+
+# --- FINGERPRINTS ---
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)"
+_IN_LIST = re.compile(rf"\bIN\s*\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)", re.IGNORECASE)
+_VALUES_ROWS = re.compile(r"(\bVALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+_fingerprints = {}
+_FINGERPRINT_CACHE_SIZE = 10000
+
+def fingerprint(statement: str) -> str:
+    """Statement shape with literals and parameter lists collapsed.
+
+    SELECT * FROM vendors WHERE vendor_id IN (?, ?, ?) AND name = 'x'
+    -> SELECT * FROM vendors WHERE vendor_id IN (...) AND name = ?
+    """
+    shape = _fingerprints.get(statement)
+    if shape is None:
+        shape = _STRING.sub("?", statement)
+        shape = _NUMBER.sub("?", shape)
+        shape = _IN_LIST.sub("IN (...)", shape)
+        shape = _VALUES_ROWS.sub(r"\1, ...", shape)
+        shape = _SPACE.sub(" ", shape).strip()
+        if len(_fingerprints) < _FINGERPRINT_CACHE_SIZE:
+            _fingerprints[statement] = shape
+    return shape
+
+def _is_read(shape: str) -> bool:
+    return shape[:6].upper() == "SELECT" or shape[:4].upper() == "WITH"
+
+# Frames skipped when locating the application code behind a query
+_SKIP_PATHS = (os.path.dirname(sqlalchemy.__file__) + os.sep, os.path.abspath(__file__))
+
+def _call_site() -> str:
+    """'file:line in function' of the innermost application frame"""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(_SKIP_PATHS) or "site-packages" in filename or frame.filename.startswith("<"):
+            continue
+        return f"{os.path.relpath(filename)}:{frame.lineno} in {frame.name}"
+    return "?"
+
+# --- TRACES ---
+
+class QueryTrace:
+    """Statement counts and durations per fingerprint for one rerun / service call"""
+
+    def __init__(self, name: str, n_plus_one_threshold: int = None):
+        self.name = name
+        self.threshold = n_plus_one_threshold or N_PLUS_ONE_THRESHOLD
+        self.fingerprints = {}  # fingerprint -> [count, seconds, call site of the threshold-th run]
+        self.query_count = 0
+        self.query_seconds = 0.0
+        self.started_at = time.time()
+        self.elapsed = None
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float):
+        shape = fingerprint(statement)
+        with self._lock:
+            self.query_count += 1
+            self.query_seconds += seconds
+            stats = self.fingerprints.get(shape)
+            if stats is None:
+                self.fingerprints[shape] = [1, seconds, None]
+                return
+            stats[0] += 1
+            stats[1] += seconds
+            if stats[0] == self.threshold and _is_read(shape):
+                stats[2] = _call_site()
+
+    def finish(self):
+        if self.elapsed is None:
+            self.elapsed = time.perf_counter() - self._started
+
+    @property
+    def max_repeats(self) -> int:
+        return max((stats[0] for stats in self.fingerprints.values()), default=0)
+
+    def top(self, limit: int = 10) -> list:
+        """Most frequent fingerprints: [{fingerprint, count, seconds, call_site}]"""
+        with self._lock:
+            ranked = sorted(self.fingerprints.items(), key=lambda item: (-item[1][0], -item[1][1]))
+        return [
+            {"fingerprint": shape, "count": count, "seconds": seconds, "call_site": site}
+            for shape, (count, seconds, site) in ranked[:limit]
+        ]
+
+    @property
+    def suspects(self) -> list:
+        """Read fingerprints repeated at least `threshold` times (likely N+1)"""
+        return [
+            entry for entry in self.top(limit=len(self.fingerprints))
+            if entry["count"] >= self.threshold and _is_read(entry["fingerprint"])
+        ]
+
+    def summary(self) -> dict:
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "queries": self.query_count,
+            "distinct": len(self.fingerprints),
+            "query_seconds": self.query_seconds,
+            "elapsed": self.elapsed,
+            "suspects": self.suspects,
+        }
+
+    def report(self, limit: int = 10) -> str:
+        lines = [
+            f"{self.name}: {self.query_count} queries ({len(self.fingerprints)} distinct), "
+            f"{self.query_seconds * 1000:.1f} ms in SQL"
+        ]
+        suspects = {entry["fingerprint"] for entry in self.suspects}
+        for entry in self.top(limit):
+            flag = "  <- N+1 suspect" if entry["fingerprint"] in suspects else ""
+            lines.append(f"  {entry['count']:>5}x {entry['seconds'] * 1000:>8.1f} ms  {entry['fingerprint'][:160]}{flag}")
+            if flag and entry["call_site"]:
+                lines.append(f"{'':19}from {entry['call_site']}")
+        return "\n".join(lines)
+
+_active = ContextVar("bloodhound_query_traces", default=())
+_recent = deque(maxlen=RECENT_TRACES)
+
+def _push(trace: QueryTrace):
+    _active.set(_active.get() + (trace,))
+
+def _pop(trace: QueryTrace):
+    # Not ContextVar.reset: a page trace ends from Streamlit's stop event, not the block that started it
+    _active.set(tuple(active for active in _active.get() if active is not trace))
+
+def _complete(trace: QueryTrace, keep: bool = True):
+    trace.finish()
+    if not keep:
+        return
+    _recent.append(trace.summary())
+    if trace.suspects:
+        N_PLUS_ONE_SUSPECTS.inc(trace.name)
+        logger.warning("Possible N+1 queries\n%s", trace.report())
+
+def recent_traces(limit: int = 20) -> list:
+    """Summaries of the latest finished traces, newest first"""
+    return list(_recent)[::-1][:limit]
+
+@contextmanager
+def trace_queries(name: str, n_plus_one_threshold: int = None, keep: bool = True):
+    """Trace every statement run in this block (and nested blocks) on this thread/context"""
+    trace = QueryTrace(name, n_plus_one_threshold)
+    _push(trace)
+    try:
+        yield trace
+    finally:
+        _pop(trace)
+        _complete(trace, keep)
+
+def traced(name: str = None):
+    """Decorator: trace each call of a service function when BLOODHOUND_QUERY_TRACE is on"""
+    def decorate(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not QUERY_TRACE_ENABLED:
+                return fn(*args, **kwargs)
+            with trace_queries(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# --- QUERY BUDGETS ---
+
+class QueryBudgetExceeded(AssertionError):
+    """A traced block ran more (or more repeated) queries than its budget"""
+
+@contextmanager
+def assert_query_budget(max_queries: int = None, max_repeats: int = None, max_seconds: float = None,
+                        name: str = "query budget"):
+    """Fail the block if it exceeds a query budget.
+
+    max_queries caps the statement count, max_repeats the executions of any
+    single fingerprint (an N+1 guard), max_seconds the total SQL time.
+    """
+    threshold = max_repeats + 1 if max_repeats is not None else None
+    with trace_queries(name, n_plus_one_threshold=threshold, keep=False) as trace:
+        yield trace
+    problems = []
+    if max_queries is not None and trace.query_count > max_queries:
+        problems.append(f"{trace.query_count} queries > budget of {max_queries}")
+    if max_repeats is not None and trace.max_repeats > max_repeats:
+        problems.append(f"a statement ran {trace.max_repeats} times > {max_repeats} allowed")
+    if max_seconds is not None and trace.query_seconds > max_seconds:
+        problems.append(f"{trace.query_seconds:.3f}s in SQL > {max_seconds}s")
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems) + "\n" + trace.report())
+
+# --- ENGINE HOOKS ---
+
+def install_tracer(engine):
+    """Record statements on `engine` into the active traces (database.py installs it on the shared engine)"""
+    @event.listens_for(engine, "before_cursor_execute")
+    def _trace_start(conn, cursor, statement, parameters, context, executemany):
+        if _active.get():
+            conn.info.setdefault("trace_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _trace_record(conn, cursor, statement, parameters, context, executemany):
+        traces = _active.get()
+        if traces and conn.info.get("trace_started"):
+            seconds = time.perf_counter() - conn.info["trace_started"].pop()
+            for trace in traces:
+                trace.record(statement, seconds)
+
+    @event.listens_for(engine, "handle_error")
+    def _trace_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("trace_started"):
+            conn.info["trace_started"].pop()
+
+# --- PAGE RERUNS ---
+
+def _page_trace(page: str):
+    if not QUERY_TRACE_ENABLED:
+        return None
+    trace = QueryTrace(f"page:{page}")
+    _push(trace)
+
+    def finish(outcome: str, seconds: float):
+        _pop(trace)
+        _complete(trace)
+    return finish
+
+register_page_hook(_page_trace)
@@ -0,0 +1,428 @@
+"""GSTR-2B vs purchase register ITC reconciliation.
+
+    python reconciliation.py --entity 12 --gstr2b 2B_2024-05.json --month 2024-05
+    python reconciliation.py --entity 12 --gstr2b 2b.csv --month 2024-05 --out recon/
+
+Both sides are loaded in chunks into compact columnar frames: the client's
+Transaction rows for the period (streamed from the database) and the
+supplier-reported invoices from a GSTR-2B file (portal JSON, CSV or XLSX).
+Matching never compares invoices pairwise:
+
+1. exact: hash join on the normalised (GSTIN, invoice number, date, amount)
+   key, with repeated keys paired by occurrence;
+2. tolerance: leftovers bucketed by (GSTIN, invoice number ignoring zero
+   padding); pairs within
+   AMOUNT_TOLERANCE and DATE_TOLERANCE_DAYS match, the rest are mismatches;
+3. probable: leftovers bucketed by (GSTIN, rupee amount) within tolerance,
+   catching typos in the invoice number.
+
+Books rows left over are missing from 2B (their ITC is at risk); 2B rows
+left over are missing from the books (ITC available but not claimed).
+"""
+import argparse
+import io
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from sqlalchemy import select
+
+from database import init_database, session_scope, Vendor, Transaction
+from query_tracer import traced
+from utils.identifiers import normalize_array
+
+AMOUNT_TOLERANCE = 1.0      # rupees; rounding differences between books and portal
+DATE_TOLERANCE_DAYS = 3
+LOAD_CHUNK_SIZE = 100000
+
+# Accepted GSTR-2B CSV/XLSX header spellings -> field
+GSTR2B_COLUMN_ALIASES = {
+    "gstin": "gstin",
+    "ctin": "gstin",
+    "gstin_of_supplier": "gstin",
+    "supplier_gstin": "gstin",
+    "trade/legal_name": "supplier_name",
+    "trdnm": "supplier_name",
+    "supplier_name": "supplier_name",
+    "trade_name": "supplier_name",
+    "invoice_number": "invoice_number",
+    "invoice_no": "invoice_number",
+    "inum": "invoice_number",
+    "invoice_date": "invoice_date",
+    "dt": "invoice_date",
+    "date": "invoice_date",
+    "invoice_value": "amount",
+    "invoice_value(₹)": "amount",
+    "val": "amount",
+    "amount": "amount",
+    "taxable_value": "taxable_value",
+    "taxable_value_(₹)": "taxable_value",
+    "txval": "taxable_value",
+    "integrated_tax": "igst",
+    "integrated_tax(₹)": "igst",
+    "igst": "igst",
+    "central_tax": "cgst",
+    "central_tax(₹)": "cgst",
+    "cgst": "cgst",
+    "state/ut_tax": "sgst",
+    "state/ut_tax(₹)": "sgst",
+    "sgst": "sgst",
+    "cess": "cess",
+    "cess(₹)": "cess",
+    "tax": "tax",
+    "tax_amount": "tax",
+}
+TAX_COMPONENTS = ["igst", "cgst", "sgst", "cess"]
+
+# Columns of the frames the matcher works on
+BOOKS_COLUMNS = ["transaction_id", "vendor_id", "supplier_name", "gstin", "invoice_number", "invoice_date", "amount", "tax"]
+GSTR2B_COLUMNS = ["supplier_name", "gstin", "invoice_number", "invoice_date", "amount", "tax"]
+
+# --- LOADING ---
+
+def load_purchase_register(entity_id: int, start: datetime, end: datetime, chunk_size: int = LOAD_CHUNK_SIZE) -> pd.DataFrame:
+    """An entity's transactions with start <= transaction_date < end, streamed in chunks"""
+    query = (
+        select(Transaction.transaction_id, Transaction.vendor_id, Vendor.name, Vendor.gstin,
+               Transaction.invoice_number, Transaction.transaction_date,
+               Transaction.transaction_amount, Transaction.tax_amount)
+        .join(Vendor, Vendor.vendor_id == Transaction.vendor_id)
+        .where(Transaction.entity_id == entity_id, Transaction.transaction_date >= start, Transaction.transaction_date < end)
+    )
+    chunks = []
+    with session_scope() as db:
+        for partition in db.execute(query.execution_options(yield_per=chunk_size)).partitions():
+            chunks.append(pd.DataFrame(partition, columns=BOOKS_COLUMNS))
+    if not chunks:
+        return pd.DataFrame(columns=BOOKS_COLUMNS)
+    books = pd.concat(chunks, ignore_index=True)
+    books["tax"] = books["tax"].fillna(0.0)
+    return books
+
+def _header(name) -> str:
+    key = str(name or "").strip().lower().replace(".", "").replace(" ", "_")
+    return GSTR2B_COLUMN_ALIASES.get(key, key)
+
+def _to_amount(column: pd.Series) -> pd.Series:
+    if not pd.api.types.is_numeric_dtype(column):
+        column = column.astype(str).str.replace(r"[₹,\s]", "", regex=True)
+    return pd.to_numeric(column, errors="coerce").fillna(0.0)
+
+def _to_date(column: pd.Series) -> pd.Series:
+    # Portal files use dd-mm-yyyy; then ISO, then per-value parsing for anything else
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column
+    parsed = pd.to_datetime(column, format="%d-%m-%Y", errors="coerce")
+    for fmt, dayfirst in (("ISO8601", False), ("mixed", True)):
+        unparsed = parsed.isna() & column.notna()
+        if not unparsed.any():
+            break
+        parsed[unparsed] = pd.to_datetime(column[unparsed], format=fmt, dayfirst=dayfirst, errors="coerce")
+    return parsed
+
+def _gstr2b_frame(raw: pd.DataFrame) -> pd.DataFrame:
+    """Typed GSTR2B_COLUMNS from a chunk with normalised headers"""
+    raw = raw.rename(columns=_header)
+    missing = {"gstin", "invoice_number", "invoice_date", "amount"} - set(raw.columns)
+    if missing:
+        raise ValueError(f"GSTR-2B file is missing columns: {', '.join(sorted(missing))}")
+    if "tax" in raw.columns:
+        tax = _to_amount(raw["tax"])
+    else:
+        tax = sum((_to_amount(raw[c]) for c in TAX_COMPONENTS if c in raw.columns), pd.Series(0.0, index=raw.index))
+    return pd.DataFrame({
+        "supplier_name": raw["supplier_name"] if "supplier_name" in raw.columns else None,
+        "gstin": raw["gstin"],
+        "invoice_number": raw["invoice_number"].astype(str),
+        "invoice_date": _to_date(raw["invoice_date"]),
+        "amount": _to_amount(raw["amount"]),
+        "tax": tax,
+    })
+
+def _iter_gstr2b_json(fileobj):
+    """Invoice rows from the portal's GSTR-2B JSON (data.docdata.b2b[].inv[])"""
+    document = json.load(fileobj)
+    docdata = document.get("data", document).get("docdata", document.get("data", document))
+    for supplier in docdata.get("b2b", []):
+        for invoice in supplier.get("inv", []):
+            yield {
+                "gstin": supplier.get("ctin"),
+                "supplier_name": supplier.get("trdnm"),
+                "invoice_number": invoice.get("inum"),
+                "invoice_date": invoice.get("dt"),
+                "amount": invoice.get("val"),
+                **{component: invoice.get(component, 0) for component in TAX_COMPONENTS},
+            }
+
+def _iter_xlsx_chunks(fileobj, chunk_size: int):
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = list(next(rows, ()))
+        chunk = []
+        for values in rows:
+            if any(v is not None for v in values):
+                chunk.append(values)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=headers)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=headers)
+    finally:
+        workbook.close()
+
+def _iter_dict_chunks(rows, chunk_size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield pd.DataFrame(chunk)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk)
+
+def load_gstr2b(fileobj, filename: str, chunk_size: int = LOAD_CHUNK_SIZE) -> pd.DataFrame:
+    """Supplier-reported invoices from a GSTR-2B JSON, CSV or XLSX file"""
+    name = filename.lower()
+    if name.endswith(".json"):
+        chunks = _iter_dict_chunks(_iter_gstr2b_json(io.TextIOWrapper(fileobj, encoding="utf-8-sig")), chunk_size)
+    elif name.endswith((".xlsx", ".xlsm")):
+        chunks = _iter_xlsx_chunks(fileobj, chunk_size)
+    else:
+        chunks = pd.read_csv(fileobj, dtype=str, chunksize=chunk_size, encoding="utf-8-sig", keep_default_na=False)
+    frames = [_gstr2b_frame(chunk) for chunk in chunks]
+    if not frames:
+        return pd.DataFrame(columns=GSTR2B_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+# --- MATCHING ---
+
+def _prepare(frame: pd.DataFrame) -> pd.DataFrame:
+    """Add the normalised key columns (gstin, inv, day, paise, rupee) to a copy"""
+    prepared = frame.reset_index(drop=True).copy()
+    # Few distinct suppliers: normalise each GSTIN once
+    codes, uniques = pd.factorize(prepared["gstin"], use_na_sentinel=False)
+    prepared["gstin"] = normalize_array(uniques.tolist())[codes]
+    prepared["inv"] = (
+        prepared["invoice_number"].fillna("").astype(str).str.upper()
+        .str.replace(r"[^0-9A-Z]", "", regex=True)
+    )
+    prepared["invoice_date"] = pd.to_datetime(prepared["invoice_date"])
+    prepared["day"] = prepared["invoice_date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    prepared["amount"] = prepared["amount"].astype(float)
+    prepared["tax"] = prepared["tax"].astype(float)
+    prepared["paise"] = np.round(prepared["amount"].to_numpy() * 100).astype(np.int64)
+    prepared["rupee"] = np.round(prepared["amount"].to_numpy()).astype(np.int64)
+    return prepared
+
+def _loose_invoice(invoice_numbers: pd.Series) -> pd.Series:
+    """Invoice key ignoring case, separators and zero padding: "INV/2024/001" == "inv-2024-1" """
+    return (
+        invoice_numbers.fillna("").astype(str).str.upper()
+        .str.replace(r"(^|[^0-9])0+([0-9])", r"\1\2", regex=True)
+        .str.replace(r"[^0-9A-Z]", "", regex=True)
+    )
+
+def _encode(books: pd.DataFrame, gstr2b: pd.DataFrame, columns=("gstin", "inv")):
+    """Integer ids for string keys shared by both sides, so joins never compare strings"""
+    for column in columns:
+        codes, _ = pd.factorize(pd.concat([books[column], gstr2b[column]], ignore_index=True))
+        books[f"{column}_id"] = codes[:len(books)]
+        gstr2b[f"{column}_id"] = codes[len(books):]
+
+def _exact_pairs(books: pd.DataFrame, gstr2b: pd.DataFrame) -> pd.DataFrame:
+    """Hash join on the full key; the nth copy of a key pairs with the nth copy on the other side"""
+    key = ["gstin_id", "inv_id", "day", "paise"]
+    sides = []
+    for frame in (books, gstr2b):
+        side = frame[key].copy()
+        side["occurrence"] = side.groupby(key, sort=False).cumcount()
+        side["row"] = np.arange(len(frame))
+        sides.append(side)
+    return sides[0].merge(sides[1], on=key + ["occurrence"], suffixes=("_b", "_g"))[["row_b", "row_g"]]
+
+def _bucket_candidates(books: pd.DataFrame, gstr2b: pd.DataFrame, on: list, rupee_shifts=(0,)) -> pd.DataFrame:
+    """All (row_b, row_g) pairs sharing a bucket, with their amount/date gaps"""
+    left = books[on + ["amount", "day"]].assign(row_b=books.index)
+    right = gstr2b[on + ["amount", "day"]].assign(row_g=gstr2b.index)
+    candidates = []
+    for shift in rupee_shifts:
+        shifted = right.assign(rupee=right["rupee"] + shift) if shift else right
+        candidates.append(left.merge(shifted, on=on, suffixes=("_b", "_g")))
+    candidates = pd.concat(candidates, ignore_index=True)
+    candidates["amount_gap"] = (candidates["amount_b"] - candidates["amount_g"]).abs()
+    candidates["day_gap"] = (candidates["day_b"] - candidates["day_g"]).abs()
+    return candidates[["row_b", "row_g", "amount_gap", "day_gap"]]
+
+def _one_to_one(candidates: pd.DataFrame) -> pd.DataFrame:
+    """Greedy best-first pairing: each row on either side is used at most once"""
+    candidates = candidates.sort_values(["amount_gap", "day_gap", "row_b", "row_g"], kind="stable")
+    accepted = []
+    while len(candidates):
+        best = candidates.drop_duplicates("row_b").drop_duplicates("row_g")
+        accepted.append(best)
+        candidates = candidates[~candidates["row_b"].isin(best["row_b"]) & ~candidates["row_g"].isin(best["row_g"])]
+    if not accepted:
+        return candidates
+    return pd.concat(accepted, ignore_index=True)
+
+def _within_tolerance(candidates: pd.DataFrame, amount_tolerance: float, date_tolerance_days: int) -> pd.Series:
+    return (candidates["amount_gap"] <= amount_tolerance) & (candidates["day_gap"] <= date_tolerance_days)
+
+def _pair_frame(books: pd.DataFrame, gstr2b: pd.DataFrame, pairs: pd.DataFrame, match_type: str) -> pd.DataFrame:
+    b = books.loc[pairs["row_b"]].reset_index(drop=True)
+    g = gstr2b.loc[pairs["row_g"]].reset_index(drop=True)
+    return pd.DataFrame({
+        "gstin": b["gstin"],
+        "supplier_name": b["supplier_name"].where(b["supplier_name"].notna(), g["supplier_name"]),
+        "transaction_id": b["transaction_id"],
+        "vendor_id": b["vendor_id"],
+        "invoice_number_books": b["invoice_number"],
+        "invoice_number_2b": g["invoice_number"],
+        "date_books": b["invoice_date"],
+        "date_2b": g["invoice_date"],
+        "amount_books": b["amount"],
+        "amount_2b": g["amount"],
+        "tax_books": b["tax"],
+        "tax_2b": g["tax"],
+        "match_type": match_type,
+    })
+
+def reconcile_frames(books: pd.DataFrame, gstr2b: pd.DataFrame, amount_tolerance: float = AMOUNT_TOLERANCE,
+                     date_tolerance_days: int = DATE_TOLERANCE_DAYS) -> dict:
+    """Match a purchase register against GSTR-2B invoices.
+
+    `books` has BOOKS_COLUMNS, `gstr2b` has GSTR2B_COLUMNS. Returns frames
+    "matched", "mismatched", "missing_in_2b", "missing_in_books", the
+    per-vendor "vendors" ITC summary, and "summary" counts.
+    """
+    started = time.perf_counter()
+    books, gstr2b = _prepare(books), _prepare(gstr2b)
+    _encode(books, gstr2b)
+    if "transaction_id" not in gstr2b:
+        gstr2b["transaction_id"], gstr2b["vendor_id"] = None, None
+    open_b = np.ones(len(books), dtype=bool)
+    open_g = np.ones(len(gstr2b), dtype=bool)
+    matched, mismatched = [], []
+
+    def take(pairs, bucket, match_type):
+        open_b[pairs["row_b"].to_numpy()] = False
+        open_g[pairs["row_g"].to_numpy()] = False
+        bucket.append(_pair_frame(books, gstr2b, pairs, match_type))
+
+    take(_exact_pairs(books, gstr2b), matched, "exact")
+
+    # Same invoice (loosely compared, leftovers only): close enough is a match, otherwise a mismatch
+    left = books[open_b & (books["inv"] != "").to_numpy()].assign(loose=lambda f: _loose_invoice(f["invoice_number"]))
+    right = gstr2b[open_g].assign(loose=lambda f: _loose_invoice(f["invoice_number"]))
+    _encode(left, right, ["loose"])
+    candidates = _bucket_candidates(left, right, ["gstin_id", "loose_id"])
+    close = _within_tolerance(candidates, amount_tolerance, date_tolerance_days)
+    pairs = _one_to_one(candidates[close])
+    take(pairs, matched, "tolerance")
+    far = candidates[~close & ~candidates["row_b"].isin(pairs["row_b"]) & ~candidates["row_g"].isin(pairs["row_g"])]
+    take(_one_to_one(far), mismatched, "mismatch")
+
+    # Invoice number typed differently: same supplier, amount and (nearly) date
+    candidates = _bucket_candidates(books[open_b], gstr2b[open_g], ["gstin_id", "rupee"], rupee_shifts=(0, -1, 1))
+    take(_one_to_one(candidates[_within_tolerance(candidates, amount_tolerance, date_tolerance_days)]), matched, "probable")
+
+    matched = pd.concat(matched, ignore_index=True)
+    mismatched = pd.concat(mismatched, ignore_index=True)
+    mismatched["amount_difference"] = mismatched["amount_books"] - mismatched["amount_2b"]
+    mismatched["days_apart"] = (mismatched["date_books"] - mismatched["date_2b"]).dt.days
+    missing_in_2b = books.loc[open_b, BOOKS_COLUMNS].reset_index(drop=True)
+    missing_in_books = gstr2b.loc[open_g, GSTR2B_COLUMNS].reset_index(drop=True)
+    vendors = _vendor_summary(matched, mismatched, missing_in_2b, missing_in_books)
+
+    return {
+        "matched": matched,
+        "mismatched": mismatched,
+        "missing_in_2b": missing_in_2b,
+        "missing_in_books": missing_in_books,
+        "vendors": vendors,
+        "summary": {
+            "books_invoices": len(books),
+            "gstr2b_invoices": len(gstr2b),
+            "matched": len(matched),
+            "matched_by_type": matched["match_type"].value_counts().to_dict(),
+            "mismatched": len(mismatched),
+            "missing_in_2b": len(missing_in_2b),
+            "missing_in_books": len(missing_in_books),
+            "itc_at_risk": float(vendors["itc_at_risk"].sum()),
+            "itc_unclaimed": float(vendors["itc_unclaimed"].sum()),
+            "seconds": round(time.perf_counter() - started, 3),
+        },
+    }
+
+def _vendor_summary(matched, mismatched, missing_in_2b, missing_in_books) -> pd.DataFrame:
+    """ITC at risk per supplier GSTIN.
+
+    At risk = tax claimed on invoices the supplier never reported, plus the
+    excess of booked over reported tax on mismatched invoices. Unclaimed =
+    tax on reported invoices absent from the books.
+    """
+    excess = (mismatched["tax_books"] - mismatched["tax_2b"]).clip(lower=0)
+    parts = [
+        pd.DataFrame({"gstin": matched["gstin"], "supplier_name": matched["supplier_name"], "matched": 1}),
+        pd.DataFrame({"gstin": mismatched["gstin"], "supplier_name": mismatched["supplier_name"],
+                      "mismatched": 1, "itc_at_risk": excess}),
+        pd.DataFrame({"gstin": missing_in_2b["gstin"], "supplier_name": missing_in_2b["supplier_name"],
+                      "missing_in_2b": 1, "itc_at_risk": missing_in_2b["tax"]}),
+        pd.DataFrame({"gstin": missing_in_books["gstin"], "supplier_name": missing_in_books["supplier_name"],
+                      "missing_in_books": 1, "itc_unclaimed": missing_in_books["tax"]}),
+    ]
+    columns = ["matched", "mismatched", "missing_in_2b", "missing_in_books", "itc_at_risk", "itc_unclaimed"]
+    parts = [part for part in parts if len(part)]
+    if not parts:
+        return pd.DataFrame(columns=["gstin", "supplier_name"] + columns)
+    combined = pd.concat(parts, ignore_index=True).reindex(columns=["gstin", "supplier_name"] + columns)
+    combined[columns] = combined[columns].fillna(0)
+    vendors = combined.groupby("gstin", sort=False).agg(
+        supplier_name=("supplier_name", "first"), **{column: (column, "sum") for column in columns}
+    )
+    vendors[columns[:4]] = vendors[columns[:4]].astype(int)
+    vendors[columns[4:]] = vendors[columns[4:]].round(2)
+    return vendors.sort_values(["itc_at_risk", "missing_in_2b"], ascending=False).reset_index()
+
+def month_bounds(month: str) -> tuple:
+    """[start, end) datetimes of a "YYYY-MM" month"""
+    start = datetime.strptime(month, "%Y-%m")
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+@traced()
+def reconcile_entity(entity_id: int, month: str, fileobj, filename: str, **tolerances) -> dict:
+    """Reconcile one entity's purchase register for a month against an uploaded GSTR-2B file"""
+    gstr2b = load_gstr2b(fileobj, filename)
+    start, end = month_bounds(month)
+    books = load_purchase_register(entity_id, start, end)
+    return reconcile_frames(books, gstr2b, **tolerances)
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile a purchase register against GSTR-2B")
+    parser.add_argument("--entity", type=int, required=True)
+    parser.add_argument("--gstr2b", required=True, help="GSTR-2B JSON, CSV or XLSX file")
+    parser.add_argument("--month", required=True, metavar="YYYY-MM")
+    parser.add_argument("--amount-tolerance", type=float, default=AMOUNT_TOLERANCE)
+    parser.add_argument("--date-tolerance", type=int, default=DATE_TOLERANCE_DAYS)
+    parser.add_argument("--out", help="Write each result set as CSV into this directory")
+    args = parser.parse_args()
+
+    init_database()
+    with open(args.gstr2b, "rb") as f:
+        result = reconcile_entity(args.entity, args.month, f, args.gstr2b,
+                                  amount_tolerance=args.amount_tolerance, date_tolerance_days=args.date_tolerance)
+    for key, value in result["summary"].items():
+        print(f"{key:18s} {value}")
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        for name in ("matched", "mismatched", "missing_in_2b", "missing_in_books", "vendors"):
+            result[name].to_csv(os.path.join(args.out, f"{name}.csv"), index=False)
+
+if __name__ == "__main__":
+    main()
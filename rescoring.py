@@ -0,0 +1,253 @@
+"""Incremental and rule-change rescoring.
+
+    python rescoring.py                          # rescore dirty vendors
+    python rescoring.py --rules --dry-run        # preview the active rule file
+    python rescoring.py --rules                  # activate it, rescoring only affected vendors
+    python rescoring.py --rules --file new.json --dry-run
+"""
+import argparse
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import bindparam, case, select, update
+
+from audit import audit_event
+from database import init_database, session_scope, bump_entity_versions, mark_vendors_dirty, DIRTY_MARK, Vendor, RuleSetVersion
+from entity_graph import bump_graph_version, get_entity_graph, FLAGGED_LEVELS
+from portfolio import refresh_client_summaries
+from query_tracer import traced
+from utils.rules import RuleError, RuleSet, changed_factor_codes, get_ruleset, load_ruleset, set_ruleset
+from utils.scoring import score_vendor_frame, describe_risk_factors, prepare_vendor_frame
+
+# --- INCREMENTAL RESCORING ---
+# Vendors are flagged `needs_rescore` (and their `dirty_version` bumped) by
+# the change-tracking hooks in database.py. This job only reads and rewrites
+# that dirty set, in batches. The module stays free of Streamlit so the CLI
+# and worker can import it; cached dashboards notice the rescore through
+# the entity data_version each batch bumps.
+
+RESCORE_BATCH_SIZE = 1000
+
+def _input_columns(ruleset: RuleSet, *extra) -> list:
+    # Cluster inputs come from the in-memory entity graph, the rest from the row
+    return [Vendor.vendor_id, Vendor.entity_id, *extra] + [
+        getattr(Vendor, name) for name in ruleset.inputs if hasattr(Vendor, name)
+    ]
+
+def _scoring_frame(rows, columns: list) -> pd.DataFrame:
+    frame = pd.DataFrame(rows, columns=[column.key for column in columns]).set_index("vendor_id", drop=False)
+    frame["cluster_size"], frame["flagged_neighbours"] = get_entity_graph().lookup_many(frame.index)
+    return frame
+
+def _iter_vendor_batches(columns: list, batch_size: int, *criteria):
+    """Keyset-paginated vendor rows, one short transaction per batch"""
+    last_id = 0
+    while True:
+        with session_scope() as db:
+            rows = db.execute(
+                select(*columns)
+                .where(Vendor.vendor_id > last_id, *criteria)
+                .order_by(Vendor.vendor_id)
+                .limit(batch_size)
+            ).all()
+        if not rows:
+            return
+        last_id = rows[-1].vendor_id
+        yield rows
+
+@traced()
+def rescore_dirty_vendors(batch_size: int = RESCORE_BATCH_SIZE, entity_id: int = None) -> dict:
+    """Recompute score/level/factors for dirty vendors only.
+
+    Each batch is read and written in its own transaction. The dirty flag is
+    cleared only where dirty_version still matches the version read, so a
+    vendor marked dirty while its batch was being scored stays dirty. A
+    vendor that becomes (or stops being) High/Critical is updated in the
+    entity graph and its cluster neighbours are marked dirty; later batches
+    of the same run pick up those with higher ids. Each batch bumps its
+    entities' data_version, invalidating cached dashboards. Returns counts
+    plus the set of affected entity_ids.
+    """
+    ruleset = get_ruleset()
+    columns = _input_columns(ruleset, Vendor.dirty_version)
+    criteria = [Vendor.needs_rescore.is_(True)]
+    if entity_id is not None:
+        criteria.append(Vendor.entity_id == entity_id)
+    vendors = Vendor.__table__
+    write = (
+        update(vendors)
+        .where(vendors.c.vendor_id == bindparam("v_id"))
+        .values(
+            risk_score=bindparam("v_score"),
+            risk_level=bindparam("v_level"),
+            risk_factors=bindparam("v_factors"),
+            rules_version=ruleset.version,
+            needs_rescore=case((vendors.c.dirty_version == bindparam("v_seen"), False), else_=True),
+        )
+    )
+    rescored = 0
+    batches = 0
+    neighbours_marked = 0
+    entity_ids = set()
+
+    for rows in _iter_vendor_batches(columns, batch_size, *criteria):
+        frame = _scoring_frame(rows, columns)
+        scored = score_vendor_frame(frame, ruleset)
+        factors = describe_risk_factors(frame, scored, ruleset=ruleset)
+        graph = get_entity_graph()
+        flipped = [
+            int(vendor_id) for vendor_id, level in zip(frame.index, scored["risk_level"])
+            if graph.set_flagged(int(vendor_id), level in FLAGGED_LEVELS)
+        ]
+        neighbours = {member for vendor_id in flipped for member in graph.members(vendor_id) if member != vendor_id}
+        with session_scope() as db:
+            db.connection().execute(write, [
+                {
+                    "v_id": int(vendor_id),
+                    "v_score": int(scored.at[vendor_id, "risk_score"]),
+                    "v_level": scored.at[vendor_id, "risk_level"],
+                    "v_factors": factors[vendor_id],
+                    "v_seen": int(frame.at[vendor_id, "dirty_version"]),
+                }
+                for vendor_id in frame.index
+            ])
+            bump_entity_versions(db, {int(e) for e in frame["entity_id"].unique()})
+            if flipped:
+                # After the write above, so a neighbour in this same batch is dirtied again
+                mark_vendors_dirty(db, neighbours)
+                bump_graph_version(db, graph)
+        neighbours_marked += len(neighbours)
+        rescored += len(frame)
+        batches += 1
+        entity_ids.update(int(e) for e in frame["entity_id"].unique())
+
+    refresh_client_summaries(entity_ids)
+
+    return {"rescored": rescored, "batches": batches, "neighbours": neighbours_marked,
+            "entity_ids": entity_ids, "finished_at": datetime.utcnow()}
+
+def count_dirty_vendors(entity_id: int = None) -> int:
+    with session_scope() as db:
+        query = db.query(Vendor).filter(Vendor.needs_rescore.is_(True))
+        if entity_id is not None:
+            query = query.filter(Vendor.entity_id == entity_id)
+        return query.count()
+
+# --- RULE CHANGES ---
+
+def preview_rule_change(ruleset: RuleSet, batch_size: int = RESCORE_BATCH_SIZE) -> dict:
+    """Dry run: score every vendor with `ruleset` and compare with the stored levels. Writes nothing."""
+    columns = _input_columns(ruleset, Vendor.risk_score, Vendor.risk_level)
+    vendors = 0
+    score_changes = 0
+    transitions = Counter()
+    for rows in _iter_vendor_batches(columns, batch_size):
+        frame = _scoring_frame(rows, columns)
+        scored = score_vendor_frame(frame, ruleset)
+        vendors += len(frame)
+        score_changes += int((scored["risk_score"].to_numpy() != frame["risk_score"].fillna(-1).to_numpy()).sum())
+        for old, new in zip(frame["risk_level"], scored["risk_level"]):
+            if old != new:
+                transitions[f"{old.value if old else 'Unscored'} -> {new.value}"] += 1
+    return {
+        "version": ruleset.version,
+        "vendors": vendors,
+        "score_changes": score_changes,
+        "level_changes": sum(transitions.values()),
+        "transitions": dict(transitions.most_common()),
+    }
+
+def _affected_vendor_ids(old: RuleSet, new: RuleSet, codes: set, batch_size: int) -> tuple:
+    """Vendors whose inputs hit a changed rule under either rule set, and the rest"""
+    columns = _input_columns(new)
+    affected, unaffected = [], []
+    for rows in _iter_vendor_batches(columns, batch_size):
+        frame = _scoring_frame(rows, columns)
+        hit = pd.Series(False, index=frame.index)
+        for ruleset in (old, new):
+            prepared = prepare_vendor_frame(frame, ruleset)
+            for mask in ruleset.factor_masks(prepared, codes).values():
+                hit |= mask
+        affected.extend(int(v) for v in frame.index[hit.to_numpy()])
+        unaffected.extend(int(v) for v in frame.index[~hit.to_numpy()])
+    return affected, unaffected
+
+@traced()
+def apply_rule_change(ruleset: RuleSet = None, batch_size: int = RESCORE_BATCH_SIZE) -> dict:
+    """Activate a rule set and rescore only the vendors its changes can affect.
+
+    Diffs against the last activated rule set; vendors that no rule change
+    touches just get their rules_version bumped. Without a previous rule set
+    (or when levels/cap/defaults changed) every vendor is rescored.
+    """
+    ruleset = ruleset or get_ruleset()
+    with session_scope() as db:
+        existing = db.get(RuleSetVersion, ruleset.version)
+        if existing is not None:
+            if existing.digest != ruleset.digest:
+                raise RuleError(f"Rule set version {ruleset.version} was already activated with different rules; bump the version")
+            return {"version": ruleset.version, "status": "unchanged"}
+        previous = db.execute(
+            select(RuleSetVersion).order_by(RuleSetVersion.activated_at.desc()).limit(1)
+        ).scalar_one_or_none()
+        previous = RuleSet(previous.definition) if previous is not None else None
+
+    codes = changed_factor_codes(previous, ruleset) if previous is not None else None
+    if codes is None:
+        affected = None
+        with session_scope() as db:
+            db.execute(update(Vendor).values(**DIRTY_MARK))
+    else:
+        affected, unaffected = _affected_vendor_ids(previous, ruleset, codes, batch_size)
+        with session_scope() as db:
+            for start in range(0, len(affected), batch_size):
+                mark_vendors_dirty(db, affected[start:start + batch_size])
+            for start in range(0, len(unaffected), batch_size):
+                db.execute(
+                    update(Vendor)
+                    .where(Vendor.vendor_id.in_(unaffected[start:start + batch_size]))
+                    .values(rules_version=ruleset.version)
+                )
+
+    with session_scope() as db:
+        db.add(RuleSetVersion(version=ruleset.version, digest=ruleset.digest, definition=ruleset.definition))
+    set_ruleset(ruleset)
+    audit_event(None, "rules.activate", version=ruleset.version, digest=ruleset.digest,
+                previous=previous.version if previous is not None else None)
+    result = rescore_dirty_vendors(batch_size)
+    return {
+        "version": ruleset.version,
+        "status": "activated",
+        "changed_rules": sorted(codes) if codes is not None else "all",
+        "affected_vendors": len(affected) if affected is not None else result["rescored"],
+        "rescored": result["rescored"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Rescore vendors")
+    parser.add_argument("--rules", action="store_true", help="Activate the risk rule file (targeted rescore)")
+    parser.add_argument("--file", help="Rule file to use instead of the configured one")
+    parser.add_argument("--dry-run", action="store_true", help="With --rules: report level changes without writing")
+    args = parser.parse_args()
+
+    init_database()
+    if not args.rules:
+        result = rescore_dirty_vendors()
+        print(f"Rescored {result['rescored']} vendors in {result['batches']} batches")
+        return
+
+    ruleset = load_ruleset(args.file) if args.file else get_ruleset()
+    if args.dry_run:
+        report = preview_rule_change(ruleset)
+        print(f"Rules {report['version']}: {report['level_changes']} of {report['vendors']} vendors would change level "
+              f"({report['score_changes']} scores change)")
+        for transition, count in report["transitions"].items():
+            print(f"  {transition}: {count}")
+        return
+
+    result = apply_rule_change(ruleset)
+    print(result)
+
+if __name__ == "__main__":
+    main()
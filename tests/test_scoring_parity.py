@@ -0,0 +1,130 @@
+"""Batch (utils.scoring) and scalar (utils.helpers) risk scorers must agree.
+
+    python -m pytest -q tests/test_scoring_parity.py
+"""
+import math
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from database import RiskLevel
+from utils.helpers import calculate_vendor_risk_score
+from utils.rules import RuleSet, load_ruleset
+from utils.scoring import describe_risk_factors, find_parity_mismatches, score_vendor_frame
+
+RULESET = load_ruleset()
+
+def _candidates(ruleset) -> dict:
+    """Per input: its default, None, and every value on or next to a rule threshold"""
+    candidates = {name: {default, None} for name, default in ruleset.inputs.items()}
+    for rule in ruleset.factors + ruleset.actions + ruleset.breaches:
+        for field, op, value in rule.conditions:
+            if field not in candidates:
+                continue
+            if op == "in":
+                candidates[field].update(value)
+            elif isinstance(value, str):
+                candidates[field].update({value, "Other"})
+            else:
+                step = 0.01 if isinstance(ruleset.inputs[field], float) else 1
+                candidates[field].update({value - step, value, value + step})
+    return {name: list(values) for name, values in candidates.items()}
+
+CANDIDATES = _candidates(RULESET)
+
+def _random_records(count: int, seed: int) -> list:
+    """Vendor dicts mixing threshold values, defaults, None and random magnitudes"""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(count):
+        record = {}
+        for name, default in RULESET.inputs.items():
+            if isinstance(default, str) or rng.random() < 0.7:
+                record[name] = rng.choice(CANDIDATES[name])
+            elif isinstance(default, float):
+                record[name] = round(rng.uniform(0, 2_000_000), 2)
+            else:
+                record[name] = rng.randint(0, 400)
+        records.append(record)
+    return records
+
+def _batch(records: list) -> list:
+    """(score, factors, level) per record from the vectorized path, shaped like RuleSet.score"""
+    frame = pd.DataFrame(records)
+    scored = score_vendor_frame(frame, RULESET)
+    described = describe_risk_factors(frame, scored, ruleset=RULESET)
+    return [
+        (int(scored.at[row, "risk_score"]), described[row], scored.at[row, "risk_level"])
+        for row in frame.index
+    ]
+
+def _assert_parity(records: list):
+    for record, batch in zip(records, _batch(records)):
+        assert batch == RULESET.score(record), record
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_generated_frames_agree(seed):
+    _assert_parity(_random_records(500, seed))
+
+def test_each_threshold_boundary_agrees():
+    records = [
+        {name: (value if name == field else RULESET.inputs[name]) for name in RULESET.inputs}
+        for field, values in CANDIDATES.items()
+        for value in values
+    ]
+    _assert_parity(records)
+
+def test_missing_and_null_inputs_use_defaults():
+    defaults = RULESET.score(dict(RULESET.inputs))
+    records = [
+        {},
+        {name: None for name in RULESET.inputs},
+        {name: None for name in RULESET.inputs if not isinstance(RULESET.inputs[name], str)},
+    ]
+    _assert_parity(records)
+    assert all(batch == defaults for batch in _batch(records))
+
+def test_nan_inputs_score_like_missing():
+    numeric = [name for name, default in RULESET.inputs.items() if not isinstance(default, str)]
+    records = [{name: math.nan for name in numeric}, {name: np.nan for name in numeric}]
+    expected = RULESET.score({})
+    for record, batch in zip(records, _batch(records)):
+        assert batch == expected
+        assert RULESET.score(record) == expected
+
+def test_level_threshold_boundaries_agree():
+    # One rule scoring exactly months_not_filed points reaches every score, including each level threshold
+    definition = dict(RULESET.definition)
+    definition["risk_factors"] = [{
+        "code": "POINTS", "when": [["months_not_filed", ">", 0]], "points": 0,
+        "points_per": ["months_not_filed", 1], "message": "{months_not_filed} points",
+    }]
+    ruleset = RuleSet(definition)
+    records = [{"months_not_filed": points} for points in range(ruleset.max_score + 5)]
+    frame = pd.DataFrame(records)
+    scored = score_vendor_frame(frame, ruleset)
+    for row, record in zip(frame.index, records):
+        score, _, level = ruleset.score(record)
+        assert (int(scored.at[row, "risk_score"]), scored.at[row, "risk_level"]) == (score, level)
+    for threshold, level in ruleset.levels:
+        assert ruleset.score({"months_not_filed": threshold})[2] == level
+        assert ruleset.score({"months_not_filed": threshold - 1})[2] != level
+
+def test_score_is_capped():
+    everything = _random_records(2000, seed=11)
+    scores = [score for score, _, _ in _batch(everything)]
+    assert max(scores) <= RULESET.max_score
+    capped = [record for record, score in zip(everything, scores) if score == RULESET.max_score]
+    assert capped
+    _assert_parity(capped[:50])
+
+def test_find_parity_mismatches_on_generated_frame():
+    assert find_parity_mismatches(pd.DataFrame(_random_records(300, seed=5))) == []
+
+def test_helpers_entry_point_matches_batch():
+    records = _random_records(100, seed=9)
+    for record, batch in zip(records, _batch(records)):
+        assert calculate_vendor_risk_score(record) == batch
+        assert isinstance(batch[2], RiskLevel)
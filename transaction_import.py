@@ -0,0 +1,234 @@
+import csv
+import io
+import os
+import time
+import tomllib
+from datetime import datetime
+
+from openpyxl import load_workbook
+from sqlalchemy import insert, null, select
+
+from aggregates import apply_transaction_rows
+from anomalies import apply_transaction_anomalies
+from database import (
+    session_scope, bump_entity_versions, log_transaction_changes, mark_vendors_dirty, Vendor, Transaction
+)
+from query_tracer import traced
+from utils.identifiers import describe_gstin_error, normalize_identifier
+
+# --- STREAMING TRANSACTION IMPORTER ---
+# Reads CSV/XLSX ledgers row by row, resolves vendor GSTINs through an
+# in-memory index and writes fixed-size chunks with executemany inserts, so
+# memory stays flat however large the file is. GSTINs are normalised, and an
+# unknown one must pass checksum validation before a vendor is created for it.
+
+IMPORT_CHUNK_SIZE = 5000
+MAX_ERRORS_REPORTED = 50
+
+def _max_upload_bytes() -> int:
+    """Mirror Streamlit's server.maxUploadSize (MB) from .streamlit/config.toml"""
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "config.toml")
+    try:
+        with open(config_path, "rb") as f:
+            return int(tomllib.load(f)["server"]["maxUploadSize"]) * 1024 * 1024
+    except (OSError, KeyError, ValueError, tomllib.TOMLDecodeError):
+        return 200 * 1024 * 1024
+
+MAX_UPLOAD_BYTES = _max_upload_bytes()
+
+# Accepted header spellings -> Transaction field
+COLUMN_ALIASES = {
+    "gstin": "vendor_gstin",
+    "vendor_gstin": "vendor_gstin",
+    "supplier_gstin": "vendor_gstin",
+    "party_gstin": "vendor_gstin",
+    "vendor_name": "vendor_name",
+    "party_name": "vendor_name",
+    "supplier_name": "vendor_name",
+    "date": "transaction_date",
+    "transaction_date": "transaction_date",
+    "invoice_date": "transaction_date",
+    "voucher_date": "transaction_date",
+    "invoice_number": "invoice_number",
+    "invoice_no": "invoice_number",
+    "voucher_no": "invoice_number",
+    "amount": "transaction_amount",
+    "transaction_amount": "transaction_amount",
+    "invoice_value": "transaction_amount",
+    "tax": "tax_amount",
+    "tax_amount": "tax_amount",
+    "gst_amount": "tax_amount",
+    "itc": "tax_amount",
+    "payment_mode": "payment_mode",
+    "mode": "payment_mode",
+}
+
+DATE_FORMATS = ["%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d", "%d-%b-%Y", "%d %b %Y", "%Y-%m-%d %H:%M:%S"]
+
+def _normalize_header(name) -> str:
+    key = str(name or "").strip().lower().replace(".", "").replace(" ", "_")
+    return COLUMN_ALIASES.get(key, key)
+
+def _parse_date(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date '{text}'")
+
+def _parse_amount(value) -> float:
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(str(value).replace("₹", "").replace(",", "").strip())
+
+def _file_size(fileobj) -> int:
+    size = getattr(fileobj, "size", None)
+    if size is not None:
+        return size
+    position = fileobj.tell()
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(position)
+    return size
+
+def iter_csv_rows(fileobj):
+    """Yield dicts keyed by normalized headers from a binary CSV stream"""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        headers = [_normalize_header(h) for h in next(reader, [])]
+        for values in reader:
+            if any(values):
+                yield dict(zip(headers, values))
+    finally:
+        text.detach()
+
+def iter_xlsx_rows(fileobj):
+    """Yield dicts from the first worksheet using openpyxl's read-only streaming mode"""
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = [_normalize_header(h) for h in next(rows, ())]
+        for values in rows:
+            if any(v is not None and v != "" for v in values):
+                yield dict(zip(headers, values))
+    finally:
+        workbook.close()
+
+def iter_ledger_rows(fileobj, filename: str):
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return iter_xlsx_rows(fileobj)
+    return iter_csv_rows(fileobj)
+
+def _load_vendor_index(db, entity_id: int) -> dict:
+    """GSTIN -> vendor_id for one entity, fetched with a single query"""
+    rows = db.execute(select(Vendor.gstin, Vendor.vendor_id).where(Vendor.entity_id == entity_id))
+    return {normalize_identifier(gstin): vendor_id for gstin, vendor_id in rows}
+
+@traced()
+def import_transactions(entity_id: int, fileobj, filename: str, create_missing_vendors: bool = True,
+                        chunk_size: int = IMPORT_CHUNK_SIZE, progress=None) -> dict:
+    """Stream a CSV/XLSX ledger into the transactions table.
+
+    `progress(rows_imported, rows_per_sec)` is called after every chunk.
+    Returns a summary dict with counts, throughput and the first errors.
+    """
+    if _file_size(fileobj) > MAX_UPLOAD_BYTES:
+        raise ValueError(f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit")
+
+    started = time.perf_counter()
+    imported = 0
+    skipped = 0
+    vendors_created = 0
+    errors = []
+    rejected_gstins = {}  # GSTIN -> reason, so repeated bad rows skip re-validation
+
+    with session_scope() as db:
+        vendor_index = _load_vendor_index(db, entity_id)
+
+    def flush(chunk):
+        with session_scope() as db:
+            db.execute(insert(Transaction), chunk)
+            apply_transaction_rows(db, chunk)
+            apply_transaction_anomalies(db, chunk)
+            mark_vendors_dirty(db, {row["vendor_id"] for row in chunk})
+            log_transaction_changes(db, chunk)
+            bump_entity_versions(db, [entity_id])
+
+    chunk = []
+    for line_no, row in enumerate(iter_ledger_rows(fileobj, filename), start=2):
+        try:
+            gstin = normalize_identifier(row.get("vendor_gstin"))
+            if not gstin:
+                raise ValueError("Missing vendor GSTIN")
+            if gstin in rejected_gstins:
+                raise ValueError(rejected_gstins[gstin])
+            record = {
+                "entity_id": entity_id,
+                "transaction_date": _parse_date(row.get("transaction_date")),
+                "invoice_number": str(row.get("invoice_number") or "").strip() or None,
+                "transaction_amount": _parse_amount(row.get("transaction_amount")),
+                "tax_amount": _parse_amount(row.get("tax_amount")),
+                "payment_mode": str(row.get("payment_mode") or "").strip() or "Bank Transfer",
+            }
+
+            vendor_id = vendor_index.get(gstin)
+            if vendor_id is None:
+                invalid = describe_gstin_error(gstin)
+                if invalid:
+                    rejected_gstins[gstin] = invalid
+                    raise ValueError(invalid)
+                if not create_missing_vendors:
+                    raise ValueError(f"Unknown vendor GSTIN {gstin}")
+                with session_scope() as db:
+                    vendor = Vendor(
+                        entity_id=entity_id,
+                        name=str(row.get("vendor_name") or gstin).strip(),
+                        gstin=gstin,
+                        pan=gstin[2:12],
+                        # Unknown until verified; the registration rules skip NULL
+                        registration_days=null(),
+                        last_analyzed_at=null()  # never verified: first in line for the worker
+                    )
+                    db.add(vendor)
+                    db.flush()
+                    vendor_id = vendor.vendor_id
+                vendor_index[gstin] = vendor_id
+                vendors_created += 1
+
+            record["vendor_id"] = vendor_id
+            chunk.append(record)
+        except (ValueError, TypeError) as e:
+            skipped += 1
+            if len(errors) < MAX_ERRORS_REPORTED:
+                errors.append(f"Row {line_no}: {e}")
+            continue
+
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            imported += len(chunk)
+            chunk = []
+            if progress:
+                progress(imported, imported / (time.perf_counter() - started))
+
+    if chunk:
+        flush(chunk)
+        imported += len(chunk)
+        if progress:
+            progress(imported, imported / (time.perf_counter() - started))
+
+    elapsed = time.perf_counter() - started
+    return {
+        "imported": imported,
+        "skipped": skipped,
+        "vendors_created": vendors_created,
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(imported / elapsed, 1) if elapsed else 0.0,
+        "errors": errors,
+    }
@@ -0,0 +1,230 @@
+import re
+
+import numpy as np
+
+# --- GSTIN / PAN VALIDATION ---
+# GSTIN layout: 2-digit state code, the holder's 10-character PAN, an entity
+# number (1-9, A-Z), the letter Z and a mod-36 check character. Values are
+# normalised (whitespace removed, upper-cased) before validation. Each check
+# exists twice: a scalar version for single inputs and a NumPy version that
+# validates a whole column at once on a (n, 15) code-point matrix. Both share
+# the tables below and return the same error codes.
+
+CHARSET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+CHAR_VALUES = {char: value for value, char in enumerate(CHARSET)}
+
+# GST state / UT codes (97 = Other Territory, 99 = Centre Jurisdiction)
+STATE_CODES = {
+    "01": "Jammu and Kashmir", "02": "Himachal Pradesh", "03": "Punjab", "04": "Chandigarh",
+    "05": "Uttarakhand", "06": "Haryana", "07": "Delhi", "08": "Rajasthan", "09": "Uttar Pradesh",
+    "10": "Bihar", "11": "Sikkim", "12": "Arunachal Pradesh", "13": "Nagaland", "14": "Manipur",
+    "15": "Mizoram", "16": "Tripura", "17": "Meghalaya", "18": "Assam", "19": "West Bengal",
+    "20": "Jharkhand", "21": "Odisha", "22": "Chhattisgarh", "23": "Madhya Pradesh", "24": "Gujarat",
+    "25": "Daman and Diu", "26": "Dadra and Nagar Haveli and Daman and Diu", "27": "Maharashtra",
+    "28": "Andhra Pradesh (old)", "29": "Karnataka", "30": "Goa", "31": "Lakshadweep", "32": "Kerala",
+    "33": "Tamil Nadu", "34": "Puducherry", "35": "Andaman and Nicobar Islands", "36": "Telangana",
+    "37": "Andhra Pradesh", "38": "Ladakh", "97": "Other Territory", "99": "Centre Jurisdiction",
+}
+
+# 4th PAN character: holder type (Company, Person, HUF, Firm, AOP, Trust, BOI,
+# Local authority, Juridical person, Government)
+PAN_HOLDER_TYPES = "CPHFATBLJG"
+
+VALID = 0
+ERR_LENGTH = 1
+ERR_FORMAT = 2
+ERR_STATE = 3
+ERR_PAN_TYPE = 4
+ERR_CHECKSUM = 5
+
+ERROR_MESSAGES = {
+    VALID: None,
+    ERR_LENGTH: "wrong length",
+    ERR_FORMAT: "invalid characters or layout",
+    ERR_STATE: "unknown state code",
+    ERR_PAN_TYPE: "unknown PAN holder type",
+    ERR_CHECKSUM: "check digit mismatch",
+}
+
+GSTIN_PATTERN = re.compile(r"^[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z][1-9A-Z]Z[0-9A-Z]$")
+PAN_PATTERN = re.compile(r"^[A-Z]{5}[0-9]{4}[A-Z]$")
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_identifier(value) -> str:
+    """Upper-case and drop all whitespace ("" for None)"""
+    if value is None:
+        return ""
+    return _WHITESPACE.sub("", str(value)).upper()
+
+# --- scalar ---
+
+def gstin_check_char(first14: str) -> str:
+    """Mod-36 check character for the first 14 characters of a GSTIN"""
+    total = 0
+    for position, char in enumerate(first14):
+        product = CHAR_VALUES[char] * (2 if position % 2 else 1)
+        total += product // 36 + product % 36
+    return CHARSET[(36 - total % 36) % 36]
+
+def pan_error(value) -> int:
+    pan = normalize_identifier(value)
+    if len(pan) != 10:
+        return ERR_LENGTH
+    if not PAN_PATTERN.match(pan):
+        return ERR_FORMAT
+    if pan[3] not in PAN_HOLDER_TYPES:
+        return ERR_PAN_TYPE
+    return VALID
+
+def gstin_error(value) -> int:
+    gstin = normalize_identifier(value)
+    if len(gstin) != 15:
+        return ERR_LENGTH
+    if not GSTIN_PATTERN.match(gstin):
+        return ERR_FORMAT
+    if gstin[:2] not in STATE_CODES:
+        return ERR_STATE
+    if gstin[5] not in PAN_HOLDER_TYPES:
+        return ERR_PAN_TYPE
+    if gstin_check_char(gstin[:14]) != gstin[14]:
+        return ERR_CHECKSUM
+    return VALID
+
+def is_valid_gstin(value) -> bool:
+    return gstin_error(value) == VALID
+
+def is_valid_pan(value) -> bool:
+    return pan_error(value) == VALID
+
+def pan_from_gstin(value) -> str:
+    """PAN embedded in a valid GSTIN, else None"""
+    gstin = normalize_identifier(value)
+    return gstin[2:12] if gstin_error(gstin) == VALID else None
+
+def describe_gstin_error(value) -> str:
+    """Human-readable reason a GSTIN is rejected (None if valid)"""
+    message = ERROR_MESSAGES[gstin_error(value)]
+    return f"Invalid GSTIN {normalize_identifier(value) or '(blank)'}: {message}" if message else None
+
+# --- vectorized ---
+
+# Code point -> charset value (-1 for anything else, including padding)
+_LOOKUP = np.full(128, -1, dtype=np.int8)
+for _char, _value in CHAR_VALUES.items():
+    _LOOKUP[ord(_char)] = _value
+
+_DIGIT, _LETTER, _ALNUM, _ENTITY, _Z = range(5)
+_GSTIN_LAYOUT = [_DIGIT] * 2 + [_LETTER] * 5 + [_DIGIT] * 4 + [_LETTER, _ENTITY, _Z, _ALNUM]
+_PAN_LAYOUT = [_LETTER] * 5 + [_DIGIT] * 4 + [_LETTER]
+_LOW = np.array([0, 10, 0, 1, 35], dtype=np.int8)
+_HIGH = np.array([9, 35, 35, 35, 35], dtype=np.int8)
+_GSTIN_BOUNDS = (_LOW[_GSTIN_LAYOUT], _HIGH[_GSTIN_LAYOUT])
+_PAN_BOUNDS = (_LOW[_PAN_LAYOUT], _HIGH[_PAN_LAYOUT])
+
+_STATE_OK = np.zeros(100, dtype=bool)
+_STATE_OK[[int(code) for code in STATE_CODES]] = True
+_HOLDER_OK = np.zeros(36, dtype=bool)
+_HOLDER_OK[[CHAR_VALUES[char] for char in PAN_HOLDER_TYPES]] = True
+# Check-digit contribution of a value at a doubled (odd) position: digit sum in base 36
+_DOUBLED = np.array([2 * v - 35 * (2 * v >= 36) for v in range(36)], dtype=np.int16)
+
+def normalize_array(values) -> np.ndarray:
+    """Normalised identifiers as a NumPy unicode array.
+
+    Upper-casing and ASCII whitespace removal are done on the code-point
+    matrix; only values with non-ASCII characters go through
+    normalize_identifier.
+    """
+    array = np.array(["" if value is None else value for value in values], dtype=str)
+    if array.size == 0 or array.dtype.itemsize == 0:
+        return array
+    codes = array.view(np.uint32).reshape(len(array), -1)
+    codes -= 32 * ((codes >= 97) & (codes <= 122)).astype(np.uint32)
+
+    # Same characters str.split() treats as whitespace: \t-\r, \x1c-\x1f and space
+    whitespace = ((codes >= 9) & (codes <= 13)) | ((codes >= 28) & (codes <= 32))
+    padded = np.flatnonzero(whitespace.any(axis=1))
+    if len(padded):
+        # Stable-sort each row's kept characters to the front, then zero the tail
+        keep = ~whitespace[padded] & (codes[padded] != 0)
+        order = np.argsort(~keep, axis=1, kind="stable")
+        compacted = np.take_along_axis(codes[padded], order, axis=1)
+        compacted[~np.take_along_axis(keep, order, axis=1)] = 0
+        codes[padded] = compacted
+
+    for i in np.flatnonzero((codes > 127).any(axis=1)):
+        array[i] = normalize_identifier(array[i])
+    return array
+
+def _char_values(normalized: np.ndarray, width: int) -> tuple:
+    """(values matrix (n, width), length-ok mask) for a normalised unicode array"""
+    n = len(normalized)
+    if n == 0:
+        return np.zeros((0, width), dtype=np.int8), np.zeros(0, dtype=bool)
+    if normalized.dtype.itemsize < width * 4:
+        normalized = normalized.astype(f"U{width}")
+    codes = normalized.view(np.uint32).reshape(n, -1)
+    length_ok = codes[:, width - 1] != 0
+    if codes.shape[1] > width:
+        length_ok &= codes[:, width] == 0
+    values = _LOOKUP[np.minimum(codes[:, :width], 127)]
+    return values, length_ok
+
+def _layout_ok(values: np.ndarray, bounds: tuple) -> np.ndarray:
+    low, high = bounds
+    return ((values >= low) & (values <= high)).all(axis=1)
+
+def gstin_errors(values, normalized: bool = False) -> np.ndarray:
+    """Error code per GSTIN (0 = valid) for a whole column"""
+    array = np.asarray(values, dtype=str) if normalized else normalize_array(values)
+    chars, length_ok = _char_values(array, 15)
+    errors = np.full(len(array), ERR_LENGTH, dtype=np.int8)
+    layout_ok = length_ok & _layout_ok(chars, _GSTIN_BOUNDS)
+    errors[length_ok] = ERR_FORMAT
+
+    # Checks below are computed for every row but only applied where the layout is valid
+    clipped = np.clip(chars, 0, 35)
+    state_ok = _STATE_OK[np.minimum(clipped[:, 0], 9).astype(np.int16) * 10 + np.minimum(clipped[:, 1], 9)]
+    holder_ok = _HOLDER_OK[clipped[:, 5]]
+    total = clipped[:, 0:14:2].sum(axis=1, dtype=np.int16) + _DOUBLED[clipped[:, 1:14:2]].sum(axis=1)
+    checksum_ok = (36 - total % 36) % 36 == chars[:, 14]
+
+    errors[layout_ok] = np.select(
+        [~state_ok, ~holder_ok, ~checksum_ok],
+        [ERR_STATE, ERR_PAN_TYPE, ERR_CHECKSUM],
+        VALID
+    )[layout_ok]
+    return errors
+
+def pan_errors(values, normalized: bool = False) -> np.ndarray:
+    """Error code per PAN (0 = valid) for a whole column"""
+    array = np.asarray(values, dtype=str) if normalized else normalize_array(values)
+    chars, length_ok = _char_values(array, 10)
+    errors = np.full(len(array), ERR_LENGTH, dtype=np.int8)
+    layout_ok = length_ok & _layout_ok(chars, _PAN_BOUNDS)
+    errors[length_ok] = ERR_FORMAT
+    holder_ok = _HOLDER_OK[np.clip(chars[:, 3], 0, 35)]
+    errors[layout_ok] = np.where(holder_ok, VALID, ERR_PAN_TYPE)[layout_ok]
+    return errors
+
+def validate_gstins(values) -> dict:
+    """Normalise, validate and dedupe a column of GSTINs.
+
+    Returns {"normalized": array, "errors": array, "valid": unique valid
+    GSTINs in input order, "invalid": {raw value: reason}}.
+    """
+    values = list(values)
+    normalized = normalize_array(values)
+    errors = gstin_errors(normalized, normalized=True)
+    valid_mask = errors == VALID
+    invalid = {
+        values[i]: ERROR_MESSAGES[int(errors[i])]
+        for i in np.flatnonzero(~valid_mask)
+    }
+    return {
+        "normalized": normalized,
+        "errors": errors,
+        "valid": list(dict.fromkeys(normalized[valid_mask].tolist())),
+        "invalid": invalid,
+    }
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+# --- ASYNC RATE LIMITING ---
+# Token buckets usable anywhere run_all_checks accepts a per-source limit
+# (`async with limit:`), so request budgets and concurrency caps compose.
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0):
+        # Created lazily so the bucket can be built outside a running loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+class CombinedLimit:
+    """Enter several limits (buckets, semaphores) as one `async with` block"""
+
+    def __init__(self, *limits):
+        self.limits = [limit for limit in limits if limit is not None]
+
+    async def __aenter__(self):
+        entered = []
+        try:
+            for limit in self.limits:
+                await limit.__aenter__()
+                entered.append(limit)
+        except BaseException:
+            for limit in reversed(entered):
+                await limit.__aexit__(None, None, None)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        for limit in reversed(self.limits):
+            await limit.__aexit__(exc_type, exc, tb)
+        return False
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import operator
+import os
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from database import RiskLevel
+
+# --- DECLARATIVE RISK RULES ---
+# Risk factors, recommended actions and compliance breaches are defined in
+# utils/risk_rules.json (or BLOODHOUND_RISK_RULES) and compiled once into a
+# RuleSet that evaluates a single vendor (dict or object) or a whole frame
+# with NumPy masks. Rules sharing a "group" are exclusive: the first match
+# in file order wins, like an if/elif chain.
+
+RULES_PATH = os.getenv("BLOODHOUND_RISK_RULES", os.path.join(os.path.dirname(__file__), "risk_rules.json"))
+
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "in": lambda value, options: value in options,
+}
+
+class RuleError(ValueError):
+    """Invalid rule definition"""
+
+class Rule:
+    """One compiled rule: AND of (field, op, value) conditions"""
+
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self.code = spec["code"]
+        self.group = spec.get("group")
+        self.message = spec["message"]
+        self.points = spec.get("points", 0)
+        self.points_per = tuple(spec["points_per"]) if spec.get("points_per") else None
+        self.conditions = []
+        for field, op, value in spec.get("when", []):
+            if op not in OPERATORS:
+                raise RuleError(f"Rule {self.code}: unknown operator '{op}'")
+            self.conditions.append((field, op, tuple(value) if op == "in" else value))
+
+    @property
+    def fields(self) -> set:
+        fields = {field for field, _, _ in self.conditions}
+        if self.points_per:
+            fields.add(self.points_per[0])
+        return fields
+
+    def matches(self, values: Mapping) -> bool:
+        return all(OPERATORS[op](values[field], value) for field, op, value in self.conditions)
+
+    def mask(self, frame: pd.DataFrame) -> np.ndarray:
+        mask = np.ones(len(frame), dtype=bool)
+        for field, op, value in self.conditions:
+            column = frame[field].to_numpy()
+            if op == "in":
+                mask &= np.isin(column.astype(object), list(value))
+            else:
+                mask &= OPERATORS[op](column, value)
+        return mask
+
+    def points_for(self, values: Mapping) -> int:
+        if self.points_per:
+            field, factor = self.points_per
+            return self.points + values[field] * factor
+        return self.points
+
+    def render(self, values: Mapping) -> str:
+        return self.message.format(**values)
+
+class RuleSet:
+    """Compiled risk_rules definition"""
+
+    def __init__(self, definition: dict):
+        self.definition = definition
+        self.version = str(definition["version"])
+        self.digest = hashlib.sha256(json.dumps(definition, sort_keys=True).encode()).hexdigest()[:12]
+        self.max_score = definition.get("max_score", 100)
+        self.levels = sorted(((threshold, RiskLevel[name]) for threshold, name in definition["levels"]), key=lambda l: l[0], reverse=True)
+        self.inputs = dict(definition["inputs"])
+        self.factors = [Rule(spec) for spec in definition["risk_factors"]]
+        self.actions = [Rule(spec) for spec in definition.get("actions", [])]
+        self.breaches = [Rule(spec) for spec in definition.get("breaches", [])]
+        self.default_action = definition.get("default_action")
+        self.codes = [rule.code for rule in self.factors]
+        if len(set(self.codes)) != len(self.codes):
+            raise RuleError("Duplicate risk factor codes")
+        for rule in self.factors + self.actions + self.breaches:
+            unknown = rule.fields - set(self.inputs) - {"risk_score"}
+            if unknown:
+                raise RuleError(f"Rule {rule.code} reads undeclared inputs {sorted(unknown)}")
+
+    @property
+    def int_inputs(self) -> list:
+        return [name for name, default in self.inputs.items() if isinstance(default, int) and not isinstance(default, bool)]
+
+    @property
+    def float_inputs(self) -> list:
+        return [name for name, default in self.inputs.items() if isinstance(default, float)]
+
+    def values(self, vendor) -> dict:
+        """Rule inputs for a vendor dict or object, with defaults for missing/None values"""
+        get = vendor.get if isinstance(vendor, Mapping) else lambda name, default=None: getattr(vendor, name, default)
+        values = {}
+        for name in set(self.inputs) | {"risk_score"}:
+            value = get(name, None)
+            values[name] = self.inputs.get(name, 0) if value is None else value
+        return values
+
+    def level_for(self, score: int) -> RiskLevel:
+        for threshold, level in self.levels:
+            if score >= threshold:
+                return level
+        return RiskLevel.LOW
+
+    def _fired(self, rules: list, values: dict) -> list:
+        taken = set()
+        fired = []
+        for rule in rules:
+            if rule.group in taken:
+                continue
+            if rule.matches(values):
+                fired.append(rule)
+                if rule.group:
+                    taken.add(rule.group)
+        return fired
+
+    # --- single vendor ---
+    def score(self, vendor) -> tuple:
+        """(score, risk_factors, risk_level) for one vendor"""
+        values = self.values(vendor)
+        fired = self._fired(self.factors, values)
+        score = min(sum(rule.points_for(values) for rule in fired), self.max_score)
+        return score, [rule.render(values) for rule in fired], self.level_for(score)
+
+    def recommended_actions(self, vendor) -> list:
+        values = self.values(vendor)
+        actions = [rule.render(values) for rule in self._fired(self.actions, values)]
+        if not actions and self.default_action:
+            actions.append(self.default_action)
+        return actions
+
+    def compliance_breaches(self, vendor) -> list:
+        values = self.values(vendor)
+        return [rule.render(values) for rule in self._fired(self.breaches, values)]
+
+    # --- batch ---
+    def factor_masks(self, frame: pd.DataFrame, codes=None) -> dict:
+        """{code: bool array} for a prepared frame (group exclusivity applied)"""
+        taken = {}
+        masks = {}
+        for rule in self.factors:
+            mask = rule.mask(frame)
+            if rule.group:
+                previous = taken.get(rule.group, np.zeros(len(frame), dtype=bool))
+                mask &= ~previous
+                taken[rule.group] = previous | mask
+            if codes is None or rule.code in codes:
+                masks[rule.code] = mask
+        return masks
+
+    def score_frame(self, frame: pd.DataFrame) -> tuple:
+        """(score array, level object array, masks) for a prepared frame"""
+        masks = self.factor_masks(frame)
+        score = np.zeros(len(frame), dtype=np.int64)
+        for rule in self.factors:
+            points = rule.points
+            if rule.points_per:
+                field, factor = rule.points_per
+                points = points + frame[field].to_numpy() * factor
+            score += np.where(masks[rule.code], points, 0).astype(np.int64)
+        score = np.minimum(score, self.max_score)
+        levels = np.full(len(frame), RiskLevel.LOW, dtype=object)
+        for threshold, level in reversed(self.levels):
+            levels[score >= threshold] = level
+        return score, levels, masks
+
+    def render_factors(self, values: Mapping, codes) -> list:
+        by_code = {rule.code: rule for rule in self.factors}
+        return [by_code[code].render(values) for code in codes]
+
+def _group_orders(ruleset: RuleSet) -> dict:
+    orders = {}
+    for rule in ruleset.factors:
+        if rule.group:
+            orders.setdefault(rule.group, []).append(rule.code)
+    return orders
+
+def _rule_map(ruleset: RuleSet) -> dict:
+    return {rule.code: rule.spec for rule in ruleset.factors}
+
+def changed_factor_codes(old: RuleSet, new: RuleSet) -> set:
+    """Risk factor codes whose outcome may differ between two rule sets.
+
+    A change anywhere in an exclusive group affects every rule in it. Returns
+    None if scoring changed globally (levels, cap or defaults).
+    """
+    if (old.levels, old.max_score, old.inputs) != (new.levels, new.max_score, new.inputs):
+        return None
+    old_rules, new_rules = _rule_map(old), _rule_map(new)
+    changed = {code for code in old_rules.keys() | new_rules.keys() if old_rules.get(code) != new_rules.get(code)}
+    # Reordering inside a group changes which rule wins
+    old_groups, new_groups = _group_orders(old), _group_orders(new)
+    changed_groups = {g for g in old_groups.keys() | new_groups.keys() if old_groups.get(g) != new_groups.get(g)}
+    changed_groups |= {spec.get("group") for code, spec in {**old_rules, **new_rules}.items() if code in changed}
+    changed_groups.discard(None)
+    for ruleset in (old, new):
+        changed |= {rule.code for rule in ruleset.factors if rule.group in changed_groups}
+    return changed
+
+def load_ruleset(path: str = None) -> RuleSet:
+    with open(path or RULES_PATH, encoding="utf-8") as f:
+        return RuleSet(json.load(f))
+
+_active = None
+
+def get_ruleset() -> RuleSet:
+    """The rule set compiled at startup"""
+    global _active
+    if _active is None:
+        _active = load_ruleset()
+    return _active
+
+def set_ruleset(ruleset: RuleSet):
+    global _active
+    _active = ruleset
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+from utils.helpers import calculate_vendor_risk_score
+from utils.rules import get_ruleset
+
+# --- BATCH RISK SCORING ---
+# Vectorized twin of utils.helpers.calculate_vendor_risk_score. Both run the
+# same compiled rule set (utils/rules.py); this path scores whole frames with
+# NumPy masks and only builds factor display strings for the rows actually
+# shown (see describe_risk_factors).
+
+def scoring_defaults(ruleset=None) -> dict:
+    """Vendor fields the rules read, with their defaults"""
+    return dict((ruleset or get_ruleset()).inputs)
+
+def prepare_vendor_frame(vendors, ruleset=None) -> pd.DataFrame:
+    """Build a scoring frame from a DataFrame, dict of columns or list of vendor dicts.
+
+    Missing columns/values get the rule set's input defaults.
+    """
+    ruleset = ruleset or get_ruleset()
+    frame = pd.DataFrame(vendors).copy()
+    for column, default in ruleset.inputs.items():
+        if column not in frame:
+            frame[column] = default
+        else:
+            frame[column] = frame[column].fillna(default)
+    for column in ruleset.int_inputs:
+        frame[column] = frame[column].astype(np.int64)
+    for column in ruleset.float_inputs:
+        frame[column] = frame[column].astype(np.float64)
+    return frame
+
+def score_vendor_frame(vendors, ruleset=None) -> pd.DataFrame:
+    """Score every row at once.
+
+    Returns a frame (same index as the input) with `risk_score`, `risk_level`
+    (RiskLevel) and one boolean column per risk factor code, in rule order.
+    """
+    ruleset = ruleset or get_ruleset()
+    frame = prepare_vendor_frame(vendors, ruleset)
+    score, levels, masks = ruleset.score_frame(frame)
+    result = pd.DataFrame({"risk_score": score, "risk_level": levels}, index=frame.index)
+    for code in ruleset.codes:
+        result[code] = masks[code]
+    return result
+
+def risk_factor_codes(scored: pd.DataFrame, row, ruleset=None) -> list:
+    """Factor codes raised for one row label of a score_vendor_frame() result"""
+    codes = (ruleset or get_ruleset()).codes
+    flags = scored.loc[row, codes]
+    return [code for code in codes if flags[code]]
+
+def describe_risk_factors(vendors, scored: pd.DataFrame, rows=None, ruleset=None) -> dict:
+    """Build display strings only for `rows` (default: all). Returns {row: [str, ...]}"""
+    ruleset = ruleset or get_ruleset()
+    frame = prepare_vendor_frame(vendors, ruleset)
+    rows = scored.index if rows is None else rows
+    described = {}
+    for row in rows:
+        values = frame.loc[row].to_dict()
+        described[row] = ruleset.render_factors(values, risk_factor_codes(scored, row, ruleset))
+    return described
+
+def find_parity_mismatches(vendors) -> list:
+    """Row labels where the batch scorer disagrees with calculate_vendor_risk_score.
+
+    Used to prove the vectorized path before switching a rescoring job to it.
+    """
+    frame = prepare_vendor_frame(vendors)
+    scored = score_vendor_frame(frame)
+    described = describe_risk_factors(frame, scored)
+    mismatches = []
+    for row, values in zip(frame.index, frame[list(scoring_defaults())].to_dict("records")):
+        score, factors, level = calculate_vendor_risk_score(values)
+        if (score, level, factors) != (scored.at[row, "risk_score"], scored.at[row, "risk_level"], described[row]):
+            mismatches.append(row)
+    return mismatches
@@ -0,0 +1,144 @@
+import streamlit as st
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import raiseload
+
+from aggregates import get_monthly_breakdown, get_payment_mode_breakdown
+from dashboard_service import entity_cache_version
+from database import session_scope, Vendor, Transaction
+from utils.helpers import get_recommended_actions, check_compliance_breaches
+
+# --- VENDOR DETAIL SERVICE ---
+# The analysis page loads the headline row first; transactions, monthly
+# charts and raw API payloads are separate queries fetched only when their
+# section is opened. The JSON payload columns are deferred on the model and
+# Vendor.transactions is never lazy-loaded here (raiseload), so a vendor
+# view costs a fixed number of queries. Everything is cached per vendor and
+# keyed on the entity's data_version, so reruns and section switches don't
+# hit the database while rescoring and saved checks still show fresh data.
+
+DETAIL_CACHE_TTL = 300  # seconds
+TRANSACTION_PAGE_SIZE = 100
+VENDOR_SEARCH_LIMIT = 50
+
+def query_vendor_search(db, entity_id: int, text: str = "", limit: int = VENDOR_SEARCH_LIMIT) -> list:
+    """Vendors of an entity matching a name/GSTIN fragment, riskiest first"""
+    query = (
+        select(Vendor.vendor_id, Vendor.name, Vendor.gstin, Vendor.risk_score)
+        .where(Vendor.entity_id == entity_id)
+        .order_by(Vendor.risk_score.desc(), Vendor.vendor_id.desc())
+        .limit(limit)
+    )
+    text = text.strip()
+    if text:
+        query = query.where(or_(Vendor.name.ilike(f"%{text}%"), Vendor.gstin.ilike(f"{text.upper()}%")))
+    return [{"vendor_id": r.vendor_id, "name": r.name, "gstin": r.gstin, "risk_score": r.risk_score} for r in db.execute(query)]
+
+def query_vendor_header(db, entity_id: int, vendor_id: int) -> dict:
+    """Scalar fields, actions and breaches for one vendor (None if not in this entity)"""
+    vendor = db.execute(
+        select(Vendor)
+        .options(raiseload(Vendor.transactions), raiseload(Vendor.entity))
+        .where(Vendor.vendor_id == vendor_id, Vendor.entity_id == entity_id)
+    ).scalar_one_or_none()
+    if vendor is None:
+        return None
+    return {
+        "vendor_id": vendor.vendor_id,
+        "name": vendor.name,
+        "gstin": vendor.gstin,
+        "pan": vendor.pan,
+        "risk_score": vendor.risk_score or 0,
+        "risk_level": vendor.risk_level.value if vendor.risk_level else None,
+        "risk_factors": list(vendor.risk_factors or []),
+        "rules_version": vendor.rules_version,
+        "registration_days": vendor.registration_days,
+        "address_type": vendor.address_type,
+        "director_companies": vendor.director_companies,
+        "gstr1_status": vendor.gstr1_status,
+        "gstr3b_status": vendor.gstr3b_status,
+        "months_not_filed": vendor.months_not_filed,
+        "transaction_count": vendor.transaction_count or 0,
+        "itc_amount": vendor.itc_amount or 0.0,
+        "cash_payments": vendor.cash_payments or 0.0,
+        "is_watchlisted": vendor.is_watchlisted,
+        "last_analyzed_at": vendor.last_analyzed_at,
+        "recommended_actions": get_recommended_actions(vendor),
+        "compliance_breaches": check_compliance_breaches(vendor),
+    }
+
+def query_vendor_transactions(db, vendor_id: int, after: tuple = None, limit: int = TRANSACTION_PAGE_SIZE) -> dict:
+    """Newest-first transaction page on the (vendor_id, transaction_date) index.
+
+    `after` is the (transaction_date, transaction_id) of the previous page's
+    last row; returns {"rows": [...], "next": cursor or None}.
+    """
+    query = (
+        select(Transaction.transaction_id, Transaction.transaction_date, Transaction.invoice_number,
+               Transaction.transaction_amount, Transaction.tax_amount, Transaction.payment_mode)
+        .where(Transaction.vendor_id == vendor_id)
+        .order_by(Transaction.transaction_date.desc(), Transaction.transaction_id.desc())
+        .limit(limit + 1)
+    )
+    if after is not None:
+        date, transaction_id = after
+        query = query.where(or_(
+            Transaction.transaction_date < date,
+            and_(Transaction.transaction_date == date, Transaction.transaction_id < transaction_id)
+        ))
+    rows = [dict(r._mapping) for r in db.execute(query)]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1]["transaction_date"], rows[-1]["transaction_id"])
+    return {"rows": rows, "next": next_cursor}
+
+def query_vendor_payloads(db, vendor_id: int) -> dict:
+    """The raw GSTN/MCA payloads (the deferred JSON columns)"""
+    row = db.execute(
+        select(Vendor.gstn_api_data, Vendor.mca_api_data).where(Vendor.vendor_id == vendor_id)
+    ).one_or_none()
+    if row is None:
+        return {"gstn_api_data": {}, "mca_api_data": {}}
+    return {"gstn_api_data": row.gstn_api_data or {}, "mca_api_data": row.mca_api_data or {}}
+
+@st.cache_data(ttl=DETAIL_CACHE_TTL, show_spinner=False)
+def _cached_vendor_search(entity_id: int, version: int, text: str) -> list:
+    with session_scope() as db:
+        return query_vendor_search(db, entity_id, text)
+
+@st.cache_data(ttl=DETAIL_CACHE_TTL, show_spinner=False)
+def _cached_vendor_header(entity_id: int, version: int, vendor_id: int) -> dict:
+    with session_scope() as db:
+        return query_vendor_header(db, entity_id, vendor_id)
+
+@st.cache_data(ttl=DETAIL_CACHE_TTL, show_spinner=False)
+def _cached_vendor_transactions(vendor_id: int, version: int, after: tuple, limit: int) -> dict:
+    with session_scope() as db:
+        return query_vendor_transactions(db, vendor_id, after, limit)
+
+@st.cache_data(ttl=DETAIL_CACHE_TTL, show_spinner=False)
+def _cached_vendor_monthly(vendor_id: int, version: int) -> dict:
+    return {"monthly": get_monthly_breakdown(vendor_id), "payment_modes": get_payment_mode_breakdown(vendor_id)}
+
+@st.cache_data(ttl=DETAIL_CACHE_TTL, show_spinner=False)
+def _cached_vendor_payloads(vendor_id: int, version: int) -> dict:
+    with session_scope() as db:
+        return query_vendor_payloads(db, vendor_id)
+
+def search_vendors(entity_id: int, text: str = "") -> list:
+    return _cached_vendor_search(entity_id, entity_cache_version(entity_id), text)
+
+def get_vendor_header(entity_id: int, vendor_id: int) -> dict:
+    return _cached_vendor_header(entity_id, entity_cache_version(entity_id), vendor_id)
+
+# The loaders below take entity_id only for the cache version; callers must
+# have resolved the vendor through get_vendor_header (which checks ownership).
+
+def get_vendor_transactions(entity_id: int, vendor_id: int, after: tuple = None, limit: int = TRANSACTION_PAGE_SIZE) -> dict:
+    return _cached_vendor_transactions(vendor_id, entity_cache_version(entity_id), after, limit)
+
+def get_vendor_monthly(entity_id: int, vendor_id: int) -> dict:
+    return _cached_vendor_monthly(vendor_id, entity_cache_version(entity_id))
+
+def get_vendor_payloads(entity_id: int, vendor_id: int) -> dict:
+    return _cached_vendor_payloads(vendor_id, entity_cache_version(entity_id))
@@ -0,0 +1,262 @@
+"""Background vendor re-verification worker.
+
+Runs outside Streamlit:
+
+    python verification_worker.py            # loop forever
+    python verification_worker.py --once     # single pass, then exit
+
+Vendors are queued by how overdue they are (staleness of last_analyzed_at,
+weighted by watchlist flag and current risk level) and re-checked within
+global and per-source request budgets. Results are written back in batches
+and rescored, so pages only ever read precomputed data. Live re-checks saved
+from the Vendor Analysis page are relinked and rescored at the start of
+each pass.
+"""
+import argparse
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from api_integrations import run_all_checks
+from database import init_database, session_scope, bump_entity_versions, mark_vendors_dirty, Vendor, RiskLevel
+from entity_graph import bump_graph_version, get_entity_graph, rebuild_entity_graph, vendor_link_keys, FLAGGED_LEVELS
+from rescoring import rescore_dirty_vendors
+from utils.rate_limit import TokenBucket, CombinedLimit
+
+logger = logging.getLogger("bloodhound.verification_worker")
+
+WORKER_BATCH_SIZE = 50
+WORKER_CONCURRENCY = 20
+WORKER_POLL_SECONDS = 60
+# Graph links are only ever added incrementally; a periodic reload drops the stale ones
+GRAPH_REBUILD_SECONDS = 6 * 3600
+
+# Request budgets (calls per second)
+GLOBAL_RATE = 20.0
+SOURCE_RATES = {"gstn": 10.0, "mca": 5.0, "ibbi": 5.0, "udyam": 5.0}
+
+# How old a check may get before a vendor is due again
+RECHECK_AFTER = {
+    RiskLevel.CRITICAL: timedelta(hours=6),
+    RiskLevel.HIGH: timedelta(hours=12),
+    RiskLevel.MEDIUM: timedelta(days=1),
+    RiskLevel.LOW: timedelta(days=3),
+}
+WATCHLIST_RECHECK_AFTER = timedelta(hours=6)
+
+LEVEL_WEIGHTS = {RiskLevel.LOW: 1.0, RiskLevel.MEDIUM: 1.5, RiskLevel.HIGH: 2.5, RiskLevel.CRITICAL: 4.0}
+WATCHLIST_WEIGHT = 3.0
+
+def vendor_priority(last_analyzed_at, is_watchlisted: bool, risk_level, now: datetime) -> float:
+    """Heap key: more negative = more urgent"""
+    staleness_hours = (now - last_analyzed_at).total_seconds() / 3600 if last_analyzed_at else 24 * 365
+    weight = LEVEL_WEIGHTS.get(risk_level, 1.0) * (WATCHLIST_WEIGHT if is_watchlisted else 1.0)
+    return -(staleness_hours * weight)
+
+def is_due(last_analyzed_at, is_watchlisted: bool, risk_level, now: datetime) -> bool:
+    if last_analyzed_at is None:
+        return True
+    max_age = RECHECK_AFTER.get(risk_level, RECHECK_AFTER[RiskLevel.LOW])
+    if is_watchlisted:
+        max_age = min(max_age, WATCHLIST_RECHECK_AFTER)
+    return now - last_analyzed_at >= max_age
+
+def _months_since_filing(period: str, now: datetime):
+    """Months a return is overdue given its last filed period ("YYYY-MM")"""
+    try:
+        year, month = (int(part) for part in period.split("-")[:2])
+    except (AttributeError, ValueError):
+        return None
+    # The previous calendar month's return is the latest one that can be due
+    return max((now.year * 12 + now.month - 1) - (year * 12 + month), 0)
+
+def vendor_fields_from_checks(results: dict, now: datetime) -> dict:
+    """Map run_all_checks output onto Vendor columns (failed sources are skipped).
+
+    last_analyzed_at only advances when the GSTN check succeeded, so a portal
+    outage leaves vendors due for a re-check instead of marking them fresh.
+    """
+    fields = {}
+    gstn = results.get("gstin_data") or {}
+    mca = results.get("mca_data") or {}
+
+    if gstn and "error" not in gstn:
+        fields["last_analyzed_at"] = now
+        fields["gstn_api_data"] = {**gstn, "udyam": results.get("udyam_data")}
+        try:
+            registered = datetime.strptime(gstn["registration_date"], "%Y-%m-%d")
+            fields["registration_days"] = max((now - registered).days, 0)
+        except (KeyError, TypeError, ValueError):
+            pass
+        gstr1 = gstn.get("gstr1_last_filed")
+        gstr3b = gstn.get("gstr3b_last_filed")
+        if gstr1:
+            fields["gstr1_status"] = "Not Filed" if gstr1 == "Not Filed" else "Filed"
+        if gstr3b:
+            fields["gstr3b_status"] = "Not Filed" if gstr3b == "Not Filed" else "Filed"
+            months = _months_since_filing(gstr3b, now)
+            if months is not None:
+                fields["months_not_filed"] = months
+
+    if mca and "error" not in mca:
+        fields["mca_api_data"] = {**mca, "ibbi": results.get("ibbi_data")}
+        if mca.get("total_companies") is not None:
+            fields["director_companies"] = mca["total_companies"]
+
+    return fields
+
+# Rescore passes per relink; each pass rescores the neighbours of vendors whose flag flipped
+RESCORE_ROUNDS = 3
+
+def save_check_results(updates: list):
+    """Persist check results and mark the vendors dirty (no graph or scoring work).
+
+    Pages call this; relinking and rescoring happen on the worker's next pass.
+    Bumps the entities' data_version so cached vendor views show the new data.
+    """
+    vendor_ids = [fields["vendor_id"] for fields in updates]
+    with session_scope() as db:
+        db.execute(update(Vendor), updates)
+        mark_vendors_dirty(db, vendor_ids)
+        bump_entity_versions(db, db.execute(
+            select(Vendor.entity_id).where(Vendor.vendor_id.in_(vendor_ids)).distinct()
+        ).scalars())
+
+def relink_and_rescore(vendor_ids: list = None):
+    """Fold fresh check data into the entity graph, then rescore the dirty vendors.
+
+    Without vendor_ids every dirty vendor is relinked, which picks up check
+    results saved by pages. Relinking an unchanged vendor is a no-op.
+    """
+    graph = get_entity_graph()
+    query = select(Vendor.vendor_id, Vendor.gstin, Vendor.pan, Vendor.risk_level,
+                   Vendor.mca_api_data, Vendor.gstn_api_data)
+    if vendor_ids is None:
+        query = query.where(Vendor.needs_rescore.is_(True))
+    else:
+        query = query.where(Vendor.vendor_id.in_(vendor_ids))
+    touched = 0
+    with session_scope() as db:
+        # Fresh directors/addresses can merge clusters; everyone in a merged cluster is rescored
+        relinked = set()
+        for vendor_id, gstin, pan, level, mca, gstn in db.execute(query):
+            touched += 1
+            relinked.update(graph.add_vendor(vendor_id, vendor_link_keys(gstin, pan, mca, gstn), level in FLAGGED_LEVELS))
+        if relinked:
+            mark_vendors_dirty(db, relinked)
+            bump_graph_version(db, graph)
+    if not touched:
+        return
+    # Vendors that became (or stopped being) High/Critical dirty their neighbours; rescore those too
+    for _ in range(RESCORE_ROUNDS):
+        if not rescore_dirty_vendors()["neighbours"]:
+            break
+
+def write_check_results(updates: list):
+    """Persist check results, relink the entity graph, then rescore the touched vendors"""
+    save_check_results(updates)
+    relink_and_rescore([fields["vendor_id"] for fields in updates])
+
+class VerificationWorker:
+    """Priority-queue driven re-verification loop"""
+
+    def __init__(self, batch_size: int = WORKER_BATCH_SIZE, concurrency: int = WORKER_CONCURRENCY,
+                 global_rate: float = GLOBAL_RATE, source_rates: dict = None):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        global_budget = TokenBucket(global_rate)
+        self.limits = {
+            source: CombinedLimit(global_budget, TokenBucket(rate))
+            for source, rate in {**SOURCE_RATES, **(source_rates or {})}.items()
+        }
+        self._queue = []
+        self._queued = set()
+        self._graph_rebuilt_at = time.monotonic()
+
+    def load_due_vendors(self, now: datetime = None) -> int:
+        """Push every vendor that is due for a re-check onto the heap"""
+        now = now or datetime.utcnow()
+        added = 0
+        with session_scope() as db:
+            rows = db.execute(select(
+                Vendor.vendor_id, Vendor.gstin, Vendor.last_analyzed_at, Vendor.is_watchlisted, Vendor.risk_level
+            ))
+            for vendor_id, gstin, last_analyzed_at, watchlisted, level in rows:
+                if vendor_id in self._queued or not is_due(last_analyzed_at, watchlisted, level, now):
+                    continue
+                heapq.heappush(self._queue, (vendor_priority(last_analyzed_at, watchlisted, level, now), vendor_id, gstin))
+                self._queued.add(vendor_id)
+                added += 1
+        return added
+
+    def _write_batch(self, updates: list):
+        write_check_results(updates)
+
+    async def _verify(self, vendor_id: int, gstin: str) -> dict:
+        results = await run_all_checks(gstin, self.limits)
+        return {"vendor_id": vendor_id, **vendor_fields_from_checks(results, datetime.utcnow())}
+
+    async def run_once(self) -> int:
+        """Drain the current queue, most urgent vendors first. Returns vendors verified."""
+        if time.monotonic() - self._graph_rebuilt_at >= GRAPH_REBUILD_SECONDS:
+            changed = await asyncio.to_thread(rebuild_entity_graph)
+            self._graph_rebuilt_at = time.monotonic()
+            logger.info("Entity graph rebuilt: %d vendors changed cluster", changed)
+        # Check results saved by pages since the last pass (and vendors dirtied by a rebuild)
+        await asyncio.to_thread(relink_and_rescore)
+        self.load_due_vendors()
+        verified = 0
+        pending = []
+        running = {}  # task -> vendor_id
+
+        while self._queue or running:
+            while self._queue and len(running) < self.concurrency:
+                _, vendor_id, gstin = heapq.heappop(self._queue)
+                running[asyncio.ensure_future(self._verify(vendor_id, gstin))] = vendor_id
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                vendor_id = running.pop(task)
+                try:
+                    fields = task.result()
+                except Exception:
+                    logger.exception("Verification failed for vendor %s", vendor_id)
+                    continue
+                finally:
+                    # Failed vendors must be queueable again on the next pass
+                    self._queued.discard(vendor_id)
+                pending.append(fields)
+                verified += 1
+            if len(pending) >= self.batch_size:
+                await asyncio.to_thread(self._write_batch, pending)
+                pending = []
+
+        if pending:
+            await asyncio.to_thread(self._write_batch, pending)
+        return verified
+
+    async def run_forever(self, poll_seconds: float = WORKER_POLL_SECONDS):
+        while True:
+            verified = await self.run_once()
+            logger.info("Verification pass complete: %d vendors", verified)
+            await asyncio.sleep(poll_seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-verify vendors against upstream portals")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--poll", type=float, default=WORKER_POLL_SECONDS, help="Seconds between passes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    init_database()
+    worker = VerificationWorker()
+    if args.once:
+        asyncio.run(worker.run_once())
+    else:
+        asyncio.run(worker.run_forever(args.poll))
+
+if __name__ == "__main__":
+    main()